@@ -42,8 +42,7 @@ su megmap -c "cd /app && PYTHONPATH=/app celery -A megmap_viz.make_celery worker
     --loglevel DEBUG \
     -P threads \
     --max-memory-per-child=3000000 \
-    --max-tasks-per-child=10 \
-    --concurrency=1 \
+    --concurrency=${CELERY_CONCURRENCY:-2} \
     --pidfile=/var/run/celery/celery.pid \
     --logfile=/var/log/celery/celery.log" &
 
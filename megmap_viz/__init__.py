@@ -62,10 +62,14 @@ def celery_init_app(app: Flask) -> Celery:
 
 
 def megmap_dataset_init(app: Flask) -> None:
-    from megmap_viz.megmap_dataset.megmap_gpkg.gpkg_db import GPKGDB
+    from megmap_viz.megmap_dataset.megmap_gpkg import get_layer_store_cls
     from megmap_viz.megmap_dataset.megmap_manager import MegMapManager
 
-    gpkg_db = GPKGDB(app.config["CACHE"]["map_layer_cache_dir"])
+    layer_format = app.config["CACHE"].get("map_layer_format", "gpkg")
+    gpkg_db = get_layer_store_cls(layer_format)(
+        app.config["CACHE"]["map_layer_cache_dir"],
+        low_memory=app.config["CACHE"].get("map_layer_low_memory", False),
+    )
     megmap_manager = MegMapManager(gpkg_db)
     app.extensions["megmap_manager"] = megmap_manager
     app.extensions["gpkg_db"] = gpkg_db
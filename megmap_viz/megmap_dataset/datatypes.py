@@ -66,3 +66,13 @@ class RemarkInfo(t.NamedTuple):
 class BuilderType(Enum):
     APOLLO = "apollo"
     MEMO = "memory_driving"
+
+
+class ParserConfig(t.TypedDict, total=False):
+    max_workers: int  # size of the apollo parser process pool
+    memo_workers: int  # size of the memo parser process pool, 1 for none
+    chunks_per_worker: int  # cost-balanced chunks submitted per worker
+    columnar: bool  # keep the parsed map as ApolloColumnarResult
+    shared_memory: bool  # workers return results in shared memory blocks
+    polyline_step: float  # sampling step of memo polylines, meters
+    build_workers: int  # threads building independent layers
@@ -9,10 +9,10 @@ import geopandas as gpd
 from shapely.geometry import Polygon, LineString
 
 from .datatypes import MegMapLayer, MegMapLayerType
-from .utils import get_map_local_layer, get_layer_type
+from .utils import get_map_local_layer, get_layer_type, get_local_bounds
 
 if t.TYPE_CHECKING:
-    from megmap_viz.megmap_dataset.megmap_gpkg.gpkg_db import GPKGDB
+    from megmap_viz.megmap_dataset.megmap_gpkg.layer_store import LayerStore
     from .megmap_gpkg.gpkg_db import MegMapFileInfo
 
 logger = logging.getLogger(__name__)
@@ -49,7 +49,7 @@ class BaseData(dict):
 class MegMap:
     def __init__(
         self,
-        megmap_gpkg: GPKGDB,
+        megmap_gpkg: LayerStore,
         megmap_file_info: MegMapFileInfo,
         coord_transform: t.Callable[[PointsType], PointsType] = lambda x: x,
     ) -> None:
@@ -74,20 +74,7 @@ class MegMap:
         layer_type: MegMapLayerType,
         layer_ids: t.Optional[t.List[str]] = None,
     ) -> t.Dict[str, t.Dict[str, Any]]:
-        layer = self._get_megmap_layer(layer_type)
-        local_layer = get_map_local_layer(layer, bbox)
-        if layer_ids is not None:
-            local_layer = t.cast(
-                gpd.GeoDataFrame,
-                local_layer[
-                    t.cast(
-                        gpd.GeoSeries,
-                        local_layer[
-                            self._map_layer_id_name_mapping[layer_type]
-                        ],
-                    ).isin(layer_ids)
-                ],
-            )
+        local_layer = self._get_local_layer(layer_type, bbox, layer_ids)
         return self._convert_layer_to_base_data(
             layer_type,
             local_layer,
@@ -97,18 +84,7 @@ class MegMap:
     def get_map_objects_by_ids(
         self, layer_type: MegMapLayerType, layer_ids: t.List[str]
     ) -> t.Dict[str, t.Dict[str, Any]]:
-        layer = self._get_megmap_layer(layer_type)
-
-        local_layer: MegMapLayer = t.cast(
-            gpd.GeoDataFrame,
-            layer[
-                t.cast(
-                    gpd.GeoSeries,
-                    layer[self._map_layer_id_name_mapping[layer_type]],
-                ).isin(layer_ids)
-            ],
-        )
-
+        local_layer = self._get_local_layer(layer_type, layer_ids=layer_ids)
         return self._convert_layer_to_base_data(
             layer_type,
             local_layer,
@@ -132,8 +108,7 @@ class MegMap:
     def get_ids_by_bbox(
         self, bbox: Polygon, layer_type: MegMapLayerType
     ) -> t.List[str]:
-        layer = self._get_megmap_layer(layer_type)
-        local_layer = get_map_local_layer(layer, bbox)
+        local_layer = self._get_local_layer(layer_type, bbox)
         return t.cast(
             gpd.GeoSeries,
             local_layer[self._map_layer_id_name_mapping[layer_type]],
@@ -171,6 +146,14 @@ class MegMap:
             self._map_layer[layer_type] = layer
 
     def _get_megmap_layer(self, layer_type: MegMapLayerType) -> MegMapLayer:
+        if layer_type not in self._map_layer and self.megmap_gpkg.low_memory:
+            # read for every call, not kept by the map
+            layer = self.megmap_gpkg.query_map_layer(
+                self.megmap_file_info, layer_type.name
+            )
+            if layer is None:
+                raise ValueError()
+            return layer
         if layer_type not in self._map_layer:
             self._load_megmap_layer(layer_type.name)
             # fix:判空处理无图层数据情况
@@ -178,6 +161,36 @@ class MegMap:
                 raise ValueError()
         return self._map_layer[layer_type]
 
+    def _get_local_layer(
+        self,
+        layer_type: MegMapLayerType,
+        bbox: t.Optional[Polygon] = None,
+        layer_ids: t.Optional[t.List[str]] = None,
+    ) -> MegMapLayer:
+        """Objects of a layer in the bbox and with the ids. Unless the whole
+        layer is loaded, only the matching part of the layer is read."""
+        id_name = self._map_layer_id_name_mapping[layer_type]
+        if layer_type in self._map_layer:
+            layer = self._map_layer[layer_type]
+        else:
+            layer = self.megmap_gpkg.query_map_layer(
+                self.megmap_file_info,
+                layer_type.name,
+                bbox=None if bbox is None else get_local_bounds(bbox),
+                id_column=id_name,
+                ids=layer_ids,
+            )
+            if layer is None:
+                raise ValueError()
+        if bbox is not None:
+            layer = get_map_local_layer(layer, bbox)
+        if layer_ids is not None:
+            layer = t.cast(
+                gpd.GeoDataFrame,
+                layer[t.cast(gpd.GeoSeries, layer[id_name]).isin(layer_ids)],
+            )
+        return layer
+
     def _convert_layer_to_base_data(
         self,
         layer_type: MegMapLayerType,
@@ -1,17 +1,34 @@
 from __future__ import annotations
 import os
+import re
+import mmap
+import time
 import logging
 import typing as t
+from contextlib import ExitStack
 from functools import reduce
-from itertools import zip_longest
-from concurrent.futures import ProcessPoolExecutor, as_completed
-from dataclasses import dataclass
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from multiprocessing import resource_tracker
+from dataclasses import dataclass, field
 import gc
 
+import numpy as np
+import shapely
 from lxml import etree
 from shapely.geometry import Polygon, Point, LineString, MultiPoint
 
+from megmap_viz.utils.file_op import SourceType, smart_open_source
+from megmap_viz.utils.datetime_str import get_datetime_str
+from megmap_viz.utils.profiler import get_current_profiler, get_peak_rss
+from megmap_viz.datatypes import LogType
+from megmap_viz.megmap_dataset.utils import (
+    get_pool_context,
+    partition_by_cost,
+    simplify_lines,
+)
+
 from .base import ApolloGeometry, ApolloReference
+from .columnar import ApolloColumnarResult, SharedColumns
 from .juntion import (
     ApolloJunction,
     ApolloJunctionConnection,
@@ -40,10 +57,6 @@ from .signal import (
     ApolloSubSignal,
 )
 
-if t.TYPE_CHECKING:
-    from concurrent.futures import Future
-
-
 logger = logging.getLogger(__name__)
 
 
@@ -55,6 +68,7 @@ class ApolloParserResult:
     object_datum: t.Dict[str, ApolloObject]
     signal_datum: t.Dict[str, ApolloSignal]
     junction_datum: t.Dict[str, ApolloJunction]
+    logs: t.List[LogType] = field(default_factory=list)
 
     def __iadd__(self, o: ApolloParserResult) -> ApolloParserResult:
         self.road_datum.update(o.road_datum)
@@ -63,11 +77,206 @@ class ApolloParserResult:
         self.object_datum.update(o.object_datum)
         self.signal_datum.update(o.signal_datum)
         self.junction_datum.update(o.junction_datum)
+        self.logs.extend(o.logs)
         return self
 
+    def simplify_lines(self) -> None:
+        """Fill `ApolloGeometry.sim_line` of the lane geometries in one
+        batch instead of one projection and simplification per line."""
+        geometries: t.Dict[int, ApolloGeometry] = {}
+        for lane in self.lane_datum.values():
+            lane_geometries = [lane.border.geometry, lane.center_line]
+            if lane.left_border is not None:
+                lane_geometries.append(lane.left_border.geometry)
+            for geometry in lane_geometries:
+                if "sim_line" not in geometry.__dict__:
+                    geometries[id(geometry)] = geometry
+
+        sim_lines = simplify_lines([g.line for g in geometries.values()])
+        for geometry, sim_line in zip(geometries.values(), sim_lines):
+            geometry.sim_line = sim_line
+
+
+APOLLO_ELEMENT_TAGS = ("road", "junction")
+# a ``<road`` or ``<junction`` start tag up to its ``>``, skipping quoted
+# attribute values, which may contain ``>``. The name must be followed by
+# whitespace, ``>`` or ``/`` so that tags like ``<roadSampleAssociation`` or
+# ``<junctionReference`` are not matched
+APOLLO_ELEMENT_START_PATTERN = re.compile(
+    rb"<(road|junction)(?=[\s>/])(?:[^>\"']|\"[^\"]*\"|'[^']*')*>"
+)
+APOLLO_ELEMENT_END_PATTERNS = {
+    tag: re.compile(rb"</" + tag + rb"\s*>") for tag in (b"road", b"junction")
+}
+# starts and ends of the comments, CDATA sections and processing
+# instructions skipped by `scan_element_ranges`
+MARKUP_ENDS = ((b"<!--", b"-->"), (b"<![CDATA[", b"]]>"), (b"<?", b"?>"))
+RANGE_READ_SIZE = 1024 * 1024
+
+ApolloRangeTask = t.Tuple[str, int, int]
+
+# compiled xpath queries used to pull coordinates out in bulk
+GEOMETRY_XPATH = etree.XPath(".//geometry")
+POINT_COUNT_XPATH = etree.XPath("count(.//point)")
+POINT_X_XPATH = etree.XPath(".//point/@x", smart_strings=False)
+POINT_Y_XPATH = etree.XPath(".//point/@y", smart_strings=False)
+CORNER_X_XPATH = etree.XPath(".//cornerGlobal/@x", smart_strings=False)
+CORNER_Y_XPATH = etree.XPath(".//cornerGlobal/@y", smart_strings=False)
+
+# tags visited by the single pass over a lane element
+LANE_REFERENCE_TAGS = (
+    "signalReference",
+    "objectReference",
+    "junctionReference",
+    "laneReference",
+)
+LANE_SAMPLE_TAGS = ("sampleAssociate", "roadSampleAssociation")
+LANE_LINK_TAGS = ("predecessor", "neighbor", "successor")
+LANE_VISIT_TAGS = (
+    ("link", "speed", "border", "leftBorder", "centerLine")
+    + ("borderType", "geometry")
+    + LANE_LINK_TAGS
+    + LANE_SAMPLE_TAGS
+    + LANE_REFERENCE_TAGS
+)
+
+
+class ApolloElementRange(t.NamedTuple):
+    tag: str
+    start: int
+    end: int
+
+
+class ApolloParseTask(t.NamedTuple):
+    # serialized xml chunk or byte range of the xml file
+    source: t.Union[str, ApolloRangeTask]
+    element_num: int
+    cost: int
+
+
+class ApolloParseTaskStat(t.NamedTuple):
+    pid: int
+    element_num: int
+    cost: int
+    wall_time: float
+    cpu_time: float
+    peak_rss_delta: float
+
+
+def _find_markup(mm: mmap.mmap, start: int, end: int) -> int:
+    """Position of the first ``<!`` or ``<?`` between start and end, -1 if
+    there is none."""
+    positions = [
+        pos
+        for pos in (mm.find(b"<!", start, end), mm.find(b"<?", start, end))
+        if pos >= 0
+    ]
+    return min(positions) if positions else -1
+
+
+def _skip_markup(mm: mmap.mmap, pos: int) -> int:
+    """End of the comment, CDATA section, processing instruction or doctype
+    starting at pos."""
+    for markup, end_marker in MARKUP_ENDS:
+        if mm[pos : pos + len(markup)] == markup:
+            end = mm.find(end_marker, pos + len(markup))
+            if end < 0:
+                raise ValueError(f"Unclosed {markup.decode()} at {pos}")
+            return end + len(end_marker)
+    end = mm.find(b">", pos)
+    # entities declared in the internal subset may expand to elements
+    if end < 0 or mm.find(b"[", pos, end) >= 0:
+        raise ValueError(f"Doctype at {pos} can not be scanned")
+    return end + 1
+
+
+def _find_element_end(mm: mmap.mmap, tag: bytes, start: int, pos: int) -> int:
+    """End of the closing tag of the element starting at start, whose
+    content starts at pos."""
+    while True:
+        end_match = APOLLO_ELEMENT_END_PATTERNS[tag].search(
+            mm, pos  # type: ignore
+        )
+        if end_match is None:
+            raise ValueError(f"Unclosed <{tag.decode()}> at {start}")
+        markup_pos = _find_markup(mm, pos, end_match.start())
+        if markup_pos < 0:
+            return end_match.end()
+        pos = _skip_markup(mm, markup_pos)
+
+
+def scan_element_ranges(xml_path: str) -> t.List[ApolloElementRange]:
+    """Scan the byte offsets of the top level ``<road>`` and ``<junction>``
+    elements of an apollo xml file without parsing it.
+
+    Roads and junctions are never nested in each other, so the first matching
+    closing tag after an element start is the end of that element. Comments,
+    CDATA sections and processing instructions are skipped wherever they
+    are, e.g. the CDATA ``geoReference`` of the header. Doctypes with an
+    internal subset and unclosed elements or markup raise ValueError,
+    callers fall back to parsing the file then.
+
+    Args:
+        xml_path (str): local apollo xml path
+
+    Returns:
+        t.List[ApolloElementRange]: element ranges in document order
+    """
+    ranges: t.List[ApolloElementRange] = []
+    with open(xml_path, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return ranges
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            pos = 0
+            while True:
+                match = APOLLO_ELEMENT_START_PATTERN.search(
+                    mm, pos  # type: ignore
+                )
+                if match is None:
+                    break
+                # the start tag may be in a comment or CDATA section
+                markup_pos = _find_markup(mm, pos, match.start())
+                if markup_pos >= 0:
+                    pos = _skip_markup(mm, markup_pos)
+                    continue
+                tag = match.group(1)
+                start = match.start()
+
+                end = match.end()
+                # not a self-closing tag
+                if mm[end - 2] != ord("/"):
+                    end = _find_element_end(mm, tag, start, end)
+
+                ranges.append(ApolloElementRange(tag.decode(), start, end))
+                pos = end
+    return ranges
+
+
+class _LaneElements:
+    """Elements of a lane gathered by `ApolloParser._visit_lane`."""
+
+    __slots__ = ("children", "grandchildren", "links", "samples", "references")
+
+    def __init__(self) -> None:
+        # first direct child of the lane for each tag
+        self.children: t.Dict[str, etree._Element] = {}
+        # first direct child of those children, keyed by (parent tag, tag)
+        self.grandchildren: t.Dict[t.Tuple[str, str], etree._Element] = {}
+        self.links: t.Dict[str, t.List[etree._Element]] = {
+            tag: [] for tag in LANE_LINK_TAGS
+        }
+        self.samples: t.Dict[str, t.List[t.Tuple[float, float, float]]] = {
+            tag: [] for tag in LANE_SAMPLE_TAGS
+        }
+        self.references: t.Dict[str, t.List[ApolloReference]] = {
+            tag: [] for tag in LANE_REFERENCE_TAGS
+        }
+
 
 class ApolloParser:
-    def __init__(self, apollo_xml: t.Union[str, etree._Element]) -> None:
+    def __init__(
+        self, apollo_xml: t.Optional[t.Union[str, etree._Element]] = None
+    ) -> None:
         self.road_datum: t.Dict[str, ApolloRoad] = {}
         self.lane_datum: t.Dict[str, ApolloLane] = {}
         self.lane_section_datum: t.Dict[str, ApolloLaneSection] = {}
@@ -79,10 +288,25 @@ class ApolloParser:
         self._curr_sec_id: t.Optional[int] = None
         self._curr_lane_id: t.Optional[int] = None
         self._curr_lane_uid: t.Optional[str] = None
+        # lines of the current road, built in bulk before the road is parsed
+        self._curr_lines: t.Dict[etree._Element, LineString] = {}
 
         self.apollo_xml = apollo_xml
 
+    @property
+    def result(self) -> ApolloParserResult:
+        return ApolloParserResult(
+            road_datum=self.road_datum,
+            lane_datum=self.lane_datum,
+            lane_section_datum=self.lane_section_datum,
+            object_datum=self.object_datum,
+            signal_datum=self.signal_datum,
+            junction_datum=self.junction_datum,
+        )
+
     def get_result(self) -> ApolloParserResult:
+        if self.apollo_xml is None:
+            raise ValueError("apollo_xml is required, use iter_parse instead")
         if isinstance(self.apollo_xml, str):
             apollo_xml = etree.fromstring(self.apollo_xml)
         else:
@@ -93,88 +317,231 @@ class ApolloParser:
         self.parse_roads(road_eles)
         self.parse_junctions(junction_eles)
 
-        return ApolloParserResult(
-            road_datum=self.road_datum,
-            lane_datum=self.lane_datum,
-            lane_section_datum=self.lane_section_datum,
-            object_datum=self.object_datum,
-            signal_datum=self.signal_datum,
-            junction_datum=self.junction_datum,
-        )
+        return self.result
 
     @classmethod
     def run(cls, apollo_xml_str: str) -> ApolloParserResult:
         return cls(apollo_xml_str).get_result()
 
+    @classmethod
+    def run_streaming(cls, source: SourceType) -> ApolloParserResult:
+        parser = cls()
+        for _ in parser.iter_parse(source):
+            pass
+        return parser.result
+
+    @classmethod
+    def run_range(
+        cls, xml_path: str, start: int, end: int
+    ) -> ApolloParserResult:
+        parser = cls()
+        for _ in parser.iter_parse_range(xml_path, start, end):
+            pass
+        return parser.result
+
+    def iter_parse(
+        self, source: SourceType
+    ) -> t.Iterator[t.Union[ApolloRoad, ApolloJunction]]:
+        """Parse an apollo xml file without materializing the whole tree.
+
+        Top level ``<road>`` and ``<junction>`` elements are parsed one at a
+        time and cleared right after, so the peak memory tracks the largest
+        element instead of the whole file.
+
+        Args:
+            source (SourceType): apollo xml path or binary file-like object
+
+        Yields:
+            t.Union[ApolloRoad, ApolloJunction]: parsed apollo element
+        """
+        with smart_open_source(source) as file:
+            events = etree.iterparse(
+                file,
+                events=("end",),
+                tag=APOLLO_ELEMENT_TAGS,
+                huge_tree=True,
+            )
+            yield from self._iter_parse_events(events)
+
+    def iter_parse_range(
+        self, xml_path: str, start: int, end: int
+    ) -> t.Iterator[t.Union[ApolloRoad, ApolloJunction]]:
+        """Parse the top level elements in a byte range of an apollo xml file.
+
+        The range must start at an element start and end at an element end
+        (see ``scan_element_ranges``). The bytes are fed into a pull parser
+        under a synthetic ``<apollo>`` root, so only the range is read and
+        the elements are handled as in ``iter_parse``. The file is expected
+        to be utf-8 encoded.
+
+        Args:
+            xml_path (str): local apollo xml path
+            start (int): byte offset of the first element
+            end (int): byte offset after the last element
+
+        Yields:
+            t.Union[ApolloRoad, ApolloJunction]: parsed apollo element
+        """
+        pull_parser = etree.XMLPullParser(
+            events=("end",), tag=APOLLO_ELEMENT_TAGS, huge_tree=True
+        )
+        pull_parser.feed(b"<apollo>")
+        with open(xml_path, "rb") as file:
+            file.seek(start)
+            remaining = end - start
+            while remaining > 0:
+                chunk = file.read(min(remaining, RANGE_READ_SIZE))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                pull_parser.feed(chunk)
+                yield from self._iter_parse_events(pull_parser.read_events())
+        pull_parser.feed(b"</apollo>")
+        yield from self._iter_parse_events(pull_parser.read_events())
+        pull_parser.close()
+
+    def _iter_parse_events(
+        self, events: t.Iterable[t.Tuple[str, etree._Element]]
+    ) -> t.Iterator[t.Union[ApolloRoad, ApolloJunction]]:
+        for _, ele in events:
+            parent = ele.getparent()
+            # only the direct children of the root element are map elements
+            if parent is None or parent.getparent() is not None:
+                continue
+
+            apollo_ele: t.Union[ApolloRoad, ApolloJunction, None]
+            if ele.tag == "road":
+                apollo_ele = self.parse_road(ele)
+            else:
+                apollo_ele = self.parse_junction(ele)
+
+            # drop the handled element and everything parsed before it
+            ele.clear(keep_tail=True)
+            while ele.getprevious() is not None:
+                del parent[0]
+
+            if apollo_ele is not None:
+                yield apollo_ele
+
     def parse_roads(self, road_eles: t.List[etree._Element]) -> None:
         for road_ele in road_eles:
-            self._curr_road_id = str(road_ele.attrib["id"])
-            road_type = str(road_ele.attrib["type"])
-            junction = str(road_ele.attrib["junction"])
-
-            # lane sections
-            lanes_ele = road_ele.find("lanes")
-            if lanes_ele is None:
-                logger.warning("Road %s has no lanes", road_ele.attrib["id"])
-                continue
-            lane_section_eles = lanes_ele.findall("laneSection")
-            apollo_lane_sections = self._parse_lane_sections(lane_section_eles)
+            self.parse_road(road_ele)
 
-            signal_eles = list(road_ele.iterdescendants("signal"))
-            object_eles = list(road_ele.iterdescendants("object"))
+    def parse_road(self, road_ele: etree._Element) -> t.Optional[ApolloRoad]:
+        self._curr_road_id = str(road_ele.attrib["id"])
+        road_type = str(road_ele.attrib["type"])
+        junction = str(road_ele.attrib["junction"])
 
-            # signals
-            apollo_signals = self._parse_signals(signal_eles=signal_eles)
+        # lane sections
+        lanes_ele = road_ele.find("lanes")
+        if lanes_ele is None:
+            logger.warning("Road %s has no lanes", road_ele.attrib["id"])
+            return None
+        self._curr_lines = self._build_lines(road_ele)
 
-            # objects
-            apollo_objects = self._parse_objects(object_eles=object_eles)
+        lane_section_eles = lanes_ele.findall("laneSection")
+        apollo_lane_sections = self._parse_lane_sections(lane_section_eles)
 
-            apollo_road = ApolloRoad(
-                id_=self._curr_road_id,
-                type_=road_type,
-                junction=junction,
-                lanes=apollo_lane_sections,
-                signals=apollo_signals,
-                objects=apollo_objects,
-            )
+        signal_eles = list(road_ele.iterdescendants("signal"))
+        object_eles = list(road_ele.iterdescendants("object"))
+
+        # signals
+        apollo_signals = self._parse_signals(signal_eles=signal_eles)
 
-            self.road_datum[self._curr_road_id] = apollo_road
+        # objects
+        apollo_objects = self._parse_objects(object_eles=object_eles)
+
+        apollo_road = ApolloRoad(
+            id_=self._curr_road_id,
+            type_=road_type,
+            junction=junction,
+            lanes=apollo_lane_sections,
+            signals=apollo_signals,
+            objects=apollo_objects,
+        )
+
+        self.road_datum[self._curr_road_id] = apollo_road
+        self._curr_lines = {}
+        return apollo_road
 
     def parse_junctions(self, junction_eles: t.List[etree._Element]) -> None:
         for junction_ele in junction_eles:
-            jun_id = str(junction_ele.attrib["id"])
-            apollo_outline = self._parse_outline(
-                junction_ele, outline_type=Polygon
-            )
+            self.parse_junction(junction_ele)
 
-            conn_eles = junction_ele.findall("connection")
-            apollo_connections = [
-                ApolloJunctionConnection(
-                    id_=int(conn_ele.attrib["id"]),
-                    incoming_road=str(conn_ele.attrib["incomingRoad"]),
-                    connecting_road=str(conn_ele.attrib["connectingRoad"]),
-                    contact_point=t.cast(
-                        ContactPointType, conn_ele.attrib["contactPoint"]
-                    ),
-                )
-                for conn_ele in conn_eles
-            ]
+    def parse_junction(self, junction_ele: etree._Element) -> ApolloJunction:
+        jun_id = str(junction_ele.attrib["id"])
+        apollo_outline = self._parse_outline(
+            junction_ele, outline_type=Polygon
+        )
 
-            apollo_junction = ApolloJunction(
-                id_=jun_id,
-                outline=apollo_outline,
-                connections=apollo_connections,
+        conn_eles = junction_ele.findall("connection")
+        apollo_connections = [
+            ApolloJunctionConnection(
+                id_=int(conn_ele.attrib["id"]),
+                incoming_road=str(conn_ele.attrib["incomingRoad"]),
+                connecting_road=str(conn_ele.attrib["connectingRoad"]),
+                contact_point=t.cast(
+                    ContactPointType, conn_ele.attrib["contactPoint"]
+                ),
             )
+            for conn_ele in conn_eles
+        ]
+
+        apollo_junction = ApolloJunction(
+            id_=jun_id,
+            outline=apollo_outline,
+            connections=apollo_connections,
+        )
 
-            self.junction_datum[jun_id] = apollo_junction
+        self.junction_datum[jun_id] = apollo_junction
+        return apollo_junction
+
+    @staticmethod
+    def _read_coords(
+        ele: etree._Element, x_xpath: etree.XPath, y_xpath: etree.XPath
+    ) -> np.ndarray:
+        xs = x_xpath(ele)
+        ys = y_xpath(ele)
+        rv = np.empty((len(xs), 2), dtype=np.float64)
+        rv[:, 0] = np.fromiter(xs, dtype=np.float64, count=len(xs))
+        rv[:, 1] = np.fromiter(ys, dtype=np.float64, count=len(ys))
+        return rv
+
+    def _build_lines(
+        self, road_ele: etree._Element
+    ) -> t.Dict[etree._Element, LineString]:
+        """Build the lines of all geometry elements of a road at once."""
+        geometry_eles = []
+        point_nums = []
+        for geometry_ele in GEOMETRY_XPATH(road_ele):
+            point_num = int(POINT_COUNT_XPATH(geometry_ele))
+            # invalid geometries are left to _parse_geometry to report
+            if point_num < 2:
+                continue
+            geometry_eles.append(geometry_ele)
+            point_nums.append(point_num)
+        if not geometry_eles:
+            return {}
+
+        coords = np.concatenate(
+            [
+                self._read_coords(ele, POINT_X_XPATH, POINT_Y_XPATH)
+                for ele in geometry_eles
+            ]
+        )
+        lines = shapely.linestrings(
+            coords,
+            indices=np.repeat(np.arange(len(point_nums)), point_nums),
+        )
+        return dict(zip(geometry_eles, lines))
 
     def _parse_outline(
         self,
         outline_ele: etree._Element,
         outline_type: t.Type[t.Union[Polygon, MultiPoint]],
     ) -> t.Union[Polygon, LineString, MultiPoint]:
-        points = list(outline_ele.iterdescendants("cornerGlobal"))
-        if not points:
+        coords = self._read_coords(outline_ele, CORNER_X_XPATH, CORNER_Y_XPATH)
+        if not len(coords):
             logger.error(
                 "Road %s signal/object has no cornerGlobal element",
                 self._curr_road_id,
@@ -183,11 +550,9 @@ class ApolloParser:
                 f"Road {self._curr_road_id} "
                 f"signal/object has no cornerGlobal element"
             )
-        points = [
-            Point(float(point.attrib["x"]), float(point.attrib["y"]))
-            for point in points
-        ]
-        return outline_type(points)
+        if outline_type is Polygon:
+            return shapely.polygons(coords)
+        return shapely.multipoints(coords)
 
     def _parse_geometry(self, geometry_ele: etree._Element) -> ApolloGeometry:
         s_offset = float(geometry_ele.attrib["sOffset"])
@@ -196,16 +561,17 @@ class ApolloParser:
         z = float(geometry_ele.attrib["z"])
         length = float(geometry_ele.attrib["length"])
 
-        points = list(geometry_ele.iterdescendants("point"))
-        if not points:
-            raise ValueError(
-                f"Road {self._curr_road_id} Section"
-                f" {self._curr_sec_id}: Geometry has no point element"
+        line = self._curr_lines.get(geometry_ele)
+        if line is None:
+            coords = self._read_coords(
+                geometry_ele, POINT_X_XPATH, POINT_Y_XPATH
             )
-        points = [
-            Point(float(point.attrib["x"]), float(point.attrib["y"]))
-            for point in points
-        ]
+            if not len(coords):
+                raise ValueError(
+                    f"Road {self._curr_road_id} Section"
+                    f" {self._curr_sec_id}: Geometry has no point element"
+                )
+            line = LineString(coords)
 
         return ApolloGeometry(
             s_offset=s_offset,
@@ -213,7 +579,64 @@ class ApolloParser:
             y=y,
             z=z,
             length=length,
-            line=LineString(points),
+            line=line,
+        )
+
+    def _visit_lane(self, lane_ele: etree._Element) -> _LaneElements:
+        """Collect everything `_parse_lane` needs in one pass over the lane.
+
+        Structural elements (link, speed, border, ...) are only taken as
+        direct children like `find` does, while samples and references are
+        picked up at any depth like `iterdescendants` does.
+        """
+        rv = _LaneElements()
+        for ele in lane_ele.iterdescendants(*LANE_VISIT_TAGS):
+            tag = ele.tag
+            attrib = ele.attrib
+            if tag in LANE_REFERENCE_TAGS:
+                rv.references[tag].append(
+                    ApolloReference(
+                        str(attrib["id"]),
+                        float(attrib["startOffset"]),
+                        float(attrib["endOffset"]),
+                    )
+                )
+                continue
+            if tag in LANE_SAMPLE_TAGS:
+                rv.samples[tag].append(
+                    (
+                        float(attrib["sOffset"]),
+                        float(attrib["leftWidth"]),
+                        float(attrib["rightWidth"]),
+                    )
+                )
+                continue
+
+            parent = ele.getparent()
+            if parent is lane_ele:
+                rv.children.setdefault(tag, ele)
+            elif rv.children.get(parent.tag) is parent:
+                if parent.tag == "link":
+                    if tag in LANE_LINK_TAGS:
+                        rv.links[tag].append(ele)
+                else:
+                    rv.grandchildren.setdefault((parent.tag, tag), ele)
+        return rv
+
+    def _parse_border_type(
+        self, border_type_ele: t.Optional[etree._Element], lane_uid: str
+    ) -> t.Optional[ApolloLaneBorderType]:
+        if border_type_ele is None:
+            logger.warning(
+                "Road %s Lane %s has no border type",
+                self._curr_road_id,
+                lane_uid,
+            )
+            return None
+        return ApolloLaneBorderType(
+            s_offset=float(border_type_ele.attrib["sOffset"]),
+            type=str(border_type_ele.attrib["type"]),
+            color=str(border_type_ele.attrib["color"]),
         )
 
     def _parse_lane(self, lane_ele: etree._Element) -> t.Optional[ApolloLane]:
@@ -223,26 +646,23 @@ class ApolloParser:
         lane_direction = str(lane_ele.attrib["direction"])
         turn_type = str(lane_ele.attrib["turnType"])
 
-        # link
-        link_ele = lane_ele.find("link")
+        lane_eles = self._visit_lane(lane_ele)
+        children = lane_eles.children
+        grandchildren = lane_eles.grandchildren
 
-        if link_ele is None:
+        # link
+        if "link" not in children:
             logger.error(
                 "Road %s Lane %s has no link", self._curr_road_id, lane_uid
             )
             return None
 
-        pre_eles = link_ele.findall("predecessor")
-        apollo_pres = []
-        for pre_ele in pre_eles:
-            apollo_pres.append(
+        apollo_link = ApolloLaneLink(
+            predecessors=[
                 ApolloLanePredecessor(str(pre_ele.attrib["id"]))
-            )
-
-        nei_eles = link_ele.findall("neighbor")
-        apollo_neis = []
-        for nei_ele in nei_eles:
-            apollo_neis.append(
+                for pre_ele in lane_eles.links["predecessor"]
+            ],
+            neighbors=[
                 ApolloLaneNeighbor(
                     str(nei_ele.attrib["id"]),
                     side=t.cast(
@@ -250,21 +670,16 @@ class ApolloParser:
                     ),
                     direction=str(nei_ele.attrib["direction"]),
                 )
-            )
-
-        suc_eles = link_ele.findall("successor")
-        apollo_sucs = []
-        for suc_ele in suc_eles:
-            apollo_sucs.append(ApolloLaneSuccessor(str(suc_ele.attrib["id"])))
-
-        apollo_link = ApolloLaneLink(
-            predecessors=apollo_pres,
-            neighbors=apollo_neis,
-            successors=apollo_sucs,
+                for nei_ele in lane_eles.links["neighbor"]
+            ],
+            successors=[
+                ApolloLaneSuccessor(str(suc_ele.attrib["id"]))
+                for suc_ele in lane_eles.links["successor"]
+            ],
         )
 
         # speed_limit
-        speed_limit_ele = lane_ele.find("speed")
+        speed_limit_ele = children.get("speed")
         apollo_speed_limit = None
         if speed_limit_ele is not None:
             apollo_speed_limit = ApolloLaneSpeedLimit(
@@ -278,29 +693,17 @@ class ApolloParser:
             )
 
         # border
-        border_ele = lane_ele.find("border")
-        if border_ele is None:
+        if "border" not in children:
             logger.error(
                 "Road %s Lane %s has no border", self._curr_road_id, lane_uid
             )
             return None
 
-        border_type_ele = border_ele.find("borderType")
-        apollo_border_type = None
-        if border_type_ele is None:
-            logger.warning(
-                "Road %s Lane %s has no border type",
-                self._curr_road_id,
-                lane_uid,
-            )
-        else:
-            apollo_border_type = ApolloLaneBorderType(
-                s_offset=float(border_type_ele.attrib["sOffset"]),
-                type=str(border_type_ele.attrib["type"]),
-                color=str(border_type_ele.attrib["color"]),
-            )
+        apollo_border_type = self._parse_border_type(
+            grandchildren.get(("border", "borderType")), lane_uid
+        )
 
-        border_geo_ele = border_ele.find("geometry")
+        border_geo_ele = grandchildren.get(("border", "geometry"))
         if border_geo_ele is None:
             logger.error(
                 "Road %s Lane %s has no border geometry",
@@ -315,24 +718,12 @@ class ApolloParser:
         )
 
         # left border
-        left_border_ele = lane_ele.find("leftBorder")
         apollo_left_border = None
-        if left_border_ele is not None:
-            border_type_ele = left_border_ele.find("borderType")
-            apollo_border_type = None
-            if border_type_ele is None:
-                logger.warning(
-                    "Road %s Lane %s has no border type",
-                    self._curr_road_id,
-                    lane_uid,
-                )
-            else:
-                apollo_border_type = ApolloLaneBorderType(
-                    s_offset=float(border_type_ele.attrib["sOffset"]),
-                    type=str(border_type_ele.attrib["type"]),
-                    color=str(border_type_ele.attrib["color"]),
-                )
-            left_border_geo_ele = left_border_ele.find("geometry")
+        if "leftBorder" in children:
+            apollo_border_type = self._parse_border_type(
+                grandchildren.get(("leftBorder", "borderType")), lane_uid
+            )
+            left_border_geo_ele = grandchildren.get(("leftBorder", "geometry"))
             if left_border_geo_ele is None:
                 logger.warning(
                     "Road %s Lane %s has no left border geometry",
@@ -349,15 +740,14 @@ class ApolloParser:
                 )
 
         # center line
-        center_line_ele = lane_ele.find("centerLine")
-        if center_line_ele is None:
+        if "centerLine" not in children:
             logger.error(
                 "Road %s Lane %s has no center line",
                 self._curr_road_id,
                 lane_uid,
             )
             return None
-        center_line_geo_ele = center_line_ele.find("geometry")
+        center_line_geo_ele = grandchildren.get(("centerLine", "geometry"))
         if center_line_geo_ele is None:
             logger.error(
                 "Road %s Lane %s has no center line geometry",
@@ -367,76 +757,6 @@ class ApolloParser:
             return None
         apollo_center_line = self._parse_geometry(center_line_geo_ele)
 
-        # sample associates
-        sample_associate_eles = list(
-            lane_ele.iterdescendants("sampleAssociate")
-        )
-        apollo_sample_associates = [
-            ApolloLaneSampleAssociate(
-                float(sample_associate_ele.attrib["sOffset"]),
-                float(sample_associate_ele.attrib["leftWidth"]),
-                float(sample_associate_ele.attrib["rightWidth"]),
-            )
-            for sample_associate_ele in sample_associate_eles
-        ]
-
-        # road sample associations
-        road_sample_association_eles = list(
-            lane_ele.iterdescendants("roadSampleAssociation")
-        )
-        apollo_road_sample_associations = [
-            ApolloLaneRoadSampleAssociation(
-                float(road_sample_association_ele.attrib["sOffset"]),
-                float(road_sample_association_ele.attrib["leftWidth"]),
-                float(road_sample_association_ele.attrib["rightWidth"]),
-            )
-            for road_sample_association_ele in road_sample_association_eles
-        ]
-
-        # signal overlap group
-        signal_overlap_eles = lane_ele.iterdescendants("signalReference")
-        apollo_signal_overlap_group = [
-            ApolloReference(
-                str(signal_overlap.attrib["id"]),
-                float(signal_overlap.attrib["startOffset"]),
-                float(signal_overlap.attrib["endOffset"]),
-            )
-            for signal_overlap in signal_overlap_eles
-        ]
-
-        # object overlap group
-        object_overlap_eles = lane_ele.iterdescendants("objectReference")
-        apollo_object_overlap_group = [
-            ApolloReference(
-                str(object_overlap.attrib["id"]),
-                float(object_overlap.attrib["startOffset"]),
-                float(object_overlap.attrib["endOffset"]),
-            )
-            for object_overlap in object_overlap_eles
-        ]
-
-        # junction overlap group
-        junction_overlap_eles = lane_ele.iterdescendants("junctionReference")
-        apollo_junction_overlap_group = [
-            ApolloReference(
-                str(junction_overlap.attrib["id"]),
-                float(junction_overlap.attrib["startOffset"]),
-                float(junction_overlap.attrib["endOffset"]),
-            )
-            for junction_overlap in junction_overlap_eles
-        ]
-
-        # lane overlap group
-        lane_overlap_eles = lane_ele.iterdescendants("laneReference")
-        apollo_lane_overlap_group = [
-            ApolloReference(
-                str(lane_overlap.attrib["id"]),
-                float(lane_overlap.attrib["startOffset"]),
-                float(lane_overlap.attrib["endOffset"]),
-            )
-            for lane_overlap in lane_overlap_eles
-        ]
-
         apollo_lane = ApolloLane(
             id_=lane_id,
             uid=lane_uid,
@@ -448,12 +768,18 @@ class ApolloParser:
             border=apollo_border,
             left_border=apollo_left_border,
             center_line=apollo_center_line,
-            sample_associates=apollo_sample_associates,
-            road_sample_associations=apollo_road_sample_associations,
-            signal_overlap_group=apollo_signal_overlap_group,
-            object_overlap_group=apollo_object_overlap_group,
-            junction_overlap_group=apollo_junction_overlap_group,
-            lane_overlap_group=apollo_lane_overlap_group,
+            sample_associates=[
+                ApolloLaneSampleAssociate(*sample)
+                for sample in lane_eles.samples["sampleAssociate"]
+            ],
+            road_sample_associations=[
+                ApolloLaneRoadSampleAssociation(*sample)
+                for sample in lane_eles.samples["roadSampleAssociation"]
+            ],
+            signal_overlap_group=lane_eles.references["signalReference"],
+            object_overlap_group=lane_eles.references["objectReference"],
+            junction_overlap_group=lane_eles.references["junctionReference"],
+            lane_overlap_group=lane_eles.references["laneReference"],
         )
 
         return apollo_lane
@@ -689,66 +1015,273 @@ class ApolloParser:
         return apollo_lane_sections
 
 
-class MultiApolloParser:
-    def __init__(self, apollo_xml: etree._Element) -> None:
-        self._proc_pool = ProcessPoolExecutor(max_workers=4)
+AnyApolloParserResult = t.Union[ApolloParserResult, ApolloColumnarResult]
+ParseTaskResult = t.Union[AnyApolloParserResult, SharedColumns]
 
-        self._futures: t.List[Future] = []
 
-        self.tasks = self.get_tasks(apollo_xml)
+def run_parse_task(
+    task: ApolloParseTask, columnar: bool = False, shared_memory: bool = False
+) -> t.Tuple[ParseTaskResult, ApolloParseTaskStat]:
+    start_time = time.perf_counter()
+    start_cpu_time = time.process_time()
+    start_peak_rss = get_peak_rss()
 
-    def get_tasks(self, apollo_xml: etree._Element) -> t.List[str]:
-        roads = apollo_xml.findall("road")
-        junctions = apollo_xml.findall("junction")
+    rv: ParseTaskResult
+    if isinstance(task.source, str):
+        rv = ApolloParser.run(task.source)
+    else:
+        rv = ApolloParser.run_range(*task.source)
+    if shared_memory:
+        rv = ApolloColumnarResult.from_result(rv).to_shared_memory()
+    elif columnar:
+        rv = ApolloColumnarResult.from_result(rv)
 
-        cpu_num = os.cpu_count()
-        if cpu_num is None:
-            cpu_num = 1
+    return rv, ApolloParseTaskStat(
+        pid=os.getpid(),
+        element_num=task.element_num,
+        cost=task.cost,
+        wall_time=time.perf_counter() - start_time,
+        cpu_time=time.process_time() - start_cpu_time,
+        peak_rss_delta=get_peak_rss() - start_peak_rss,
+    )
 
-        road_chunk_size = len(roads) // cpu_num
-        junction_chunk_size = len(junctions) // cpu_num
 
-        if road_chunk_size == 0:
-            road_chunk_size = 1
-        if junction_chunk_size == 0:
-            junction_chunk_size = 1
+class MultiApolloParser:
+    """Parse an apollo map in a process pool.
+
+    The map can be either a loaded xml tree, which is split and serialized
+    into chunks, or the path of a local xml file, which is only scanned for
+    element byte offsets so that the workers parse the byte ranges directly.
+    Files which can not be scanned (see `scan_element_ranges`) are parsed and
+    split like a tree.
+
+    Roads differ in size by orders of magnitude, so the elements are split
+    into ``max_workers * chunks_per_worker`` contiguous chunks of similar
+    estimated cost (point number for xml trees, byte length for files) and
+    the most expensive chunks are submitted first.
+
+    With ``columnar`` the workers send back `ApolloColumnarResult` instead
+    of the dataclass object graph, which is far cheaper to pickle and to
+    keep in memory.
+
+    With ``shared_memory`` the workers copy the columns into a shared
+    memory block and only send back its name and layout; the parent
+    concatenates the blocks in place and, unless ``columnar`` is set,
+    rebuilds the dataclasses with geometries created in bulk.
+    """
+
+    def __init__(
+        self,
+        apollo_xml: t.Union[etree._Element, str],
+        max_workers: int = 4,
+        chunks_per_worker: int = 4,
+        columnar: bool = False,
+        shared_memory: bool = False,
+    ) -> None:
+        self.max_workers = max(1, max_workers)
+        self.chunks_per_worker = max(1, chunks_per_worker)
+        self.columnar = columnar
+        self.shared_memory = shared_memory
+        if shared_memory:
+            # let the workers share the tracker of this process, otherwise
+            # each of them would unlink its blocks again on exit
+            resource_tracker.ensure_running()
+        self._proc_pool = ProcessPoolExecutor(
+            max_workers=self.max_workers, mp_context=get_pool_context()
+        )
 
-        road_chunks = [
-            roads[i : i + road_chunk_size]
-            for i in range(0, len(roads), road_chunk_size)
-        ]
-        junction_chunks = [
-            junctions[i : i + junction_chunk_size]
-            for i in range(0, len(junctions), junction_chunk_size)
+        self._futures: t.List[Future] = []
+
+        self.tasks: t.List[ApolloParseTask]
+        if isinstance(apollo_xml, etree._Element):
+            self.tasks = self.get_tasks(apollo_xml)
+        else:
+            try:
+                self.tasks = self.get_range_tasks(apollo_xml)
+            except ValueError as e:
+                logger.warning(f"Splitting the parsed xml, {e}")
+                self.tasks = self.get_tasks(
+                    etree.parse(
+                        apollo_xml, etree.XMLParser(huge_tree=True)
+                    ).getroot()
+                )
+
+    @property
+    def chunk_num(self) -> int:
+        return self.max_workers * self.chunks_per_worker
+
+    def get_tasks(self, apollo_xml: etree._Element) -> t.List[ApolloParseTask]:
+        elements = apollo_xml.findall("road") + apollo_xml.findall("junction")
+        costs = [
+            sum(1 for _ in ele.iter("point", "cornerGlobal")) + 1
+            for ele in elements
         ]
 
-        tasks: t.List[str] = []
-        road_chunk: t.Union[t.List[etree._Element], t.List]
-        junction_chunk: t.Union[t.List[etree._Element], t.List]
-        for road_chunk, junction_chunk in zip_longest(
-            road_chunks, junction_chunks, fillvalue=[]
-        ):
+        tasks: t.List[ApolloParseTask] = []
+        for start, end in partition_by_cost(costs, self.chunk_num):
             r = etree.Element("apollo")
-            r.extend(road_chunk)
-            r.extend(junction_chunk)
+            r.extend(elements[start:end])
             tasks.append(
-                etree.tostring(r, encoding="utf-8", pretty_print=True).decode()
+                ApolloParseTask(
+                    source=etree.tostring(
+                        r, encoding="utf-8", pretty_print=True
+                    ).decode(),
+                    element_num=end - start,
+                    cost=sum(costs[start:end]),
+                )
             )
             del r
 
         return tasks
 
-    def run(self) -> ApolloParserResult:
-        for task in self.tasks:
-            self._futures.append(
-                self._proc_pool.submit(ApolloParser.run, task)
+    def get_range_tasks(self, xml_path: str) -> t.List[ApolloParseTask]:
+        xml_path = os.path.abspath(xml_path)
+        element_ranges = scan_element_ranges(xml_path)
+        costs = [r.end - r.start for r in element_ranges]
+
+        tasks: t.List[ApolloParseTask] = []
+        for start, end in partition_by_cost(costs, self.chunk_num):
+            first, last = element_ranges[start], element_ranges[end - 1]
+            tasks.append(
+                ApolloParseTask(
+                    source=(xml_path, first.start, last.end),
+                    element_num=end - start,
+                    cost=sum(costs[start:end]),
+                )
             )
-            del task
 
-        parser_results = []
-        for r in as_completed(self._futures):
-            parser_results.append(r.result())
+        return tasks
 
-        self._proc_pool.shutdown(wait=False)
+    def run(self) -> AnyApolloParserResult:
+        start_time = time.perf_counter()
 
-        return reduce(ApolloParserResult.__iadd__, parser_results)
+        # submit the most expensive chunks first to shorten the tail
+        future_idx: t.Dict[Future, int] = {}
+        for idx in sorted(
+            range(len(self.tasks)),
+            key=lambda x: self.tasks[x].cost,
+            reverse=True,
+        ):
+            future = self._proc_pool.submit(
+                run_parse_task,
+                self.tasks[idx],
+                self.columnar,
+                self.shared_memory,
+            )
+            future_idx[future] = idx
+            self._futures.append(future)
+
+        # merge in document order so that the result does not depend on
+        # which worker finishes first
+        parser_results: t.List[t.Optional[ParseTaskResult]]
+        parser_results = [None] * len(self.tasks)
+        task_stats: t.List[ApolloParseTaskStat] = []
+        try:
+            for r in as_completed(self._futures):
+                parser_result, task_stat = r.result()
+                parser_results[future_idx[r]] = parser_result
+                task_stats.append(task_stat)
+        except BaseException:
+            if self.shared_memory:
+                # free the blocks of the tasks which already finished
+                self.merge_shared_columns(parser_results)
+            raise
+        finally:
+            self._proc_pool.shutdown(wait=False)
+
+        rv: AnyApolloParserResult
+        if self.shared_memory:
+            rv = self.merge_shared_columns(parser_results)
+            if not self.columnar:
+                rv = rv.to_result()
+        elif self.columnar:
+            rv = ApolloColumnarResult.concat(t.cast(t.List, parser_results))
+        elif parser_results:
+            rv = reduce(
+                ApolloParserResult.__iadd__, t.cast(t.List, parser_results)
+            )
+        else:
+            return ApolloParser().result
+        rv.logs.extend(
+            self.get_stat_logs(task_stats, time.perf_counter() - start_time)
+        )
+        self.record_worker_stages(task_stats)
+        return rv
+
+    @staticmethod
+    def merge_shared_columns(
+        shared_columns: t.Sequence[t.Optional[ParseTaskResult]],
+    ) -> ApolloColumnarResult:
+        with ExitStack() as stack:
+            results = [
+                stack.enter_context(
+                    ApolloColumnarResult.attach_shared_memory(item)
+                )
+                for item in shared_columns
+                if isinstance(item, SharedColumns)
+            ]
+            return ApolloColumnarResult.concat(results)
+
+    @staticmethod
+    def record_worker_stages(
+        task_stats: t.List[ApolloParseTaskStat],
+    ) -> None:
+        profiler = get_current_profiler()
+        if profiler is None:
+            return
+
+        worker_stats: t.Dict[int, t.List[ApolloParseTaskStat]] = {}
+        for task_stat in task_stats:
+            worker_stats.setdefault(task_stat.pid, []).append(task_stat)
+        # pids differ between builds, the workers are numbered instead
+        for idx, (_, stats) in enumerate(sorted(worker_stats.items())):
+            profiler.add_stage(
+                f"worker_{idx}",
+                wall_time=sum(stat.wall_time for stat in stats),
+                cpu_time=sum(stat.cpu_time for stat in stats),
+                peak_rss_delta=sum(stat.peak_rss_delta for stat in stats),
+                tasks=len(stats),
+                elements=sum(stat.element_num for stat in stats),
+            )
+
+    @staticmethod
+    def get_stat_logs(
+        task_stats: t.List[ApolloParseTaskStat], wall_time: float
+    ) -> t.List[LogType]:
+        logs: t.List[LogType] = []
+        if not task_stats:
+            return logs
+
+        worker_stats: t.Dict[int, t.List[ApolloParseTaskStat]] = {}
+        for task_stat in task_stats:
+            worker_stats.setdefault(task_stat.pid, []).append(task_stat)
+
+        busy_times = []
+        for pid, stats in worker_stats.items():
+            busy_time = sum(stat.wall_time for stat in stats)
+            busy_times.append(busy_time)
+            logs.append(
+                (
+                    get_datetime_str(),
+                    f"Parser worker {pid}: {len(stats)} tasks, "
+                    f"{sum(stat.element_num for stat in stats)} elements, "
+                    f"cost {sum(stat.cost for stat in stats)}, "
+                    f"busy {busy_time:.2f} s, "
+                    f"cpu {sum(stat.cpu_time for stat in stats):.2f} s, "
+                    f"slowest task {max(s.wall_time for s in stats):.2f} s",
+                    "info",
+                )
+            )
+
+        logs.append(
+            (
+                get_datetime_str(),
+                f"Parsed {len(task_stats)} tasks on {len(worker_stats)} "
+                f"workers in {wall_time:.2f} s, worker busy time "
+                f"min {min(busy_times):.2f} s / max {max(busy_times):.2f} s",
+                "info",
+            )
+        )
+        for log in logs:
+            logger.info(log[1])
+        return logs
@@ -0,0 +1,1421 @@
+"""Columnar (struct of arrays) storage of an apollo parser result.
+
+Every kind of apollo element is kept as a table of numpy columns. Lists
+hanging off an element (links, references, lanes of a section, ...) are
+stored CSR style: an ``<name>_offsets`` column with one entry more than the
+rows of its table, pointing into the rows of a value table. The points of
+all lines are packed into a single ``(n, 2)`` coordinate buffer the same way.
+
+The ``*_datum`` mappings of `ApolloColumnarResult` hand out thin
+``__slots__`` views which expose the attributes of the dataclasses in this
+package, so the layer builders work on both representations.
+"""
+from __future__ import annotations
+import typing as t
+from collections import defaultdict
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+
+import numpy as np
+import shapely
+from shapely.geometry import Point
+
+from megmap_viz.datatypes import LogType
+from megmap_viz.megmap_dataset.utils import simplify_lines
+
+from .base import ApolloGeometry, ApolloReference
+from .juntion import ApolloJunction, ApolloJunctionConnection
+from .lane import (
+    ApolloLane,
+    ApolloLaneBorder,
+    ApolloLaneBorderType,
+    ApolloLaneBoundary,
+    ApolloLaneLink,
+    ApolloLaneNeighbor,
+    ApolloLanePredecessor,
+    ApolloLaneRoadSampleAssociation,
+    ApolloLaneSampleAssociate,
+    ApolloLaneSection,
+    ApolloLaneSpeedLimit,
+    ApolloLaneSuccessor,
+)
+from .object import ApolloObject
+from .road import ApolloRoad
+from .signal import ApolloSignal, ApolloSubSignal
+
+if t.TYPE_CHECKING:
+    from shapely.geometry.base import BaseGeometry
+
+    from .apollo_parser import ApolloParserResult
+
+
+ColumnDict = t.Dict[str, np.ndarray]
+
+
+class SharedColumnLayout(t.NamedTuple):
+    name: str
+    dtype: str
+    shape: t.Tuple[int, ...]
+    offset: int
+
+
+class SharedColumns(t.NamedTuple):
+    """Handle of columns copied into a shared memory block."""
+
+    shm_name: str
+    layout: t.List[SharedColumnLayout]
+    logs: t.List[LogType]
+
+
+# table name -> row aligned columns, the first one gives the row number
+TABLE_COLUMNS: t.Dict[str, t.Tuple[str, ...]] = {
+    "coord": ("coords",),
+    "geom": ("geom_s_offset", "geom_x", "geom_y", "geom_z", "geom_length"),
+    "shape_coord": ("shape_coords",),
+    "shape": ("shape_kind",),
+    "border_type": (
+        "border_type_s_offset",
+        "border_type_type",
+        "border_type_color",
+    ),
+    "lane": (
+        "lane_id",
+        "lane_uid",
+        "lane_type",
+        "lane_direction",
+        "lane_turn_type",
+        "lane_speed_limit",  # -1 if the lane has no speed limit
+        "lane_border_geom",
+        "lane_border_type",
+        "lane_left_border_geom",
+        "lane_left_border_type",
+        "lane_center_geom",
+    ),
+    "lane_pred": ("lane_pred_uid",),
+    "lane_suc": ("lane_suc_uid",),
+    "lane_nei": ("lane_nei_uid", "lane_nei_side", "lane_nei_direction"),
+    "lane_sample": ("lane_sample",),
+    "lane_road_sample": ("lane_road_sample",),
+    "lane_ref": (
+        "lane_ref_kind",
+        "lane_ref_id",
+        "lane_ref_start",
+        "lane_ref_end",
+    ),
+    "section": (
+        "section_id",
+        "section_left_geom",
+        "section_right_geom",
+        "section_ref_lane",
+    ),
+    "section_left": ("section_left_lane",),
+    "section_right": ("section_right_lane",),
+    "signal": (
+        "signal_id",
+        "signal_type",
+        "signal_layout_type",
+        "signal_shape",
+    ),
+    "signal_stopline": ("signal_stopline_id",),
+    "sub_signal": ("sub_signal_id", "sub_signal_type", "sub_signal_center"),
+    "object": ("object_id", "object_type", "object_shape"),
+    "road": ("road_id", "road_type", "road_junction"),
+    "road_section": ("road_section",),
+    "road_signal": ("road_signal",),
+    "road_object": ("road_object",),
+    "junction": ("junction_id", "junction_shape"),
+    "junction_conn": (
+        "junction_conn_id",
+        "junction_conn_incoming",
+        "junction_conn_connecting",
+        "junction_conn_contact",
+    ),
+    # keys of the *_datum mappings
+    "road_key": ("road_key", "road_key_row"),
+    "section_key": ("section_key", "section_key_row"),
+    "lane_key": ("lane_key", "lane_key_row"),
+    "signal_key": ("signal_key", "signal_key_row"),
+    "object_key": ("object_key", "object_key_row"),
+    "junction_key": ("junction_key", "junction_key_row"),
+}
+
+# offsets column -> (table, value table)
+OFFSET_COLUMNS: t.Dict[str, t.Tuple[str, str]] = {
+    "geom_offsets": ("geom", "coord"),
+    "shape_offsets": ("shape", "shape_coord"),
+    "lane_pred_offsets": ("lane", "lane_pred"),
+    "lane_suc_offsets": ("lane", "lane_suc"),
+    "lane_nei_offsets": ("lane", "lane_nei"),
+    "lane_sample_offsets": ("lane", "lane_sample"),
+    "lane_road_sample_offsets": ("lane", "lane_road_sample"),
+    "lane_ref_offsets": ("lane", "lane_ref"),
+    "section_left_offsets": ("section", "section_left"),
+    "section_right_offsets": ("section", "section_right"),
+    "signal_stopline_offsets": ("signal", "signal_stopline"),
+    "signal_sub_offsets": ("signal", "sub_signal"),
+    "road_section_offsets": ("road", "road_section"),
+    "road_signal_offsets": ("road", "road_signal"),
+    "road_object_offsets": ("road", "road_object"),
+    "junction_conn_offsets": ("junction", "junction_conn"),
+}
+
+# row index column -> referenced table, -1 means none
+INDEX_COLUMNS: t.Dict[str, str] = {
+    "lane_border_geom": "geom",
+    "lane_border_type": "border_type",
+    "lane_left_border_geom": "geom",
+    "lane_left_border_type": "border_type",
+    "lane_center_geom": "geom",
+    "section_left_geom": "geom",
+    "section_right_geom": "geom",
+    "section_ref_lane": "lane",
+    "section_left_lane": "lane",
+    "section_right_lane": "lane",
+    "signal_shape": "shape",
+    "object_shape": "shape",
+    "road_section": "section",
+    "road_signal": "signal",
+    "road_object": "object",
+    "junction_shape": "shape",
+    "road_key_row": "road",
+    "section_key_row": "section",
+    "lane_key_row": "lane",
+    "signal_key_row": "signal",
+    "object_key_row": "object",
+    "junction_key_row": "junction",
+}
+
+FLOAT_COLUMNS = {
+    "geom_s_offset",
+    "geom_x",
+    "geom_y",
+    "geom_z",
+    "geom_length",
+    "border_type_s_offset",
+    "lane_ref_start",
+    "lane_ref_end",
+}
+INT_COLUMNS = {"lane_id", "lane_speed_limit", "junction_conn_id"}
+# columns of fixed width rows
+VECTOR_COLUMNS = {
+    "coords": 2,
+    "shape_coords": 2,
+    "lane_sample": 3,
+    "lane_road_sample": 3,
+    "sub_signal_center": 3,
+}
+
+LANE_REFERENCE_KINDS = ("signal", "object", "junction", "lane")
+
+SHAPE_KINDS = ("Polygon", "MultiPoint", "LineString")
+
+
+def get_column_dtype(name: str) -> np.dtype:
+    if name in VECTOR_COLUMNS or name in FLOAT_COLUMNS:
+        return np.dtype(np.float64)
+    if name in INT_COLUMNS or name in INDEX_COLUMNS or name in OFFSET_COLUMNS:
+        return np.dtype(np.int64)
+    if name in ("lane_ref_kind", "shape_kind"):
+        return np.dtype(np.int8)
+    return np.dtype(np.str_)
+
+
+class _ColumnsBuilder:
+    """Flatten the object graph of an `ApolloParserResult` into columns."""
+
+    def __init__(self) -> None:
+        self.values: t.DefaultDict[str, t.List[t.Any]] = defaultdict(list)
+        self.offsets: t.Dict[str, t.List[int]] = {
+            name: [0] for name in OFFSET_COLUMNS
+        }
+        self.coords: t.Dict[str, t.List[np.ndarray]] = {
+            "coords": [],
+            "shape_coords": [],
+        }
+        # rows of the added objects, keyed by kind and object id
+        self.rows: t.DefaultDict[str, t.Dict[int, int]] = defaultdict(dict)
+
+    def _extend(self, offsets_name: str, values: t.Dict[str, t.List]) -> None:
+        for name, value in values.items():
+            self.values[name].extend(value)
+        offsets = self.offsets[offsets_name]
+        offsets.append(offsets[-1] + len(next(iter(values.values()))))
+
+    def _get_row(self, kind: str, obj: t.Any) -> t.Optional[int]:
+        return self.rows[kind].get(id(obj))
+
+    def _new_row(self, kind: str, obj: t.Any) -> int:
+        row = len(self.rows[kind])
+        self.rows[kind][id(obj)] = row
+        return row
+
+    def add_geometry(self, geometry: ApolloGeometry) -> int:
+        row = self._get_row("geom", geometry)
+        if row is not None:
+            return row
+        row = self._new_row("geom", geometry)
+        self.values["geom_s_offset"].append(geometry.s_offset)
+        self.values["geom_x"].append(geometry.x)
+        self.values["geom_y"].append(geometry.y)
+        self.values["geom_z"].append(geometry.z)
+        self.values["geom_length"].append(geometry.length)
+        coords = shapely.get_coordinates(geometry.line)
+        self.coords["coords"].append(coords)
+        offsets = self.offsets["geom_offsets"]
+        offsets.append(offsets[-1] + len(coords))
+        return row
+
+    def add_shape(self, shape: BaseGeometry) -> int:
+        row = self._get_row("shape", shape)
+        if row is not None:
+            return row
+        row = self._new_row("shape", shape)
+        self.values["shape_kind"].append(SHAPE_KINDS.index(shape.geom_type))
+        coords = shapely.get_coordinates(shape)
+        self.coords["shape_coords"].append(coords)
+        offsets = self.offsets["shape_offsets"]
+        offsets.append(offsets[-1] + len(coords))
+        return row
+
+    def add_border(
+        self, border: t.Optional[ApolloLaneBorder]
+    ) -> t.Tuple[int, int]:
+        if border is None:
+            return -1, -1
+        border_type = border.border_type
+        if border_type is None:
+            return self.add_geometry(border.geometry), -1
+        row = self._get_row("border_type", border_type)
+        if row is None:
+            row = self._new_row("border_type", border_type)
+            self.values["border_type_s_offset"].append(border_type.s_offset)
+            self.values["border_type_type"].append(border_type.type)
+            self.values["border_type_color"].append(border_type.color)
+        return self.add_geometry(border.geometry), row
+
+    def add_lane(self, lane: ApolloLane) -> int:
+        row = self._get_row("lane", lane)
+        if row is not None:
+            return row
+
+        border_geom, border_type = self.add_border(lane.border)
+        left_border_geom, left_border_type = self.add_border(lane.left_border)
+        center_geom = self.add_geometry(lane.center_line)
+
+        row = self._new_row("lane", lane)
+        self.values["lane_id"].append(lane.id_)
+        self.values["lane_uid"].append(lane.uid)
+        self.values["lane_type"].append(lane.type_)
+        self.values["lane_direction"].append(lane.direction)
+        self.values["lane_turn_type"].append(lane.turn_type)
+        self.values["lane_speed_limit"].append(
+            -1 if lane.speed_limit is None else lane.speed_limit.max
+        )
+        self.values["lane_border_geom"].append(border_geom)
+        self.values["lane_border_type"].append(border_type)
+        self.values["lane_left_border_geom"].append(left_border_geom)
+        self.values["lane_left_border_type"].append(left_border_type)
+        self.values["lane_center_geom"].append(center_geom)
+
+        link = lane.link
+        self._extend(
+            "lane_pred_offsets",
+            {"lane_pred_uid": [pre.lane_uid for pre in link.predecessors]},
+        )
+        self._extend(
+            "lane_suc_offsets",
+            {"lane_suc_uid": [suc.lane_uid for suc in link.successors]},
+        )
+        self._extend(
+            "lane_nei_offsets",
+            {
+                "lane_nei_uid": [nei.lane_uid for nei in link.neighbors],
+                "lane_nei_side": [nei.side for nei in link.neighbors],
+                "lane_nei_direction": [
+                    nei.direction for nei in link.neighbors
+                ],
+            },
+        )
+        self._extend(
+            "lane_sample_offsets",
+            {
+                "lane_sample": [
+                    (sample.s_offset, sample.left_width, sample.right_width)
+                    for sample in lane.sample_associates
+                ]
+            },
+        )
+        self._extend(
+            "lane_road_sample_offsets",
+            {
+                "lane_road_sample": [
+                    (sample.s_offset, sample.left_width, sample.right_width)
+                    for sample in lane.road_sample_associations
+                ]
+            },
+        )
+        refs = [
+            (kind, ref)
+            for kind, group in zip(
+                range(len(LANE_REFERENCE_KINDS)),
+                (
+                    lane.signal_overlap_group,
+                    lane.object_overlap_group,
+                    lane.junction_overlap_group,
+                    lane.lane_overlap_group,
+                ),
+            )
+            for ref in group
+        ]
+        self._extend(
+            "lane_ref_offsets",
+            {
+                "lane_ref_kind": [kind for kind, _ in refs],
+                "lane_ref_id": [ref.id_ for _, ref in refs],
+                "lane_ref_start": [ref.start_offset for _, ref in refs],
+                "lane_ref_end": [ref.end_offset for _, ref in refs],
+            },
+        )
+        return row
+
+    def add_section(self, section: ApolloLaneSection) -> int:
+        row = self._get_row("section", section)
+        if row is not None:
+            return row
+
+        left_geom = self.add_geometry(section.boundary.left)
+        right_geom = self.add_geometry(section.boundary.right)
+        ref_lane = self.add_lane(section.ref_line)
+        left_lanes = [self.add_lane(lane) for lane in section.left_lanes]
+        right_lanes = [self.add_lane(lane) for lane in section.right_lanes]
+
+        row = self._new_row("section", section)
+        self.values["section_id"].append(section.id_)
+        self.values["section_left_geom"].append(left_geom)
+        self.values["section_right_geom"].append(right_geom)
+        self.values["section_ref_lane"].append(ref_lane)
+        self._extend("section_left_offsets", {"section_left_lane": left_lanes})
+        self._extend(
+            "section_right_offsets", {"section_right_lane": right_lanes}
+        )
+        return row
+
+    def add_signal(self, signal: ApolloSignal) -> int:
+        row = self._get_row("signal", signal)
+        if row is not None:
+            return row
+
+        shape = self.add_shape(signal.outline)
+
+        row = self._new_row("signal", signal)
+        self.values["signal_id"].append(signal.id_)
+        self.values["signal_type"].append(signal.type_)
+        self.values["signal_layout_type"].append(signal.layout_type)
+        self.values["signal_shape"].append(shape)
+        self._extend(
+            "signal_stopline_offsets",
+            {"signal_stopline_id": list(signal.stop_line_refs)},
+        )
+        self._extend(
+            "signal_sub_offsets",
+            {
+                "sub_signal_id": [sub.id_ for sub in signal.sub_signals],
+                "sub_signal_type": [sub.type_ for sub in signal.sub_signals],
+                "sub_signal_center": [
+                    (
+                        sub.center_point.x,
+                        sub.center_point.y,
+                        sub.center_point.z,
+                    )
+                    for sub in signal.sub_signals
+                ],
+            },
+        )
+        return row
+
+    def add_object(self, obj: ApolloObject) -> int:
+        row = self._get_row("object", obj)
+        if row is not None:
+            return row
+
+        shape = self.add_shape(obj.outline)
+
+        row = self._new_row("object", obj)
+        self.values["object_id"].append(obj.id_)
+        self.values["object_type"].append(obj.type_)
+        self.values["object_shape"].append(shape)
+        return row
+
+    def add_road(self, road: ApolloRoad) -> int:
+        row = self._get_row("road", road)
+        if row is not None:
+            return row
+
+        sections = [self.add_section(section) for section in road.lanes]
+        signals = [self.add_signal(signal) for signal in road.signals]
+        objects = [self.add_object(obj) for obj in road.objects]
+
+        row = self._new_row("road", road)
+        self.values["road_id"].append(road.id_)
+        self.values["road_type"].append(road.type_)
+        self.values["road_junction"].append(road.junction)
+        self._extend("road_section_offsets", {"road_section": sections})
+        self._extend("road_signal_offsets", {"road_signal": signals})
+        self._extend("road_object_offsets", {"road_object": objects})
+        return row
+
+    def add_junction(self, junction: ApolloJunction) -> int:
+        row = self._get_row("junction", junction)
+        if row is not None:
+            return row
+
+        shape = self.add_shape(junction.outline)
+
+        row = self._new_row("junction", junction)
+        conns = junction.connections
+        self.values["junction_id"].append(junction.id_)
+        self.values["junction_shape"].append(shape)
+        self._extend(
+            "junction_conn_offsets",
+            {
+                "junction_conn_id": [conn.id_ for conn in conns],
+                "junction_conn_incoming": [
+                    conn.incoming_road for conn in conns
+                ],
+                "junction_conn_connecting": [
+                    conn.connecting_road for conn in conns
+                ],
+                "junction_conn_contact": [
+                    conn.contact_point for conn in conns
+                ],
+            },
+        )
+        return row
+
+    def add_keys(
+        self,
+        table: str,
+        datum: t.Mapping[str, t.Any],
+        add_func: t.Callable[[t.Any], int],
+    ) -> None:
+        for key, value in datum.items():
+            self.values[f"{table}_key"].append(key)
+            self.values[f"{table}_key_row"].append(add_func(value))
+
+    def finish(self) -> ColumnDict:
+        columns: ColumnDict = {}
+        for table_columns in TABLE_COLUMNS.values():
+            for name in table_columns:
+                if name in self.coords:
+                    arrays = self.coords[name]
+                    columns[name] = (
+                        np.concatenate(arrays)[:, :2]
+                        if arrays
+                        else np.empty((0, 2), dtype=np.float64)
+                    )
+                    continue
+                column = np.array(
+                    self.values[name], dtype=get_column_dtype(name)
+                )
+                if name in VECTOR_COLUMNS:
+                    column = column.reshape(-1, VECTOR_COLUMNS[name])
+                columns[name] = column
+        for name, offsets in self.offsets.items():
+            columns[name] = np.array(offsets, dtype=np.int64)
+        return columns
+
+
+class _RowView:
+    __slots__ = ("_store", "_row")
+
+    def __init__(self, store: ApolloColumnarResult, row: int) -> None:
+        self._store = store
+        self._row = row
+
+    def __eq__(self, other: object) -> bool:
+        if type(other) is not type(self):
+            return NotImplemented
+        return self._store is other._store and self._row == other._row
+
+    def __hash__(self) -> int:
+        return hash((id(self._store), self._row))
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(row={self._row})"
+
+
+class ApolloGeometryView(_RowView):
+    __slots__ = ()
+
+    @property
+    def s_offset(self) -> float:
+        return float(self._store.columns["geom_s_offset"][self._row])
+
+    @property
+    def x(self) -> float:
+        return float(self._store.columns["geom_x"][self._row])
+
+    @property
+    def y(self) -> float:
+        return float(self._store.columns["geom_y"][self._row])
+
+    @property
+    def z(self) -> float:
+        return float(self._store.columns["geom_z"][self._row])
+
+    @property
+    def length(self) -> float:
+        return float(self._store.columns["geom_length"][self._row])
+
+    @property
+    def line(self) -> shapely.LineString:
+        return self._store.lines[self._row]
+
+    @property
+    def sim_line(self) -> shapely.LineString:
+        return self._store.get_sim_line(self._row)
+
+
+class ApolloLaneView(_RowView):
+    __slots__ = ()
+
+    def _get(self, name: str) -> t.Any:
+        return self._store.columns[name][self._row]
+
+    def _get_border(
+        self, geom_name: str, type_name: str
+    ) -> t.Optional[ApolloLaneBorder]:
+        geom_row = int(self._get(geom_name))
+        if geom_row < 0:
+            return None
+        return ApolloLaneBorder(
+            border_type=self._store.get_border_type(int(self._get(type_name))),
+            geometry=ApolloGeometryView(self._store, geom_row),
+        )
+
+    def _get_references(self, kind: str) -> t.List[ApolloReference]:
+        columns = self._store.columns
+        rows = self._store.get_slice("lane_ref_offsets", self._row)
+        kind_code = LANE_REFERENCE_KINDS.index(kind)
+        return [
+            ApolloReference(
+                str(columns["lane_ref_id"][row]),
+                float(columns["lane_ref_start"][row]),
+                float(columns["lane_ref_end"][row]),
+            )
+            for row in range(rows.start, rows.stop)
+            if columns["lane_ref_kind"][row] == kind_code
+        ]
+
+    @property
+    def id_(self) -> int:
+        return int(self._get("lane_id"))
+
+    @property
+    def id(self) -> int:
+        return self.id_
+
+    @property
+    def uid(self) -> str:
+        return str(self._get("lane_uid"))
+
+    @property
+    def type_(self) -> str:
+        return str(self._get("lane_type"))
+
+    @property
+    def type(self) -> str:
+        return self.type_
+
+    @property
+    def direction(self) -> str:
+        return str(self._get("lane_direction"))
+
+    @property
+    def turn_type(self) -> str:
+        return str(self._get("lane_turn_type"))
+
+    @property
+    def speed_limit(self) -> t.Optional[ApolloLaneSpeedLimit]:
+        speed_limit = int(self._get("lane_speed_limit"))
+        if speed_limit < 0:
+            return None
+        return ApolloLaneSpeedLimit(max=speed_limit)
+
+    @property
+    def link(self) -> ApolloLaneLink:
+        store = self._store
+        columns = store.columns
+        pres = store.get_slice("lane_pred_offsets", self._row)
+        sucs = store.get_slice("lane_suc_offsets", self._row)
+        neis = store.get_slice("lane_nei_offsets", self._row)
+        return ApolloLaneLink(
+            predecessors=[
+                ApolloLanePredecessor(str(uid))
+                for uid in columns["lane_pred_uid"][pres]
+            ],
+            neighbors=[
+                ApolloLaneNeighbor(
+                    str(uid),
+                    side=t.cast(t.Literal["left", "right"], str(side)),
+                    direction=str(direction),
+                )
+                for uid, side, direction in zip(
+                    columns["lane_nei_uid"][neis],
+                    columns["lane_nei_side"][neis],
+                    columns["lane_nei_direction"][neis],
+                )
+            ],
+            successors=[
+                ApolloLaneSuccessor(str(uid))
+                for uid in columns["lane_suc_uid"][sucs]
+            ],
+        )
+
+    @property
+    def border(self) -> ApolloLaneBorder:
+        return t.cast(
+            ApolloLaneBorder,
+            self._get_border("lane_border_geom", "lane_border_type"),
+        )
+
+    @property
+    def left_border(self) -> t.Optional[ApolloLaneBorder]:
+        return self._get_border(
+            "lane_left_border_geom", "lane_left_border_type"
+        )
+
+    @property
+    def center_line(self) -> ApolloGeometryView:
+        return ApolloGeometryView(
+            self._store, int(self._get("lane_center_geom"))
+        )
+
+    @property
+    def sample_associates(self) -> t.List[ApolloLaneSampleAssociate]:
+        rows = self._store.get_slice("lane_sample_offsets", self._row)
+        return [
+            ApolloLaneSampleAssociate(*sample)
+            for sample in self._store.columns["lane_sample"][rows].tolist()
+        ]
+
+    @property
+    def road_sample_associations(
+        self,
+    ) -> t.List[ApolloLaneRoadSampleAssociation]:
+        rows = self._store.get_slice("lane_road_sample_offsets", self._row)
+        return [
+            ApolloLaneRoadSampleAssociation(*sample)
+            for sample in self._store.columns["lane_road_sample"][
+                rows
+            ].tolist()
+        ]
+
+    @property
+    def signal_overlap_group(self) -> t.List[ApolloReference]:
+        return self._get_references("signal")
+
+    @property
+    def object_overlap_group(self) -> t.List[ApolloReference]:
+        return self._get_references("object")
+
+    @property
+    def junction_overlap_group(self) -> t.List[ApolloReference]:
+        return self._get_references("junction")
+
+    @property
+    def lane_overlap_group(self) -> t.List[ApolloReference]:
+        return self._get_references("lane")
+
+    @property
+    def side(self) -> t.Literal["left", "right", "center"]:
+        if self.id > 0:
+            return "left"
+        elif self.id < 0:
+            return "right"
+        else:
+            return "center"
+
+    @property
+    def road_id(self) -> str:
+        return self.uid.rsplit("_", 2)[0]
+
+    @property
+    def section_id(self) -> int:
+        return int(self.uid.rsplit("_", 2)[1])
+
+    @property
+    def road_section_id(self) -> str:
+        return self.uid.rsplit("_", 1)[0]
+
+    @property
+    def color(self) -> str:
+        return self.border.color
+
+    @property
+    def is_virtual(self) -> bool:
+        return self.border.is_virtual
+
+    @property
+    def border_type(self) -> str:
+        return self.border.type
+
+    def __lt__(self, other: ApolloLaneView) -> bool:
+        if self.section_id != other.section_id:
+            return self.section_id < other.section_id
+        return self.id < other.id
+
+
+class ApolloLaneSectionView(_RowView):
+    __slots__ = ()
+
+    def _get_lanes(
+        self, offsets_name: str, name: str
+    ) -> t.List[ApolloLaneView]:
+        rows = self._store.get_slice(offsets_name, self._row)
+        return [
+            ApolloLaneView(self._store, row)
+            for row in self._store.columns[name][rows].tolist()
+        ]
+
+    @property
+    def id_(self) -> int:
+        return int(self._store.columns["section_id"][self._row])
+
+    @property
+    def id(self) -> int:
+        return self.id_
+
+    @property
+    def boundary(self) -> ApolloLaneBoundary:
+        columns = self._store.columns
+        return ApolloLaneBoundary(
+            left=t.cast(
+                ApolloGeometry,
+                ApolloGeometryView(
+                    self._store, int(columns["section_left_geom"][self._row])
+                ),
+            ),
+            right=t.cast(
+                ApolloGeometry,
+                ApolloGeometryView(
+                    self._store, int(columns["section_right_geom"][self._row])
+                ),
+            ),
+        )
+
+    @property
+    def left_lanes(self) -> t.List[ApolloLaneView]:
+        return self._get_lanes("section_left_offsets", "section_left_lane")
+
+    @property
+    def right_lanes(self) -> t.List[ApolloLaneView]:
+        return self._get_lanes("section_right_offsets", "section_right_lane")
+
+    @property
+    def ref_line(self) -> ApolloLaneView:
+        return ApolloLaneView(
+            self._store,
+            int(self._store.columns["section_ref_lane"][self._row]),
+        )
+
+    def __lt__(self, other: ApolloLaneSectionView) -> bool:
+        return self.id < other.id
+
+
+class ApolloSignalView(_RowView):
+    __slots__ = ()
+
+    @property
+    def id_(self) -> str:
+        return str(self._store.columns["signal_id"][self._row])
+
+    @property
+    def id(self) -> str:
+        return self.id_
+
+    @property
+    def type_(self) -> str:
+        return str(self._store.columns["signal_type"][self._row])
+
+    @property
+    def type(self) -> str:
+        return self.type_
+
+    @property
+    def layout_type(self) -> str:
+        return str(self._store.columns["signal_layout_type"][self._row])
+
+    @property
+    def outline(self) -> shapely.MultiPoint:
+        return self._store.get_shape(
+            int(self._store.columns["signal_shape"][self._row])
+        )
+
+    @property
+    def stop_line_refs(self) -> t.List[str]:
+        rows = self._store.get_slice("signal_stopline_offsets", self._row)
+        return [
+            str(ref_id)
+            for ref_id in self._store.columns["signal_stopline_id"][rows]
+        ]
+
+    @property
+    def sub_signals(self) -> t.List[ApolloSubSignal]:
+        columns = self._store.columns
+        rows = self._store.get_slice("signal_sub_offsets", self._row)
+        return [
+            ApolloSubSignal(
+                id_=str(sub_signal_id),
+                type_=t.cast(t.Any, str(sub_signal_type)),
+                center_point=Point(*center),
+            )
+            for sub_signal_id, sub_signal_type, center in zip(
+                columns["sub_signal_id"][rows],
+                columns["sub_signal_type"][rows],
+                columns["sub_signal_center"][rows].tolist(),
+            )
+        ]
+
+
+class ApolloObjectView(_RowView):
+    __slots__ = ()
+
+    @property
+    def id_(self) -> str:
+        return str(self._store.columns["object_id"][self._row])
+
+    @property
+    def id(self) -> str:
+        return self.id_
+
+    @property
+    def type_(self) -> str:
+        return str(self._store.columns["object_type"][self._row])
+
+    @property
+    def type(self) -> str:
+        return self.type_
+
+    @property
+    def outline(self) -> BaseGeometry:
+        return self._store.get_shape(
+            int(self._store.columns["object_shape"][self._row])
+        )
+
+
+class ApolloRoadView(_RowView):
+    __slots__ = ()
+
+    def _get_rows(self, offsets_name: str, name: str) -> t.List[int]:
+        rows = self._store.get_slice(offsets_name, self._row)
+        return self._store.columns[name][rows].tolist()
+
+    @property
+    def id_(self) -> str:
+        return str(self._store.columns["road_id"][self._row])
+
+    @property
+    def id(self) -> str:
+        return self.id_
+
+    @property
+    def type_(self) -> str:
+        return str(self._store.columns["road_type"][self._row])
+
+    @property
+    def type(self) -> str:
+        return self.type_
+
+    @property
+    def junction(self) -> str:
+        return str(self._store.columns["road_junction"][self._row])
+
+    @property
+    def lanes(self) -> t.List[ApolloLaneSectionView]:
+        return [
+            ApolloLaneSectionView(self._store, row)
+            for row in self._get_rows("road_section_offsets", "road_section")
+        ]
+
+    @property
+    def signals(self) -> t.List[ApolloSignalView]:
+        return [
+            ApolloSignalView(self._store, row)
+            for row in self._get_rows("road_signal_offsets", "road_signal")
+        ]
+
+    @property
+    def objects(self) -> t.List[ApolloObjectView]:
+        return [
+            ApolloObjectView(self._store, row)
+            for row in self._get_rows("road_object_offsets", "road_object")
+        ]
+
+
+class ApolloJunctionView(_RowView):
+    __slots__ = ()
+
+    @property
+    def id_(self) -> str:
+        return str(self._store.columns["junction_id"][self._row])
+
+    @property
+    def id(self) -> str:
+        return self.id_
+
+    @property
+    def outline(self) -> shapely.Polygon:
+        return self._store.get_shape(
+            int(self._store.columns["junction_shape"][self._row])
+        )
+
+    @property
+    def connections(self) -> t.List[ApolloJunctionConnection]:
+        columns = self._store.columns
+        rows = self._store.get_slice("junction_conn_offsets", self._row)
+        return [
+            ApolloJunctionConnection(
+                id_=int(conn_id),
+                incoming_road=str(incoming_road),
+                connecting_road=str(connecting_road),
+                contact_point=t.cast(t.Any, str(contact_point)),
+            )
+            for conn_id, incoming_road, connecting_road, contact_point in zip(
+                columns["junction_conn_id"][rows],
+                columns["junction_conn_incoming"][rows],
+                columns["junction_conn_connecting"][rows],
+                columns["junction_conn_contact"][rows],
+            )
+        ]
+
+
+_V = t.TypeVar("_V", bound=_RowView)
+
+
+class ColumnarDatum(t.Mapping[str, _V]):
+    """Read only mapping from element id to a view of its row."""
+
+    __slots__ = ("_store", "_rows", "_view_cls")
+
+    def __init__(
+        self, store: ApolloColumnarResult, table: str, view_cls: t.Type[_V]
+    ) -> None:
+        self._store = store
+        self._view_cls = view_cls
+        # later rows override earlier ones, like dict.update
+        self._rows: t.Dict[str, int] = dict(
+            zip(
+                store.columns[f"{table}_key"].tolist(),
+                store.columns[f"{table}_key_row"].tolist(),
+            )
+        )
+
+    def __getitem__(self, key: str) -> _V:
+        return self._view_cls(self._store, self._rows[key])
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._rows
+
+    def __iter__(self) -> t.Iterator[str]:
+        return iter(self._rows)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+
+class ApolloColumnarResult:
+    """Struct of arrays counterpart of `ApolloParserResult`.
+
+    It is much more compact than the dataclass object graph and pickles
+    as a handful of numpy buffers, which makes it cheap to send back from
+    the parser workers.
+    """
+
+    def __init__(
+        self,
+        columns: ColumnDict,
+        logs: t.Optional[t.List[LogType]] = None,
+    ) -> None:
+        self.columns = columns
+        self.logs: t.List[LogType] = logs if logs is not None else []
+        self._reset_cache()
+
+    def _reset_cache(self) -> None:
+        self._lines: t.Optional[np.ndarray] = None
+        self._sim_lines: t.Optional[np.ndarray] = None
+        self._shapes: t.Optional[np.ndarray] = None
+        self._datum: t.Dict[str, ColumnarDatum] = {}
+
+    def __getstate__(self) -> t.Dict[str, t.Any]:
+        return {"columns": self.columns, "logs": self.logs}
+
+    def __setstate__(self, state: t.Dict[str, t.Any]) -> None:
+        self.columns = state["columns"]
+        self.logs = state["logs"]
+        self._reset_cache()
+
+    @classmethod
+    def from_result(cls, result: ApolloParserResult) -> ApolloColumnarResult:
+        builder = _ColumnsBuilder()
+        # roads first so that the rows follow the document order
+        builder.add_keys("road", result.road_datum, builder.add_road)
+        builder.add_keys(
+            "section", result.lane_section_datum, builder.add_section
+        )
+        builder.add_keys("lane", result.lane_datum, builder.add_lane)
+        builder.add_keys("signal", result.signal_datum, builder.add_signal)
+        builder.add_keys("object", result.object_datum, builder.add_object)
+        builder.add_keys(
+            "junction", result.junction_datum, builder.add_junction
+        )
+        return cls(builder.finish(), logs=list(result.logs))
+
+    @classmethod
+    def concat(
+        cls, results: t.Sequence[ApolloColumnarResult]
+    ) -> ApolloColumnarResult:
+        """Concatenate the tables, later keys override earlier ones."""
+        parts: t.DefaultDict[str, t.List[np.ndarray]] = defaultdict(list)
+        base = {table: 0 for table in TABLE_COLUMNS}
+        logs: t.List[LogType] = []
+        for result in results:
+            for name, column in result.columns.items():
+                if name in OFFSET_COLUMNS:
+                    column = column[1:] + base[OFFSET_COLUMNS[name][1]]
+                elif name in INDEX_COLUMNS:
+                    column = np.where(
+                        column >= 0, column + base[INDEX_COLUMNS[name]], -1
+                    )
+                parts[name].append(column)
+            for table in TABLE_COLUMNS:
+                base[table] += result.get_row_num(table)
+            logs.extend(result.logs)
+
+        if not parts:
+            return cls(_ColumnsBuilder().finish(), logs=logs)
+
+        columns: ColumnDict = {}
+        for name, column_parts in parts.items():
+            if name in OFFSET_COLUMNS:
+                column_parts = [np.zeros(1, dtype=np.int64)] + column_parts
+            columns[name] = np.concatenate(column_parts)
+        return cls(columns, logs=logs)
+
+    def to_shared_memory(self) -> SharedColumns:
+        """Copy the columns into one shared memory block.
+
+        The block outlives this process, the receiver has to attach it
+        with `attach_shared_memory`, which also frees it.
+        """
+        layout: t.List[SharedColumnLayout] = []
+        size = 0
+        for name, column in self.columns.items():
+            layout.append(
+                SharedColumnLayout(name, column.dtype.str, column.shape, size)
+            )
+            # keep every column 8 bytes aligned
+            size += -(-column.nbytes // 8) * 8
+
+        shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        try:
+            for item in layout:
+                column = self.columns[item.name]
+                shm.buf[item.offset : item.offset + column.nbytes] = (
+                    np.ascontiguousarray(column).view(np.uint8).reshape(-1)
+                )
+        except BaseException:
+            shm.close()
+            shm.unlink()
+            raise
+        shm.close()
+        return SharedColumns(shm.name, layout, self.logs)
+
+    @classmethod
+    @contextmanager
+    def attach_shared_memory(
+        cls, shared: SharedColumns
+    ) -> t.Iterator[ApolloColumnarResult]:
+        """Zero copy view of the columns written by `to_shared_memory`.
+
+        The columns are only valid inside the ``with`` block, copy (e.g.
+        `concat`) whatever has to be kept. The block is unlinked on exit.
+        """
+        shm = shared_memory.SharedMemory(name=shared.shm_name)
+        rv = cls(
+            {
+                item.name: np.ndarray(
+                    item.shape,
+                    dtype=np.dtype(item.dtype),
+                    buffer=shm.buf,
+                    offset=item.offset,
+                )
+                for item in shared.layout
+            },
+            logs=shared.logs,
+        )
+        try:
+            yield rv
+        finally:
+            # the views must be gone before the buffer can be released
+            rv.columns = {}
+            rv._reset_cache()
+            del rv
+            shm.close()
+            shm.unlink()
+
+    def __iadd__(self, o: ApolloColumnarResult) -> ApolloColumnarResult:
+        rv = self.concat([self, o])
+        self.columns = rv.columns
+        self.logs = rv.logs
+        self._reset_cache()
+        return self
+
+    def get_row_num(self, table: str) -> int:
+        return len(self.columns[TABLE_COLUMNS[table][0]])
+
+    def get_slice(self, offsets_name: str, row: int) -> slice:
+        offsets = self.columns[offsets_name]
+        return slice(int(offsets[row]), int(offsets[row + 1]))
+
+    @property
+    def lines(self) -> np.ndarray:
+        """Lines of all geometries, built in bulk on first access."""
+        if self._lines is None:
+            point_nums = np.diff(self.columns["geom_offsets"])
+            self._lines = shapely.linestrings(
+                self.columns["coords"],
+                indices=np.repeat(np.arange(len(point_nums)), point_nums),
+            )
+        return self._lines
+
+    @property
+    def sim_lines(self) -> np.ndarray:
+        """Simplified lines of all geometries, built in bulk on first
+        access."""
+        if self._sim_lines is None:
+            self._sim_lines = simplify_lines(self.lines)
+        return self._sim_lines
+
+    def get_sim_line(self, row: int) -> shapely.LineString:
+        return self.sim_lines[row]
+
+    def get_shape(self, row: int) -> t.Any:
+        if self._shapes is None:
+            self._shapes = np.full(
+                self.get_row_num("shape"), None, dtype=object
+            )
+        if self._shapes[row] is None:
+            coords = self.columns["shape_coords"][
+                self.get_slice("shape_offsets", row)
+            ]
+            kind = SHAPE_KINDS[self.columns["shape_kind"][row]]
+            if kind == "Polygon":
+                self._shapes[row] = shapely.polygons(coords)
+            elif kind == "MultiPoint":
+                self._shapes[row] = shapely.multipoints(coords)
+            else:
+                self._shapes[row] = shapely.linestrings(coords)
+        return self._shapes[row]
+
+    def get_border_type(self, row: int) -> t.Optional[ApolloLaneBorderType]:
+        if row < 0:
+            return None
+        return ApolloLaneBorderType(
+            s_offset=float(self.columns["border_type_s_offset"][row]),
+            type=str(self.columns["border_type_type"][row]),
+            color=str(self.columns["border_type_color"][row]),
+        )
+
+    def _get_datum(
+        self, table: str, view_cls: t.Type[_V]
+    ) -> ColumnarDatum[_V]:
+        if table not in self._datum:
+            self._datum[table] = ColumnarDatum(self, table, view_cls)
+        return self._datum[table]
+
+    @property
+    def road_datum(self) -> ColumnarDatum[ApolloRoadView]:
+        return self._get_datum("road", ApolloRoadView)
+
+    @property
+    def lane_section_datum(self) -> ColumnarDatum[ApolloLaneSectionView]:
+        return self._get_datum("section", ApolloLaneSectionView)
+
+    @property
+    def lane_datum(self) -> ColumnarDatum[ApolloLaneView]:
+        return self._get_datum("lane", ApolloLaneView)
+
+    @property
+    def object_datum(self) -> ColumnarDatum[ApolloObjectView]:
+        return self._get_datum("object", ApolloObjectView)
+
+    @property
+    def signal_datum(self) -> ColumnarDatum[ApolloSignalView]:
+        return self._get_datum("signal", ApolloSignalView)
+
+    @property
+    def junction_datum(self) -> ColumnarDatum[ApolloJunctionView]:
+        return self._get_datum("junction", ApolloJunctionView)
+
+    def to_result(self) -> ApolloParserResult:
+        """Materialize the dataclass object graph again."""
+        from .apollo_parser import ApolloParserResult
+
+        return _ResultBuilder(self).build(ApolloParserResult)
+
+
+class _ResultBuilder:
+    """Turn the views back into dataclasses, sharing objects by row."""
+
+    def __init__(self, store: ApolloColumnarResult) -> None:
+        self.store = store
+        self.objs: t.DefaultDict[str, t.Dict[int, t.Any]] = defaultdict(dict)
+
+    def _memo(self, kind: str, row: int, func: t.Callable[[], t.Any]) -> t.Any:
+        objs = self.objs[kind]
+        if row not in objs:
+            objs[row] = func()
+        return objs[row]
+
+    def geometry(self, view: ApolloGeometryView) -> ApolloGeometry:
+        return self._memo(
+            "geom",
+            view._row,
+            lambda: ApolloGeometry(
+                s_offset=view.s_offset,
+                x=view.x,
+                y=view.y,
+                z=view.z,
+                length=view.length,
+                line=view.line,
+            ),
+        )
+
+    def border(
+        self, border: t.Optional[ApolloLaneBorder]
+    ) -> t.Optional[ApolloLaneBorder]:
+        if border is None:
+            return None
+        return ApolloLaneBorder(
+            border_type=border.border_type,
+            geometry=self.geometry(
+                t.cast(ApolloGeometryView, border.geometry)
+            ),
+        )
+
+    def lane(self, view: ApolloLaneView) -> ApolloLane:
+        return self._memo(
+            "lane",
+            view._row,
+            lambda: ApolloLane(
+                id_=view.id_,
+                uid=view.uid,
+                type_=view.type_,
+                direction=view.direction,
+                turn_type=view.turn_type,
+                speed_limit=view.speed_limit,
+                link=view.link,
+                border=t.cast(ApolloLaneBorder, self.border(view.border)),
+                left_border=self.border(view.left_border),
+                center_line=self.geometry(view.center_line),
+                sample_associates=view.sample_associates,
+                road_sample_associations=view.road_sample_associations,
+                signal_overlap_group=view.signal_overlap_group,
+                object_overlap_group=view.object_overlap_group,
+                junction_overlap_group=view.junction_overlap_group,
+                lane_overlap_group=view.lane_overlap_group,
+            ),
+        )
+
+    def section(self, view: ApolloLaneSectionView) -> ApolloLaneSection:
+        def build() -> ApolloLaneSection:
+            boundary = view.boundary
+            return ApolloLaneSection(
+                id_=view.id_,
+                boundary=ApolloLaneBoundary(
+                    left=self.geometry(
+                        t.cast(ApolloGeometryView, boundary.left)
+                    ),
+                    right=self.geometry(
+                        t.cast(ApolloGeometryView, boundary.right)
+                    ),
+                ),
+                left_lanes=[self.lane(lane) for lane in view.left_lanes],
+                right_lanes=[self.lane(lane) for lane in view.right_lanes],
+                ref_line=self.lane(view.ref_line),
+            )
+
+        return self._memo("section", view._row, build)
+
+    def signal(self, view: ApolloSignalView) -> ApolloSignal:
+        return self._memo(
+            "signal",
+            view._row,
+            lambda: ApolloSignal(
+                id_=view.id_,
+                type_=view.type_,
+                layout_type=view.layout_type,
+                outline=view.outline,
+                stop_line_refs=view.stop_line_refs,
+                sub_signals=view.sub_signals,
+            ),
+        )
+
+    def object(self, view: ApolloObjectView) -> ApolloObject:
+        return self._memo(
+            "object",
+            view._row,
+            lambda: ApolloObject(
+                id_=view.id_,
+                type_=t.cast(t.Any, view.type_),
+                outline=view.outline,
+            ),
+        )
+
+    def road(self, view: ApolloRoadView) -> ApolloRoad:
+        return self._memo(
+            "road",
+            view._row,
+            lambda: ApolloRoad(
+                id_=view.id_,
+                type_=view.type_,
+                junction=view.junction,
+                lanes=[self.section(section) for section in view.lanes],
+                signals=[self.signal(signal) for signal in view.signals],
+                objects=[self.object(obj) for obj in view.objects],
+            ),
+        )
+
+    def junction(self, view: ApolloJunctionView) -> ApolloJunction:
+        return self._memo(
+            "junction",
+            view._row,
+            lambda: ApolloJunction(
+                id_=view.id_,
+                outline=view.outline,
+                connections=view.connections,
+            ),
+        )
+
+    def build(
+        self, result_cls: t.Type[ApolloParserResult]
+    ) -> ApolloParserResult:
+        store = self.store
+        return result_cls(
+            road_datum={k: self.road(v) for k, v in store.road_datum.items()},
+            lane_section_datum={
+                k: self.section(v) for k, v in store.lane_section_datum.items()
+            },
+            lane_datum={k: self.lane(v) for k, v in store.lane_datum.items()},
+            object_datum={
+                k: self.object(v) for k, v in store.object_datum.items()
+            },
+            signal_datum={
+                k: self.signal(v) for k, v in store.signal_datum.items()
+            },
+            junction_datum={
+                k: self.junction(v) for k, v in store.junction_datum.items()
+            },
+            logs=list(store.logs),
+        )
@@ -0,0 +1,195 @@
+"""Incremental parsing of a new version of an apollo map.
+
+Consecutive versions of a map usually change only a few percent of the
+roads. Every top level ``<road>`` and ``<junction>`` element is hashed by
+its bytes, and only the elements whose hash differs from the base version
+are parsed again. The results of the unchanged elements are taken from the
+parsed base version.
+
+Parsing an element does not depend on any other element, so splicing the
+per element results in document order gives the same result as a full
+parse.
+"""
+from __future__ import annotations
+import re
+import mmap
+import hashlib
+import logging
+import typing as t
+
+from megmap_viz.utils.datetime_str import get_datetime_str
+
+from .apollo_parser import (
+    APOLLO_ELEMENT_START_PATTERN,
+    ApolloParser,
+    ApolloParserResult,
+    scan_element_ranges,
+)
+
+logger = logging.getLogger(__name__)
+
+ELEMENT_ID_PATTERN = re.compile(rb'\sid="([^"]*)"')
+DATUM_NAMES = (
+    "road_datum",
+    "lane_section_datum",
+    "lane_datum",
+    "object_datum",
+    "signal_datum",
+    "junction_datum",
+)
+
+# element key (``<tag>:<id>``) -> content hash
+ElementHashes = t.Dict[str, str]
+# element key -> datum name -> items of the element in parse order
+ElementItems = t.Dict[str, t.Dict[str, t.List[t.Tuple[str, t.Any]]]]
+
+
+class ApolloElementHash(t.NamedTuple):
+    key: str
+    start: int
+    end: int
+    digest: str
+
+
+def get_element_key(tag: str, element_id: str) -> str:
+    return f"{tag}:{element_id}"
+
+
+def scan_element_hashes(xml_path: str) -> t.List[ApolloElementHash]:
+    """Hash the bytes of every top level element of an apollo xml file."""
+    elements: t.List[ApolloElementHash] = []
+    element_ranges = scan_element_ranges(xml_path)
+    if not element_ranges:
+        return elements
+
+    with open(xml_path, "rb") as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for r in element_ranges:
+                start_tag = APOLLO_ELEMENT_START_PATTERN.match(
+                    mm, r.start  # type: ignore
+                )
+                match = ELEMENT_ID_PATTERN.search(
+                    t.cast(re.Match, start_tag).group()
+                )
+                element_id = match.group(1).decode() if match else ""
+                elements.append(
+                    ApolloElementHash(
+                        key=get_element_key(r.tag, element_id),
+                        start=r.start,
+                        end=r.end,
+                        digest=hashlib.md5(mm[r.start : r.end]).hexdigest(),
+                    )
+                )
+    return elements
+
+
+def group_by_element(result: ApolloParserResult) -> ElementItems:
+    """Split the datum of a parser result by the element they come from."""
+    owners: t.Dict[str, t.Dict[str, str]] = {name: {} for name in DATUM_NAMES}
+    for road_id, road in result.road_datum.items():
+        owner = get_element_key("road", road_id)
+        owners["road_datum"][road_id] = owner
+        for section in road.lanes:
+            owners["lane_section_datum"][
+                section.ref_line.road_section_id
+            ] = owner
+            lanes = [section.ref_line, *section.left_lanes]
+            for lane in lanes + section.right_lanes:
+                owners["lane_datum"][lane.uid] = owner
+        for signal in road.signals:
+            owners["signal_datum"][signal.id] = owner
+        for obj in road.objects:
+            owners["object_datum"][obj.id] = owner
+    for junction_id in result.junction_datum:
+        owners["junction_datum"][junction_id] = get_element_key(
+            "junction", junction_id
+        )
+
+    rv: ElementItems = {}
+    for name in DATUM_NAMES:
+        # iterate the datum itself to keep the order of a full parse
+        for key, value in getattr(result, name).items():
+            owner = owners[name].get(key)
+            if owner is None:
+                continue
+            rv.setdefault(owner, {}).setdefault(name, []).append((key, value))
+    return rv
+
+
+class IncrementalApolloParser:
+    """Parse an apollo xml file based on the parse of an earlier version.
+
+    If more than ``max_changed_ratio`` of the elements changed, a full
+    parse is cheaper and `run` returns None.
+    """
+
+    def __init__(
+        self,
+        xml_path: str,
+        elements: t.Optional[t.List[ApolloElementHash]] = None,
+        max_changed_ratio: float = 0.5,
+    ) -> None:
+        self.xml_path = xml_path
+        self.elements = (
+            elements if elements is not None else scan_element_hashes(xml_path)
+        )
+        self.max_changed_ratio = max_changed_ratio
+
+    @property
+    def element_hashes(self) -> ElementHashes:
+        return {element.key: element.digest for element in self.elements}
+
+    def get_changed_ranges(
+        self, base_hashes: ElementHashes
+    ) -> t.List[t.Tuple[int, int]]:
+        """Byte ranges of the changed elements, adjacent ones merged."""
+        ranges: t.List[t.Tuple[int, int]] = []
+        prev_changed = False
+        for element in self.elements:
+            changed = base_hashes.get(element.key) != element.digest
+            if changed and prev_changed:
+                ranges[-1] = (ranges[-1][0], element.end)
+            elif changed:
+                ranges.append((element.start, element.end))
+            prev_changed = changed
+        return ranges
+
+    def run(
+        self,
+        base_result: ApolloParserResult,
+        base_hashes: ElementHashes,
+    ) -> t.Optional[ApolloParserResult]:
+        changed_keys = {
+            element.key
+            for element in self.elements
+            if base_hashes.get(element.key) != element.digest
+        }
+        if len(changed_keys) > self.max_changed_ratio * len(self.elements):
+            return None
+
+        parser = ApolloParser()
+        for start, end in self.get_changed_ranges(base_hashes):
+            for _ in parser.iter_parse_range(self.xml_path, start, end):
+                pass
+
+        base_items = group_by_element(base_result)
+        changed_items = group_by_element(parser.result)
+        rv = ApolloParserResult({}, {}, {}, {}, {}, {})
+        for element in self.elements:
+            if element.key in changed_keys:
+                items = changed_items.get(element.key, {})
+            else:
+                items = base_items.get(element.key, {})
+            for name, datum_items in items.items():
+                getattr(rv, name).update(datum_items)
+
+        rv.logs.append(
+            (
+                get_datetime_str(),
+                f"Incremental parse: {len(changed_keys)} of "
+                f"{len(self.elements)} elements changed",
+                "info",
+            )
+        )
+        logger.info(rv.logs[-1][1])
+        return rv
@@ -0,0 +1,178 @@
+import typing as t
+from pathlib import Path
+
+import pytest
+
+
+def make_geometry_xml(x: float, y: float, point_num: int) -> str:
+    points = "".join(
+        f'<point x="{x + i * 1e-5:.8f}" y="{y + i * 1e-6:.8f}" z="0.0"/>'
+        for i in range(point_num)
+    )
+    return (
+        f'<geometry sOffset="0.0" x="{x:.8f}" y="{y:.8f}" z="0.0" '
+        f'length="{point_num:.1f}"><pointSet>{points}</pointSet></geometry>'
+    )
+
+
+def make_lane_xml(
+    road_id: str, lane_id: int, x: float, y: float, point_num: int
+) -> str:
+    uid = f"{road_id}_0_{lane_id}"
+    idx = int(road_id)
+    link = (
+        f'<predecessor id="{idx - 1}_0_{lane_id}"/>'
+        f'<successor id="{idx + 1}_0_{lane_id}"/>'
+        f'<neighbor id="{road_id}_0_{lane_id - 1}" side="right" '
+        f'direction="same"/>'
+    )
+    refs = (
+        f'<signalOverlapGroup><signalReference id="signal_{road_id}" '
+        f'startOffset="0.0" endOffset="1.0"/></signalOverlapGroup>'
+        f'<objectOverlapGroup><objectReference id="stopline_{road_id}" '
+        f'startOffset="0.0" endOffset="1.0"/></objectOverlapGroup>'
+        f'<junctionOverlapGroup><junctionReference id="j_{road_id}" '
+        f'startOffset="0.0" endOffset="1.0"/></junctionOverlapGroup>'
+        f'<laneOverlapGroup><laneReference id="{idx + 1}_0_{lane_id}" '
+        f'startOffset="0.0" endOffset="1.0"/></laneOverlapGroup>'
+    )
+    return (
+        f'<lane id="{lane_id}" uid="{uid}" type="driving" '
+        f'direction="forward" turnType="noTurn">'
+        f"<link>{link if lane_id else ''}</link>"
+        f'<speed max="60"/>'
+        f'<border virtual="FALSE">'
+        f'<borderType sOffset="0.0" type="solid" color="white"/>'
+        f"{make_geometry_xml(x, y, point_num)}</border>"
+        f"<centerLine>{make_geometry_xml(x, y + 1e-5, point_num)}"
+        f"</centerLine>"
+        f'<sampleAssociates><sampleAssociate sOffset="0.0" '
+        f'leftWidth="1.5" rightWidth="1.5"/></sampleAssociates>'
+        f'<roadSampleAssociations><roadSampleAssociation sOffset="0.0" '
+        f'leftWidth="3.0" rightWidth="3.0"/></roadSampleAssociations>'
+        f"{refs if lane_id else ''}"
+        f"</lane>"
+    )
+
+
+def make_road_xml(
+    road_id: str, junction: str, lane_num: int, point_num: int
+) -> str:
+    x, y = 121.3 + int(road_id) * 1e-3, 30.27
+    boundaries = (
+        f'<boundaries><boundary type="leftBoundary">'
+        f"{make_geometry_xml(x, y + 1e-4, point_num)}</boundary>"
+        f'<boundary type="rightBoundary">'
+        f"{make_geometry_xml(x, y - 1e-4, point_num)}</boundary>"
+        f"</boundaries>"
+    )
+    center = make_lane_xml(road_id, 0, x, y, point_num)
+    left = make_lane_xml(road_id, 1, x, y + 4e-5, point_num)
+    right = "".join(
+        make_lane_xml(road_id, -i, x, y - i * 4e-5, point_num)
+        for i in range(1, lane_num + 1)
+    )
+    signal = (
+        f'<signals><signal id="signal_{road_id}" type="trafficLight" '
+        f'layoutType="horizontal"><outline>'
+        f'<cornerGlobal x="{x:.8f}" y="{y:.8f}" z="5.0"/>'
+        f'<cornerGlobal x="{x + 1e-5:.8f}" y="{y + 1e-5:.8f}" z="6.0"/>'
+        f"</outline>"
+        f'<subSignal id="0" type="circle">'
+        f'<centerPoint x="{x:.8f}" y="{y:.8f}" z="5.5"/></subSignal>'
+        f'<stopLine><objectReference id="stopline_{road_id}"/></stopLine>'
+        f"</signal></signals>"
+    )
+    objects = (
+        f'<objects><object id="stopline_{road_id}" type="stopline">'
+        f"{make_geometry_xml(x, y, 2)}</object>"
+        f'<object id="crosswalk_{road_id}" type="crosswalk"><outline>'
+        f'<cornerGlobal x="{x:.8f}" y="{y:.8f}" z="0.0"/>'
+        f'<cornerGlobal x="{x + 1e-5:.8f}" y="{y:.8f}" z="0.0"/>'
+        f'<cornerGlobal x="{x + 1e-5:.8f}" y="{y + 1e-5:.8f}" z="0.0"/>'
+        f"</outline></object></objects>"
+    )
+    return (
+        f'<road id="{road_id}" type="city" junction="{junction}" name="">'
+        f"<lanes><laneSection>{boundaries}"
+        f"<left>{left}</left><center>{center}</center>"
+        f"<right>{right}</right></laneSection></lanes>"
+        f"{signal}{objects}</road>"
+    )
+
+
+def make_junction_xml(junction_id: str, road_id: str) -> str:
+    x, y = 121.3 + int(road_id) * 1e-3, 30.27
+    corners = "".join(
+        f'<cornerGlobal x="{x + dx:.8f}" y="{y + dy:.8f}" z="0.0"/>'
+        for dx, dy in ((0, 0), (1e-4, 0), (1e-4, 1e-4), (0, 1e-4))
+    )
+    return (
+        f'<junction id="{junction_id}"><outline>{corners}</outline>'
+        f'<connection id="0" incomingRoad="{int(road_id) - 1}" '
+        f'connectingRoad="{road_id}" contactPoint="start"/></junction>'
+    )
+
+
+def make_apollo_xml(
+    road_num: int = 6, lane_num: int = 2, point_num: int = 8
+) -> str:
+    """Build a small apollo map whose every third road is a junction
+    connecting road."""
+    roads = []
+    junctions = []
+    for idx in range(road_num):
+        road_id = str(idx)
+        junction = "-1"
+        if idx % 3 == 2:
+            junction = f"j_{road_id}"
+            junctions.append(make_junction_xml(junction, road_id))
+        roads.append(make_road_xml(road_id, junction, lane_num, point_num))
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n<OpenDRIVE>'
+        '<header revMajor="1" revMinor="0" name="test"/>\n'
+        + "\n".join(roads + junctions)
+        + "\n</OpenDRIVE>\n"
+    )
+
+
+@pytest.fixture
+def test_apollo_xml_str() -> str:
+    return make_apollo_xml()
+
+
+@pytest.fixture
+def test_apollo_xml_path(tmp_path: Path, test_apollo_xml_str: str) -> str:
+    path = tmp_path / "test_20240101_v0.xml"
+    path.write_text(test_apollo_xml_str, encoding="utf-8")
+    return str(path)
+
+
+@pytest.fixture
+def test_apollo_geo_reference_xml_path(
+    tmp_path: Path, test_apollo_xml_str: str
+) -> str:
+    """The test map with the CDATA geoReference header of real apollo maps,
+    and a comment inside a road."""
+    xml_str = test_apollo_xml_str.replace(
+        '<header revMajor="1" revMinor="0" name="test"/>',
+        '<header revMajor="1" revMinor="0" name="test"><geoReference>'
+        "<![CDATA[+proj=tmerc +lat_0=0 +lon_0=117 +k=1 +x_0=0 +y_0=0 "
+        "+ellps=WGS84 +units=m +no_defs]]></geoReference></header>",
+        1,
+    ).replace("</road>", "<!-- </road> --></road>", 1)
+    path = tmp_path / "test_20240101_v1.xml"
+    path.write_text(xml_str, encoding="utf-8")
+    return str(path)
+
+
+@pytest.fixture
+def apollo_xml_factory(
+    tmp_path: Path,
+) -> t.Callable[..., str]:
+    def factory(name: str = "test_20240101_v0", **kwargs) -> str:
+        path = tmp_path / f"{name}.xml"
+        path.write_text(make_apollo_xml(**kwargs), encoding="utf-8")
+        return str(path)
+
+    return factory
@@ -0,0 +1,233 @@
+from pathlib import Path
+
+import pytest
+from lxml import etree
+
+from megmap_viz.megmap_dataset.megmap_apollo.apollo_parser import (
+    ApolloParser,
+    MultiApolloParser,
+    scan_element_ranges,
+)
+from megmap_viz.megmap_dataset.megmap_apollo.base import ApolloReference
+from megmap_viz.megmap_dataset.megmap_apollo.incremental import (
+    scan_element_hashes,
+)
+from megmap_viz.megmap_dataset.megmap_apollo.juntion import ApolloJunction
+from megmap_viz.megmap_dataset.megmap_apollo.road import ApolloRoad
+from megmap_viz.megmap_dataset.utils import partition_by_cost
+
+from .conftest import make_lane_xml
+
+
+def test_streaming_parser(
+    test_apollo_xml_str: str, test_apollo_xml_path: str
+) -> None:
+    expected = ApolloParser(
+        etree.fromstring(test_apollo_xml_str.encode())
+    ).get_result()
+
+    parser = ApolloParser()
+    elements = list(parser.iter_parse(test_apollo_xml_path))
+    assert len([e for e in elements if isinstance(e, ApolloRoad)]) == 6
+    assert len([e for e in elements if isinstance(e, ApolloJunction)]) == 2
+
+    rv = parser.result
+    assert rv.road_datum.keys() == expected.road_datum.keys()
+    assert rv.lane_datum.keys() == expected.lane_datum.keys()
+    assert rv.lane_section_datum.keys() == expected.lane_section_datum.keys()
+    assert rv.signal_datum.keys() == expected.signal_datum.keys()
+    assert rv.object_datum.keys() == expected.object_datum.keys()
+    assert rv.junction_datum.keys() == expected.junction_datum.keys()
+    for uid, lane in rv.lane_datum.items():
+        assert lane.center_line.line.equals(
+            expected.lane_datum[uid].center_line.line
+        )
+
+
+def test_streaming_parser_file_object(test_apollo_xml_path: str) -> None:
+    with open(test_apollo_xml_path, "rb") as f:
+        rv = ApolloParser.run_streaming(f)
+    assert len(rv.lane_datum) == 6 * 4
+
+
+def test_scan_element_ranges(test_apollo_xml_path: str) -> None:
+    ranges = scan_element_ranges(test_apollo_xml_path)
+    assert [r.tag for r in ranges] == ["road"] * 6 + ["junction"] * 2
+
+    with open(test_apollo_xml_path, "rb") as f:
+        content = f.read()
+    for r in ranges:
+        ele = etree.fromstring(content[r.start : r.end])
+        assert ele.tag == r.tag
+
+
+def test_scan_element_ranges_markup(
+    tmp_path: Path, test_apollo_xml_str: str
+) -> None:
+    # ">" in an attribute value and whitespace in closing tags
+    xml_str = test_apollo_xml_str.replace('name=""', 'name="a>b"', 1).replace(
+        "</road>", "</road >", 1
+    )
+    xml_path = tmp_path / "markup.xml"
+    xml_path.write_text(xml_str, encoding="utf-8")
+    ranges = scan_element_ranges(str(xml_path))
+    assert [r.tag for r in ranges] == ["road"] * 6 + ["junction"] * 2
+    content = xml_path.read_bytes()
+    for r in ranges:
+        assert etree.fromstring(content[r.start : r.end]).tag == r.tag
+
+    # a road in a comment is skipped
+    xml_path.write_text(
+        xml_str.replace("<OpenDRIVE>", '<OpenDRIVE><!-- <road id="x"> -->'),
+        encoding="utf-8",
+    )
+    assert len(scan_element_ranges(str(xml_path))) == 8
+
+    # entities of a doctype, only expanded by parsing the file
+    xml_path.write_text(
+        xml_str.replace(
+            "<OpenDRIVE>",
+            '<!DOCTYPE OpenDRIVE [<!ENTITY e "e">]><OpenDRIVE>',
+        ),
+        encoding="utf-8",
+    )
+    with pytest.raises(ValueError):
+        scan_element_ranges(str(xml_path))
+    parser = MultiApolloParser(str(xml_path), max_workers=2)
+    assert all(isinstance(task.source, str) for task in parser.tasks)
+    rv = parser.run()
+    expected = ApolloParser.run_streaming(str(xml_path))
+    assert rv.road_datum.keys() == expected.road_datum.keys()
+    assert rv.lane_datum.keys() == expected.lane_datum.keys()
+
+
+def test_scan_element_ranges_geo_reference(
+    test_apollo_geo_reference_xml_path: str,
+) -> None:
+    ranges = scan_element_ranges(test_apollo_geo_reference_xml_path)
+    assert [r.tag for r in ranges] == ["road"] * 6 + ["junction"] * 2
+    with open(test_apollo_geo_reference_xml_path, "rb") as file:
+        content = file.read()
+    for r in ranges:
+        assert etree.fromstring(content[r.start : r.end]).tag == r.tag
+    hashes = scan_element_hashes(test_apollo_geo_reference_xml_path)
+    assert [h.key for h in hashes][:2] == ["road:0", "road:1"]
+
+    # the file is split by byte ranges, not parsed first
+    parser = MultiApolloParser(
+        test_apollo_geo_reference_xml_path, max_workers=2
+    )
+    assert all(isinstance(task.source, tuple) for task in parser.tasks)
+    rv = parser.run()
+    expected = ApolloParser.run_streaming(test_apollo_geo_reference_xml_path)
+    assert rv.road_datum.keys() == expected.road_datum.keys()
+    assert rv.lane_datum.keys() == expected.lane_datum.keys()
+    assert rv.junction_datum.keys() == expected.junction_datum.keys()
+
+
+def test_multi_parser_byte_ranges(test_apollo_xml_path: str) -> None:
+    expected = ApolloParser.run_streaming(test_apollo_xml_path)
+
+    parser = MultiApolloParser(test_apollo_xml_path)
+    assert all(isinstance(task.source, tuple) for task in parser.tasks)
+    rv = parser.run()
+    assert rv.road_datum.keys() == expected.road_datum.keys()
+    assert rv.lane_datum.keys() == expected.lane_datum.keys()
+    assert rv.junction_datum.keys() == expected.junction_datum.keys()
+
+
+def test_partition_by_cost() -> None:
+    assert partition_by_cost([], 4) == []
+    assert partition_by_cost([1, 1, 1, 1], 2) == [(0, 2), (2, 4)]
+    assert partition_by_cost([1, 1], 4) == [(0, 1), (1, 2)]
+    # a huge element gets a chunk of its own
+    assert partition_by_cost([1, 1, 1, 100, 1, 1, 1], 3) == [
+        (0, 3),
+        (3, 4),
+        (4, 7),
+    ]
+
+
+def test_multi_parser_cost_balanced(
+    test_apollo_xml_str: str, test_apollo_xml_path: str
+) -> None:
+    tree = etree.fromstring(test_apollo_xml_str.encode())
+    parser = MultiApolloParser(tree, max_workers=2, chunks_per_worker=2)
+    assert len(parser.tasks) == 4
+    assert sum(task.element_num for task in parser.tasks) == 8
+
+    rv = parser.run()
+    expected = ApolloParser.run_streaming(test_apollo_xml_path)
+    assert rv.lane_datum.keys() == expected.lane_datum.keys()
+    assert any("Parser worker" in log[1] for log in rv.logs)
+
+
+def test_parse_geometry_coords(test_apollo_xml_str: str) -> None:
+    tree = etree.fromstring(test_apollo_xml_str.encode())
+    rv = ApolloParser(tree).get_result()
+
+    for geometry_ele in tree.iter("geometry"):
+        if geometry_ele.getparent().tag != "centerLine":
+            continue
+        lane_uid = geometry_ele.getparent().getparent().attrib["uid"]
+        expected = [
+            (float(p.attrib["x"]), float(p.attrib["y"]))
+            for p in geometry_ele.iter("point")
+        ]
+        line = rv.lane_datum[lane_uid].center_line.line
+        assert list(line.coords) == expected
+
+    junction = rv.junction_datum["j_2"]
+    assert junction.outline.geom_type == "Polygon"
+    assert len(junction.outline.exterior.coords) == 5
+    assert rv.signal_datum["signal_0"].outline.geom_type == "MultiPoint"
+
+
+def test_visit_lane() -> None:
+    lane_ele = etree.fromstring(make_lane_xml("3", 1, 121.3, 30.27, 4))
+    rv = ApolloParser()._visit_lane(lane_ele)
+    assert {tag: ele.tag for tag, ele in rv.children.items()} == {
+        "link": "link",
+        "speed": "speed",
+        "border": "border",
+        "centerLine": "centerLine",
+    }
+    assert rv.children["speed"].attrib["max"] == "60"
+    # only the direct children of the structural elements
+    assert rv.grandchildren.keys() == {
+        ("border", "borderType"),
+        ("border", "geometry"),
+        ("centerLine", "geometry"),
+    }
+    assert rv.grandchildren[("border", "borderType")].attrib["type"] == (
+        "solid"
+    )
+    assert rv.grandchildren[("centerLine", "geometry")].getparent() is (
+        rv.children["centerLine"]
+    )
+    assert {
+        tag: [ele.attrib["id"] for ele in eles]
+        for tag, eles in rv.links.items()
+    } == {
+        "predecessor": ["2_0_1"],
+        "neighbor": ["3_0_0"],
+        "successor": ["4_0_1"],
+    }
+    assert rv.samples == {
+        "sampleAssociate": [(0.0, 1.5, 1.5)],
+        "roadSampleAssociation": [(0.0, 3.0, 3.0)],
+    }
+    assert rv.references == {
+        "signalReference": [ApolloReference("signal_3", 0.0, 1.0)],
+        "objectReference": [ApolloReference("stopline_3", 0.0, 1.0)],
+        "junctionReference": [ApolloReference("j_3", 0.0, 1.0)],
+        "laneReference": [ApolloReference("4_0_1", 0.0, 1.0)],
+    }
+
+    # the center lane has an empty link and no references
+    rv = ApolloParser()._visit_lane(
+        etree.fromstring(make_lane_xml("3", 0, 121.3, 30.27, 4))
+    )
+    assert "link" in rv.children
+    assert all(not eles for eles in rv.links.values())
+    assert all(not refs for refs in rv.references.values())
@@ -0,0 +1,125 @@
+import pickle
+from multiprocessing import shared_memory
+
+import pytest
+from lxml import etree
+
+from megmap_viz.megmap_dataset.megmap_apollo.apollo_parser import (
+    ApolloParser,
+    ApolloParserResult,
+    MultiApolloParser,
+)
+from megmap_viz.megmap_dataset.megmap_apollo.columnar import (
+    ApolloColumnarResult,
+)
+
+DATUM_NAMES = (
+    "road_datum",
+    "lane_section_datum",
+    "lane_datum",
+    "object_datum",
+    "signal_datum",
+    "junction_datum",
+)
+
+
+def assert_same_result(
+    rv: ApolloParserResult, expected: ApolloParserResult
+) -> None:
+    for name in DATUM_NAMES:
+        datum, expected_datum = getattr(rv, name), getattr(expected, name)
+        assert list(datum) == list(expected_datum)
+        for key, value in expected_datum.items():
+            assert datum[key] == value
+
+
+def test_columnar_round_trip(test_apollo_xml_str: str) -> None:
+    expected = ApolloParser(
+        etree.fromstring(test_apollo_xml_str.encode())
+    ).get_result()
+
+    rv = ApolloColumnarResult.from_result(expected)
+    assert_same_result(rv.to_result(), expected)
+
+    rv = pickle.loads(pickle.dumps(rv))
+    assert_same_result(rv.to_result(), expected)
+
+
+def test_columnar_views(test_apollo_xml_str: str) -> None:
+    expected = ApolloParser(
+        etree.fromstring(test_apollo_xml_str.encode())
+    ).get_result()
+    rv = ApolloColumnarResult.from_result(expected)
+
+    lane, expected_lane = (
+        rv.lane_datum["1_0_-1"],
+        expected.lane_datum["1_0_-1"],
+    )
+    assert lane.road_section_id == expected_lane.road_section_id
+    assert lane.link == expected_lane.link
+    assert lane.speed_limit == expected_lane.speed_limit
+    assert lane.color == expected_lane.color
+    assert lane.left_border is None
+    assert lane.lane_overlap_group == expected_lane.lane_overlap_group
+    assert lane.center_line.line.equals(expected_lane.center_line.line)
+    assert lane.center_line.sim_line.equals(expected_lane.center_line.sim_line)
+
+    section = rv.road_datum["1"].lanes[0]
+    assert [lane.uid for lane in section.right_lanes] == ["1_0_-1", "1_0_-2"]
+    assert section.ref_line.uid == "1_0_0"
+
+    junction = rv.junction_datum["j_2"]
+    assert junction.outline.equals(expected.junction_datum["j_2"].outline)
+    assert junction.connections == expected.junction_datum["j_2"].connections
+
+
+def test_columnar_concat(test_apollo_xml_str: str) -> None:
+    tree = etree.fromstring(test_apollo_xml_str.encode())
+    expected = ApolloParser(tree).get_result()
+
+    roads, junctions = tree.findall("road"), tree.findall("junction")
+    chunks = [roads[:3], roads[3:] + junctions]
+    results = []
+    for chunk in chunks:
+        parser = ApolloParser()
+        parser.parse_roads([e for e in chunk if e.tag == "road"])
+        parser.parse_junctions([e for e in chunk if e.tag == "junction"])
+        results.append(ApolloColumnarResult.from_result(parser.result))
+
+    rv = ApolloColumnarResult.concat(results)
+    assert_same_result(rv.to_result(), expected)
+
+
+def test_multi_parser_columnar(test_apollo_xml_path: str) -> None:
+    expected = ApolloParser.run_streaming(test_apollo_xml_path)
+
+    rv = MultiApolloParser(test_apollo_xml_path, columnar=True).run()
+    assert isinstance(rv, ApolloColumnarResult)
+    assert_same_result(rv.to_result(), expected)
+
+
+def test_shared_memory_round_trip(test_apollo_xml_path: str) -> None:
+    expected = ApolloParser.run_streaming(test_apollo_xml_path)
+
+    shared = ApolloColumnarResult.from_result(expected).to_shared_memory()
+    with ApolloColumnarResult.attach_shared_memory(shared) as rv:
+        assert_same_result(rv.to_result(), expected)
+    # the block is freed once detached
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=shared.shm_name)
+
+
+def test_multi_parser_shared_memory(test_apollo_xml_path: str) -> None:
+    expected = ApolloParser.run_streaming(test_apollo_xml_path)
+
+    parser = MultiApolloParser(test_apollo_xml_path, shared_memory=True)
+    rv = parser.run()
+    assert isinstance(rv, ApolloParserResult)
+    assert_same_result(rv, expected)
+
+    parser = MultiApolloParser(
+        test_apollo_xml_path, columnar=True, shared_memory=True
+    )
+    rv = parser.run()
+    assert isinstance(rv, ApolloColumnarResult)
+    assert_same_result(rv.to_result(), expected)
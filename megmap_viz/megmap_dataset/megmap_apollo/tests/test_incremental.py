@@ -0,0 +1,116 @@
+from pathlib import Path
+
+import numpy as np
+
+from megmap_viz.megmap_dataset.datatypes import BuilderType
+from megmap_viz.megmap_dataset.megmap_apollo.apollo_parser import (
+    ApolloParser,
+)
+from megmap_viz.megmap_dataset.megmap_apollo.columnar import (
+    ApolloColumnarResult,
+)
+from megmap_viz.megmap_dataset.megmap_apollo.incremental import (
+    IncrementalApolloParser,
+    scan_element_hashes,
+)
+from megmap_viz.megmap_dataset.megmap_gpkg import ApolloBuilderContext
+from megmap_viz.megmap_dataset.parse_cache import ParseCache
+
+from .conftest import make_apollo_xml
+
+
+def test_incremental_parser(tmp_path: Path, apollo_xml_factory) -> None:
+    base_path = apollo_xml_factory("test_20240101_v0", road_num=9)
+    base_result = ApolloParser.run_streaming(base_path)
+    base_hashes = IncrementalApolloParser(base_path).element_hashes
+    assert len(base_hashes) == 9 + 3
+
+    # road 4 is modified and road 9 is new
+    content = make_apollo_xml(road_num=10).replace(
+        '<road id="4" type="city"', '<road id="4" type="town"'
+    )
+    path = tmp_path / "test_20240101_v1.xml"
+    path.write_text(content, encoding="utf-8")
+
+    parser = IncrementalApolloParser(str(path))
+    changed = [
+        content.encode()[start:end]
+        for start, end in parser.get_changed_ranges(base_hashes)
+    ]
+    assert len(changed) == 2
+    assert changed[0].startswith(b'<road id="4"')
+    assert changed[1].startswith(b'<road id="9"')
+
+    rv = parser.run(base_result, base_hashes)
+    assert rv is not None
+    assert "2 of 13 elements changed" in rv.logs[-1][1]
+    assert rv.road_datum["4"].type == "town"
+
+    expected = ApolloColumnarResult.from_result(
+        ApolloParser.run_streaming(str(path))
+    ).columns
+    columns = ApolloColumnarResult.from_result(rv).columns
+    assert columns.keys() == expected.keys()
+    for name, column in expected.items():
+        np.testing.assert_array_equal(columns[name], column, err_msg=name)
+
+
+def test_incremental_parser_too_many_changes(apollo_xml_factory) -> None:
+    base_path = apollo_xml_factory("test_20240101_v0", point_num=8)
+    path = apollo_xml_factory("test_20240101_v1", point_num=9)
+    base_hashes = {e.key: e.digest for e in scan_element_hashes(base_path)}
+
+    parser = IncrementalApolloParser(path)
+    assert parser.element_hashes.keys() == base_hashes.keys()
+    base_result = ApolloParser.run_streaming(base_path)
+    assert parser.run(base_result, base_hashes) is None
+
+    parser.max_changed_ratio = 1.0
+    rv = parser.run(base_result, base_hashes)
+    assert rv is not None
+    assert rv.lane_datum.keys() == base_result.lane_datum.keys()
+
+
+def test_parse_cache_element_hashes(
+    tmp_path: Path, test_apollo_xml_path: str
+) -> None:
+    cache = ParseCache(tmp_path / "parsed")
+    result = ApolloParser.run_streaming(test_apollo_xml_path)
+    cache.save("md5", BuilderType.APOLLO, result)
+    assert cache.load_element_hashes("md5", BuilderType.APOLLO) is None
+
+    element_hashes = IncrementalApolloParser(
+        test_apollo_xml_path
+    ).element_hashes
+    cache.save("md5", BuilderType.APOLLO, result, element_hashes)
+    assert (
+        cache.load_element_hashes("md5", BuilderType.APOLLO) == element_hashes
+    )
+    rv = cache.load("md5", BuilderType.APOLLO)
+    assert isinstance(rv, ApolloColumnarResult)
+    assert rv.to_result().lane_datum.keys() == result.lane_datum.keys()
+
+
+def test_builder_context_element_hashes(
+    tmp_path: Path, apollo_xml_factory
+) -> None:
+    cache = ParseCache(tmp_path / "parsed")
+    md5s = ["md5_v0", "md5_v1", "md5_v2"]
+    paths = [
+        apollo_xml_factory(f"test_20240101_v{idx}", road_num=9 + idx)
+        for idx in range(3)
+    ]
+
+    # the first version has no previous one, its elements are not hashed
+    ApolloBuilderContext().load_data(paths[0], md5s[0], cache)
+    assert cache.load_element_hashes(md5s[0], BuilderType.APOLLO) is None
+
+    ctx = ApolloBuilderContext()
+    ctx.load_data(paths[1], md5s[1], cache, md5s[0])
+    assert not any("elements changed" in log[1] for log in ctx.logs)
+    assert cache.load_element_hashes(md5s[1], BuilderType.APOLLO)
+
+    ctx = ApolloBuilderContext()
+    ctx.load_data(paths[2], md5s[2], cache, md5s[1])
+    assert "1 of 14 elements changed" in ctx.logs[-1][1]
+    assert ctx.data.road_datum.keys() == {str(idx) for idx in range(11)}
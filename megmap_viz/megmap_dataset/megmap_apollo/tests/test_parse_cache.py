@@ -0,0 +1,86 @@
+from pathlib import Path
+
+from shapely.geometry import LineString, Polygon
+
+from megmap_viz.megmap_dataset import parse_cache
+from megmap_viz.megmap_dataset.datatypes import BuilderType
+from megmap_viz.megmap_dataset.megmap_apollo.apollo_parser import (
+    ApolloParser,
+)
+from megmap_viz.megmap_dataset.megmap_apollo.columnar import (
+    ApolloColumnarResult,
+)
+from megmap_viz.megmap_dataset.megmap_memo.memo_data_parser import (
+    MemoLineResult,
+    MemoParserResult,
+    MemoRoadResult,
+)
+from megmap_viz.megmap_dataset.parse_cache import ParseCache
+from megmap_viz.megmap_dataset.utils import simplify_line
+
+
+def test_parse_cache_apollo(
+    tmp_path: Path, test_apollo_xml_path: str, monkeypatch
+) -> None:
+    cache = ParseCache(tmp_path / "parsed")
+    assert cache.load("md5", BuilderType.APOLLO) is None
+
+    expected = ApolloParser.run_streaming(test_apollo_xml_path)
+    cache.save("md5", BuilderType.APOLLO, expected)
+    assert list(cache.cache_dir.iterdir()) == [
+        cache.get_path("md5", BuilderType.APOLLO)
+    ]
+
+    rv = cache.load("md5", BuilderType.APOLLO)
+    assert isinstance(rv, ApolloColumnarResult)
+    result = rv.to_result()
+    assert result.lane_datum.keys() == expected.lane_datum.keys()
+    for uid, lane in result.lane_datum.items():
+        assert lane.center_line.line.equals(
+            expected.lane_datum[uid].center_line.line
+        )
+    assert cache.load("md5", BuilderType.MEMO) is None
+
+    # entries written by another version are ignored
+    monkeypatch.setattr(parse_cache, "PARSE_CACHE_VERSION", 0)
+    cache.get_path("md5", BuilderType.APOLLO).write_bytes(b"broken")
+    assert cache.load("md5", BuilderType.APOLLO) is None
+
+
+def test_parse_cache_memo(tmp_path: Path) -> None:
+    line = LineString([(0, 0), (1, 0.001), (2, 0)])
+    expected = MemoParserResult(
+        roads={
+            "r": MemoRoadResult({"id": "r"}, Polygon([(0, 0), (1, 0), (1, 1)]))
+        },
+        lanes={},
+        lines={"l": MemoLineResult({"id": "l"}, line, simplify_line(line))},
+        objects={},
+        logs=[("2024-01-01 00:00:00", "msg", "info")],
+    )
+    cache = ParseCache(tmp_path)
+    cache.save("md5", BuilderType.MEMO, expected)
+
+    rv = cache.load("md5", BuilderType.MEMO)
+    assert isinstance(rv, MemoParserResult)
+    assert rv.logs == expected.logs
+    assert rv.roads["r"].raw_data == {"id": "r"}
+    assert rv.roads["r"].polygon.equals(expected.roads["r"].polygon)
+    assert rv.lines["l"].geometry.equals(line)
+    assert rv.lines["l"].sim_geometry.equals(expected.lines["l"].sim_geometry)
+    assert rv.lanes == {}
+
+
+def test_parse_cache_delete(tmp_path: Path, test_apollo_xml_path: str) -> None:
+    cache = ParseCache(tmp_path / "parsed")
+    result = ApolloParser.run_streaming(test_apollo_xml_path)
+    cache.save("md5", BuilderType.APOLLO, result)
+    cache.save("md5_step0.5", BuilderType.APOLLO, result)
+    cache.save("other", BuilderType.APOLLO, result)
+
+    cache.delete("md5")
+    assert list(cache.cache_dir.iterdir()) == [
+        cache.get_path("other", BuilderType.APOLLO)
+    ]
+    # deleting a map that was never parsed is a no-op
+    cache.delete("md5")
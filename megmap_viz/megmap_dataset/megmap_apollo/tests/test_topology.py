@@ -0,0 +1,79 @@
+import typing as t
+
+from lxml import etree
+
+from megmap_viz.megmap_dataset.megmap_apollo.apollo_parser import (
+    ApolloParser,
+    ApolloParserResult,
+)
+from megmap_viz.megmap_dataset.megmap_apollo.lane import (
+    ApolloLaneSection,
+    ApolloLanePredecessor,
+)
+from megmap_viz.megmap_dataset.megmap_apollo.topology import (
+    ApolloTopologyIndex,
+)
+
+
+def get_links(
+    data: ApolloParserResult, lane_section: ApolloLaneSection, sides: str
+) -> t.Tuple[t.List[str], t.List[str]]:
+    pres: t.Dict[str, None] = {}
+    sucs: t.Dict[str, None] = {}
+    lanes = []
+    if "left" in sides:
+        lanes += lane_section.left_lanes
+    if "right" in sides:
+        lanes += lane_section.right_lanes
+    for lane in lanes:
+        for pre in lane.link.predecessors:
+            if pre.lane_uid in data.lane_datum:
+                pres[data.lane_datum[pre.lane_uid].road_section_id] = None
+        for suc in lane.link.successors:
+            if suc.lane_uid in data.lane_datum:
+                sucs[data.lane_datum[suc.lane_uid].road_section_id] = None
+    return list(pres), list(sucs)
+
+
+def test_topology_index(test_apollo_xml_str: str) -> None:
+    data = ApolloParser(
+        etree.fromstring(test_apollo_xml_str.encode())
+    ).get_result()
+    lane = data.lane_datum["3_0_1"]
+    # a second predecessor section, a duplicated and a missing one
+    lane.link.predecessors += [
+        ApolloLanePredecessor("0_0_1"),
+        ApolloLanePredecessor("2_0_-1"),
+        ApolloLanePredecessor("missing"),
+    ]
+
+    index = ApolloTopologyIndex(data)
+    assert index.lane_uids == list(data.lane_datum)
+    assert index.section_ids[: len(data.lane_section_datum)] == list(
+        data.lane_section_datum
+    )
+    for row, lane in enumerate(data.lane_datum.values()):
+        assert index.section_ids[index.lane_section[row]] == (
+            lane.road_section_id
+        )
+        assert index.road_ids[index.lane_road[row]] == lane.road_id
+        pres = index.lane_pre[
+            index.lane_pre_offsets[row] : index.lane_pre_offsets[row + 1]
+        ]
+        assert [index.lane_uids[pre] for pre in pres] == [
+            pre.lane_uid
+            for pre in lane.link.predecessors
+            if pre.lane_uid in data.lane_datum
+        ]
+        assert index.lane_is_connecting[row] == (lane.road_id in {"2", "5"})
+    assert index.connecting_road_ids == {"2", "5"}
+
+    for section_id, lane_section in data.lane_section_datum.items():
+        assert index.get_section_links(section_id) == get_links(
+            data, lane_section, "left right"
+        )
+        for side in ("left", "right"):
+            assert index.get_lane_group_links(section_id, side) == get_links(
+                data, lane_section, side
+            )
+    assert index.get_section_links("3_0")[0] == ["2_0", "0_0"]
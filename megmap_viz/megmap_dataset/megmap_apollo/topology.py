@@ -0,0 +1,227 @@
+"""Topology index of an apollo map, shared by the layer builders.
+
+Lane, section and road ids are interned to integers, rows of the arrays of
+`ApolloTopologyIndex`. Adjacency lists are stored CSR style like in
+`columnar`: an ``<name>_offsets`` array with one entry more than the rows,
+pointing into a value array. Links to lanes which are not part of the map
+are dropped.
+
+Section level links are derived from the lane links once: the sections a
+section (or a lane group, the lanes of one side of a section) is linked
+to, in the order they are first reached from its lanes.
+"""
+from __future__ import annotations
+import typing as t
+
+import numpy as np
+from numpy import typing as npt
+
+if t.TYPE_CHECKING:
+    from .apollo_parser import ApolloParserResult
+
+
+IndexArray = npt.NDArray[np.int64]
+# row of a lane group of a section side
+LANE_GROUP_SIDES = ("left", "right")
+
+
+def to_csr(
+    row_values: t.List[t.List[int]],
+) -> t.Tuple[IndexArray, IndexArray]:
+    offsets = np.zeros(len(row_values) + 1, dtype=np.int64)
+    np.cumsum([len(values) for values in row_values], out=offsets[1:])
+    values = np.fromiter(
+        (value for values in row_values for value in values),
+        dtype=np.int64,
+        count=int(offsets[-1]),
+    )
+    return offsets, values
+
+
+def gather_csr(
+    offsets: IndexArray, values: IndexArray, rows: IndexArray
+) -> t.Tuple[IndexArray, IndexArray]:
+    """Values of the given rows, and the position in `rows` each one
+    belongs to."""
+    starts = offsets[rows]
+    sizes = offsets[rows + 1] - starts
+    positions = np.repeat(np.arange(len(rows)), sizes)
+    idxs = np.arange(sizes.sum()) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+    return values[starts[positions] + idxs], positions
+
+
+class ApolloTopologyIndex:
+    def __init__(self, data: ApolloParserResult) -> None:
+        lanes = list(data.lane_datum.values())
+        self.lane_uids: t.List[str] = list(data.lane_datum)
+        self.lane_index = {uid: idx for idx, uid in enumerate(self.lane_uids)}
+        # the sections and roads of the map first, followed by the ones only
+        # known by their lanes
+        self.section_index: t.Dict[str, int] = {}
+        for section_id in data.lane_section_datum:
+            self.section_index.setdefault(section_id, len(self.section_index))
+        self.lane_section: IndexArray = np.fromiter(
+            (
+                self.section_index.setdefault(
+                    lane.road_section_id, len(self.section_index)
+                )
+                for lane in lanes
+            ),
+            dtype=np.int64,
+            count=len(lanes),
+        )
+        self.section_ids: t.List[str] = list(self.section_index)
+        self.road_index: t.Dict[str, int] = {}
+        for road_id in data.road_datum:
+            self.road_index.setdefault(road_id, len(self.road_index))
+        self.lane_road: IndexArray = np.fromiter(
+            (
+                self.road_index.setdefault(lane.road_id, len(self.road_index))
+                for lane in lanes
+            ),
+            dtype=np.int64,
+            count=len(lanes),
+        )
+        self.road_ids: t.List[str] = list(self.road_index)
+
+        self.lane_pre_offsets, self.lane_pre = to_csr(
+            [
+                self._get_lane_rows(
+                    pre.lane_uid for pre in lane.link.predecessors
+                )
+                for lane in lanes
+            ]
+        )
+        self.lane_suc_offsets, self.lane_suc = to_csr(
+            [
+                self._get_lane_rows(
+                    suc.lane_uid for suc in lane.link.successors
+                )
+                for lane in lanes
+            ]
+        )
+
+        self.connecting_road_ids: t.FrozenSet[str] = frozenset(
+            connection.connecting_road
+            for junction in data.junction_datum.values()
+            for connection in junction.connections
+        )
+        self.lane_is_connecting: npt.NDArray[np.bool_] = np.fromiter(
+            (lane.road_id in self.connecting_road_ids for lane in lanes),
+            dtype=bool,
+            count=len(lanes),
+        )
+
+        # lanes of the sections of the map, left lanes first, and of their
+        # lane groups, row 2 * section + side
+        sections = list(data.lane_section_datum.values())
+        self.section_lane_offsets, self.section_lanes = to_csr(
+            [
+                self._get_lane_rows(
+                    lane.uid
+                    for lane in section.left_lanes + section.right_lanes
+                )
+                for section in sections
+            ]
+        )
+        self.group_lane_offsets, self.group_lanes = to_csr(
+            [
+                self._get_lane_rows(lane.uid for lane in side_lanes)
+                for section in sections
+                for side_lanes in (section.left_lanes, section.right_lanes)
+            ]
+        )
+        (
+            self.section_pre_offsets,
+            self.section_pre,
+        ) = self._link_sections(
+            self.section_lane_offsets,
+            self.section_lanes,
+            self.lane_pre_offsets,
+            self.lane_pre,
+        )
+        (
+            self.section_suc_offsets,
+            self.section_suc,
+        ) = self._link_sections(
+            self.section_lane_offsets,
+            self.section_lanes,
+            self.lane_suc_offsets,
+            self.lane_suc,
+        )
+        self.group_pre_offsets, self.group_pre = self._link_sections(
+            self.group_lane_offsets,
+            self.group_lanes,
+            self.lane_pre_offsets,
+            self.lane_pre,
+        )
+        self.group_suc_offsets, self.group_suc = self._link_sections(
+            self.group_lane_offsets,
+            self.group_lanes,
+            self.lane_suc_offsets,
+            self.lane_suc,
+        )
+
+    def _get_lane_rows(self, lane_uids: t.Iterable[str]) -> t.List[int]:
+        """Rows of the lanes, the ones not in the map dropped."""
+        lane_index = self.lane_index
+        return [lane_index[uid] for uid in lane_uids if uid in lane_index]
+
+    def _link_sections(
+        self,
+        member_offsets: IndexArray,
+        members: IndexArray,
+        link_offsets: IndexArray,
+        links: IndexArray,
+    ) -> t.Tuple[IndexArray, IndexArray]:
+        """CSR of the sections the lanes of every row are linked to."""
+        row_num = len(member_offsets) - 1
+        linked_lanes, member_pos = gather_csr(link_offsets, links, members)
+        rows = np.repeat(np.arange(row_num), np.diff(member_offsets))[
+            member_pos
+        ]
+        sections = self.lane_section[linked_lanes]
+        # unique (row, section) pairs in the order they are first reached
+        _, first = np.unique(
+            rows * max(len(self.section_ids), 1) + sections,
+            return_index=True,
+        )
+        first.sort()
+        rows, sections = rows[first], sections[first]
+        offsets = np.zeros(row_num + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=row_num), out=offsets[1:])
+        return offsets, sections
+
+    def _get_section_ids(
+        self, offsets: IndexArray, values: IndexArray, row: int
+    ) -> t.List[str]:
+        return [
+            self.section_ids[section]
+            for section in values[offsets[row] : offsets[row + 1]].tolist()
+        ]
+
+    def get_section_links(
+        self, road_section_id: str
+    ) -> t.Tuple[t.List[str], t.List[str]]:
+        """Predecessor and successor sections of a section."""
+        row = self.section_index[road_section_id]
+        return (
+            self._get_section_ids(
+                self.section_pre_offsets, self.section_pre, row
+            ),
+            self._get_section_ids(
+                self.section_suc_offsets, self.section_suc, row
+            ),
+        )
+
+    def get_lane_group_links(
+        self, road_section_id: str, side: t.Literal["left", "right"]
+    ) -> t.Tuple[t.List[str], t.List[str]]:
+        """Predecessor and successor sections of the lanes of one side of a
+        section."""
+        side_row = LANE_GROUP_SIDES.index(side)
+        row = 2 * self.section_index[road_section_id] + side_row
+        return (
+            self._get_section_ids(self.group_pre_offsets, self.group_pre, row),
+            self._get_section_ids(self.group_suc_offsets, self.group_suc, row),
+        )
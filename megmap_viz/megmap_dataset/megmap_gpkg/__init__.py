@@ -1,10 +1,14 @@
 from .base_builder import (
     build_all_map_layer,
     write_map_layer_to_gpkg,
+    write_map_layer_to_parquet,
     MemoBuilderContext,
     ApolloBuilderContext,
     get_builder_context_cls,
+    get_map_layer_writer,
 )
 from .gpkg_datatypes import *  # noqa F403
 from .gpkg_builder import *  # noqa F403
+from .layer_store import LayerStore, get_layer_store_cls
 from .gpkg_db import *  # noqa F403
+from .parquet_db import *  # noqa F403
@@ -1,29 +1,51 @@
 from __future__ import annotations
+import os
+import json
 import abc
+import itertools
+import threading
 import typing as t
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar, copy_context
 from dataclasses import dataclass
 from enum import Enum
 from functools import cached_property
 from pathlib import Path
 import logging
-from queue import Queue
 
-import pyogrio
 from lxml import etree
 
 from megmap_viz.utils.datetime_str import get_datetime_str
+from megmap_viz.utils.profiler import get_current_profiler, record_stage
 from megmap_viz.datatypes import LogType
 
 from ..megmap_apollo.apollo_parser import (
+    ApolloParser,
     ApolloParserResult,
     MultiApolloParser,
 )
+from ..megmap_apollo.columnar import ApolloColumnarResult
+from ..megmap_apollo.incremental import (
+    ElementHashes,
+    IncrementalApolloParser,
+)
+from ..megmap_apollo.topology import ApolloTopologyIndex
 from ..megmap_memo.memo_data_parser import (
+    DEFAULT_POLYLINE_STEP,
     MemoParser,
+    MultiMemoParser,
     MemoDataDict,
     MemoParserResult,
 )
-from ..datatypes import MegMapLayer, MegMapLayerType, BuilderType
+from ..datatypes import (
+    MegMapLayer,
+    MegMapLayerType,
+    BuilderType,
+    ParserConfig,
+)
+from ..parse_cache import ParseCache
+from . import geoparquet, gpkg_writer
+from .gpkg_datatypes import LineStore
 
 if t.TYPE_CHECKING:
     from .gpkg_builder import BoundaryInfo
@@ -31,45 +53,215 @@ if t.TYPE_CHECKING:
 logger = logging.getLogger("megmap_viz.map_data_retriever")
 
 
-BuilderDataType = t.Union[etree._Element, MemoDataDict]
+# apollo data can be either a loaded xml tree or the path of the xml file
+BuilderDataType = t.Union[etree._Element, str, MemoDataDict]
+
 
+# key of the build stage report in the gpkg dataset metadata
+BUILD_STAGES_KEY = "build_stages"
 
 LAYER_BUIDLERS: t.Dict[MegMapLayerType, t.Type[BaseLayerBuilder]] = {}
 
+# gid counter of a layer builder run concurrently with others, its gids are
+# shifted to the ones of the build once the builder finished
+_builder_gids: ContextVar[t.Optional[t.Iterator[int]]] = ContextVar(
+    "builder_gids", default=None
+)
+
 
-def register_layer_builder(cls: t.Type[BaseLayerBuilder]):
+def register_layer_builder(
+    cls: t.Type[BaseLayerBuilder],
+) -> t.Type[BaseLayerBuilder]:
     LAYER_BUIDLERS.setdefault(cls.layer_type, cls)
+    return cls
+
+
+def get_build_levels(
+    builders: t.Dict[MegMapLayerType, t.Type[BaseLayerBuilder]]
+) -> t.List[t.List[t.Type[BaseLayerBuilder]]]:
+    """Order the layer builders topologically by their dependencies.
+
+    The builders of a level only depend on the builders of the previous
+    levels, so they can run concurrently. Inside a level the builders keep
+    their registration order.
+    """
+    for builder_cls in builders.values():
+        for layer_type in builder_cls.depends_on:
+            if layer_type not in builders:
+                raise ValueError(
+                    f"Layer {builder_cls.layer_type.name} depends on "
+                    f"layer {layer_type.name} which has no builder"
+                )
+
+    levels: t.List[t.List[t.Type[BaseLayerBuilder]]] = []
+    built: t.Set[MegMapLayerType] = set()
+    pending = list(builders.values())
+    while pending:
+        level = [
+            builder_cls
+            for builder_cls in pending
+            if built.issuperset(builder_cls.depends_on)
+        ]
+        if not level:
+            raise ValueError(
+                "Circular dependencies between layers "
+                + ", ".join(b.layer_type.name for b in pending)
+            )
+        levels.append(level)
+        built.update(builder_cls.layer_type for builder_cls in level)
+        pending = [b for b in pending if b not in level]
+    return levels
+
+
+class GidAllocator:
+    """Gids of the features of one map build, counted from 1.
+
+    Gids only depend on the build order of the map, so the builds of
+    different maps, even in one process, do not affect each other.
+    """
+
+    def __init__(self) -> None:
+        self._last_gid = 0
+        self._lock = threading.Lock()
+
+    @property
+    def last_gid(self) -> int:
+        return self._last_gid
+
+    def next(self) -> int:
+        with self._lock:
+            self._last_gid += 1
+            return self._last_gid
+
+    def reserve(self, num: int) -> int:
+        """Reserve ``num`` consecutive gids, returns the gid before the
+        first one."""
+        with self._lock:
+            offset = self._last_gid
+            self._last_gid += num
+            return offset
 
 
 class BuilderContext(abc.ABC):
+    """State of one map build, shared by its layer builders."""
+
     data: t.Any
-    global_id: t.ClassVar[int] = 0
     builder_type: t.ClassVar[BuilderType]
     layer_datum: t.Dict[MegMapLayerType, MegMapLayer]
     lane_boundary_info: t.Dict[str, BoundaryInfo]
+    # geometries of the LANE_BOUNDARY layer by gid
+    boundary_store: LineStore
 
-    connecting_road_ids: t.List[str]  # For Apollo
+    topology: ApolloTopologyIndex  # For Apollo
     boudary_layer: MegMapLayer
     lane_layer: MegMapLayer
 
     layer_id_name_map: t.ClassVar[t.Dict[str, str]]
     avaliable_layers: t.ClassVar[t.List[str]]
 
-    logs: t.ClassVar[t.List[LogType]] = []
+    logs: t.List[LogType]
+    gids: GidAllocator
 
-    def __init__(self) -> None:
+    def __init__(self, parser_config: t.Optional[ParserConfig] = None) -> None:
+        self.logs: t.List[LogType] = []
+        self.gids = GidAllocator()
         self.layer_datum: t.Dict[MegMapLayerType, MegMapLayer] = {}
         self.lane_boundary_info: t.Dict[str, BoundaryInfo] = {}
+        self.boundary_store = LineStore()
+        self.parser_config: ParserConfig = parser_config or {}
+        # local file the data was loaded from, if known
+        self.source_path: t.Optional[str] = None
 
     @property
     def auto_id(self) -> int:
-        BuilderContext.global_id += 1
-        return BuilderContext.global_id
+        gids = _builder_gids.get()
+        if gids is not None:
+            return next(gids)
+        return self.gids.next()
 
     @abc.abstractmethod
     def set_data(self, *args, **kwargs) -> None:
         pass
 
+    def set_parsed_data(self, data: t.Any) -> None:
+        self.data = data
+
+    def get_data_counts(self) -> t.Dict[str, int]:
+        """Element numbers of the parsed data, for instrumentation."""
+        return {}
+
+    def get_parse_cache_key(self, file_md5: str) -> str:
+        """Key of the parsed map in the parse cache, parser options which
+        change the parse have to be part of it."""
+        return file_md5
+
+    def get_element_hashes(
+        self, data: BuilderDataType
+    ) -> t.Optional[ElementHashes]:
+        """Content hashes of the map elements, if the map type supports
+        incremental parsing."""
+        return None
+
+    def set_data_from_base(
+        self,
+        data: BuilderDataType,
+        parse_cache: ParseCache,
+        base_md5: str,
+    ) -> bool:
+        """Parse the data incrementally based on the cached parse of another
+        version of the map. Returns False if that is not possible."""
+        return False
+
+    def load_data(
+        self,
+        data: BuilderDataType,
+        file_md5: t.Optional[str] = None,
+        parse_cache: t.Optional[ParseCache] = None,
+        base_md5: t.Optional[str] = None,
+    ) -> None:
+        """Parse the data, or take the parsed map from the cache.
+
+        ``base_md5`` is the md5 of an earlier version of the map (see
+        `LayerStore.get_previous_version`), only the elements which changed
+        since then are parsed if its parse is cached. The element hashes
+        this needs are only computed and cached for maps which have such a
+        version, so the second version of a map is still parsed in full.
+        """
+        with record_stage("parse") as counts:
+            self._load_data(data, file_md5, parse_cache, base_md5)
+            counts.update(self.get_data_counts())
+
+    def _load_data(
+        self,
+        data: BuilderDataType,
+        file_md5: t.Optional[str],
+        parse_cache: t.Optional[ParseCache],
+        base_md5: t.Optional[str],
+    ) -> None:
+        if parse_cache is None or not file_md5:
+            self.set_data(data)
+            return
+
+        cache_key = self.get_parse_cache_key(file_md5)
+        parsed_data = parse_cache.load(cache_key, self.builder_type)
+        if parsed_data is not None:
+            self.set_parsed_data(parsed_data)
+            self.add_log("info", "Parsed map loaded from cache")
+            return
+
+        element_hashes = self.get_element_hashes(data) if base_md5 else None
+        if not (
+            base_md5
+            and element_hashes is not None
+            and self.set_data_from_base(
+                data, parse_cache, self.get_parse_cache_key(base_md5)
+            )
+        ):
+            self.set_data(data)
+        parse_cache.save(
+            cache_key, self.builder_type, self.data, element_hashes
+        )
+
     def add_log(
         self, level: t.Literal["warning", "error", "info"], message: str
     ) -> None:
@@ -77,6 +269,7 @@ class BuilderContext(abc.ABC):
 
 
 class ApolloBuilderContext(BuilderContext):
+    # ApolloColumnarResult exposes the same interface through views
     data: ApolloParserResult
     builder_type = BuilderType.APOLLO
 
@@ -95,23 +288,103 @@ class ApolloBuilderContext(BuilderContext):
 
     avaliable_layers = list(layer_id_name_map.keys())
 
-    def __init__(self) -> None:
-        super().__init__()
+    def __init__(self, parser_config: t.Optional[ParserConfig] = None) -> None:
+        super().__init__(parser_config)
+        self._incremental_parser: t.Optional[IncrementalApolloParser] = None
+
+    def set_data(self, data: t.Union[etree._Element, str]) -> None:
+        if isinstance(data, etree._Element) or os.path.isfile(data):
+            self.data = t.cast(
+                ApolloParserResult,
+                MultiApolloParser(
+                    data,
+                    max_workers=self.parser_config.get("max_workers", 4),
+                    chunks_per_worker=self.parser_config.get(
+                        "chunks_per_worker", 4
+                    ),
+                    columnar=self.parser_config.get("columnar", False),
+                    shared_memory=self.parser_config.get(
+                        "shared_memory", False
+                    ),
+                ).run(),
+            )
+        else:
+            # remote files can not be sharded by byte ranges
+            self.data = ApolloParser.run_streaming(data)
+            if self.parser_config.get("columnar"):
+                self.data = t.cast(
+                    ApolloParserResult,
+                    ApolloColumnarResult.from_result(self.data),
+                )
+        if isinstance(self.data, ApolloParserResult):
+            self.data.simplify_lines()
+        self.logs.extend(self.data.logs)
 
-    def set_data(self, data: etree._Element) -> None:
-        self.data = MultiApolloParser(data).run()
+    def set_parsed_data(self, data: ApolloColumnarResult) -> None:
+        if self.parser_config.get("columnar"):
+            self.data = t.cast(ApolloParserResult, data)
+        else:
+            self.data = data.to_result()
+            self.data.simplify_lines()
+
+    def get_data_counts(self) -> t.Dict[str, int]:
+        return {
+            "roads": len(self.data.road_datum),
+            "lanes": len(self.data.lane_datum),
+            "signals": len(self.data.signal_datum),
+            "objects": len(self.data.object_datum),
+            "junctions": len(self.data.junction_datum),
+        }
 
-    @cached_property
-    def connecting_road_ids(self) -> t.List[str]:
-        rv: t.List[str] = []
-        for apollo_junction in self.data.junction_datum.values():
-            rv.extend(
-                [
-                    connection.connecting_road
-                    for connection in apollo_junction.connections
-                ]
+    def get_element_hashes(
+        self, data: BuilderDataType
+    ) -> t.Optional[ElementHashes]:
+        self._incremental_parser = None
+        if not isinstance(data, str) or not os.path.isfile(data):
+            return None
+        try:
+            self._incremental_parser = IncrementalApolloParser(data)
+        except ValueError as e:
+            # the file can not be split into elements without parsing it
+            logger.warning(f"No incremental parsing of {data}: {e}")
+            return None
+        return self._incremental_parser.element_hashes
+
+    def set_data_from_base(
+        self,
+        data: BuilderDataType,
+        parse_cache: ParseCache,
+        base_md5: str,
+    ) -> bool:
+        if self._incremental_parser is None:
+            return False
+        base_hashes = parse_cache.load_element_hashes(
+            base_md5, self.builder_type
+        )
+        if base_hashes is None:
+            return False
+        base_data = parse_cache.load(base_md5, self.builder_type)
+        if base_data is None:
+            return False
+
+        rv = self._incremental_parser.run(
+            t.cast(ApolloColumnarResult, base_data).to_result(), base_hashes
+        )
+        if rv is None:
+            return False
+        if self.parser_config.get("columnar"):
+            self.data = t.cast(
+                ApolloParserResult, ApolloColumnarResult.from_result(rv)
             )
-        return rv
+        else:
+            self.data = rv
+            self.data.simplify_lines()
+        self.logs.extend(rv.logs)
+        return True
+
+    @cached_property
+    def topology(self) -> ApolloTopologyIndex:
+        return ApolloTopologyIndex(self.data)
 
     @property
     def boudary_layer(self) -> MegMapLayer:
@@ -137,17 +410,53 @@ class MemoBuilderContext(BuilderContext):
 
     avaliable_layers = list(layer_id_name_map.keys())
 
-    def __init__(self) -> None:
-        super().__init__()
+    def __init__(self, parser_config: t.Optional[ParserConfig] = None) -> None:
+        super().__init__(parser_config)
+
+    @property
+    def polyline_step(self) -> float:
+        return self.parser_config.get("polyline_step", DEFAULT_POLYLINE_STEP)
 
     def set_data(self, data: MemoDataDict) -> None:
-        self.data = MemoParser(data).run()
+        if self.parser_config.get("memo_workers", 1) > 1:
+            self.data = MultiMemoParser(
+                data,
+                max_workers=self.parser_config["memo_workers"],
+                chunks_per_worker=self.parser_config.get(
+                    "chunks_per_worker", 4
+                ),
+                polyline_step=self.polyline_step,
+                memo_path=self.source_path,
+            ).run()
+        else:
+            self.data = MemoParser(data, self.polyline_step).run()
+        self.logs.extend(self.data.logs)
+
+    def set_parsed_data(self, data: MemoParserResult) -> None:
+        self.data = data
         self.logs.extend(self.data.logs)
 
+    def get_parse_cache_key(self, file_md5: str) -> str:
+        if self.polyline_step == DEFAULT_POLYLINE_STEP:
+            return file_md5
+        return f"{file_md5}_step{self.polyline_step:g}"
+
+    def get_data_counts(self) -> t.Dict[str, int]:
+        return {
+            "roads": len(self.data.roads),
+            "lanes": len(self.data.lanes),
+            "lines": len(self.data.lines),
+            "objects": len(self.data.objects),
+        }
+
 
 class BaseLayerBuilder(abc.ABC):
     layer_type: t.ClassVar[MegMapLayerType]
-    context: t.ClassVar[BuilderContext]
+    # layers which have to be built before this one
+    depends_on: t.ClassVar[t.Tuple[MegMapLayerType, ...]] = ()
+
+    def __init__(self, context: BuilderContext) -> None:
+        self.context = context
 
     def build(self) -> None:
         build_func_map = {
@@ -200,71 +509,211 @@ class BaseLayerBuilder(abc.ABC):
 #         raise
 
 def build_all_map_layer(
-    data: BuilderDataType, builder_context_cls: t.Type[BuilderContext]
+    data: BuilderDataType,
+    builder_context_cls: t.Type[BuilderContext],
+    parser_config: t.Optional[ParserConfig] = None,
+    file_md5: t.Optional[str] = None,
+    parse_cache: t.Optional[ParseCache] = None,
+    base_md5: t.Optional[str] = None,
+    source_path: t.Optional[str] = None,
 ) -> t.Tuple[t.Dict[MegMapLayerType, MegMapLayer], t.List[LogType]]:
-    builder_context = builder_context_cls()
-    builder_context.set_data(data)
+    builder_context = builder_context_cls(parser_config)
+    builder_context.source_path = source_path
+    builder_context.load_data(data, file_md5, parse_cache, base_md5)
     logger.info("Data parsed")
 
-    builder_queue = Queue()
-    for builder_cls in LAYER_BUIDLERS.values():
-        builder_cls.context = builder_context
-        builder_queue.put(builder_cls())
-
-    failed_num: t.Dict[MegMapLayerType, int] = {}
-    while not builder_queue.empty():
-        layer_builder: BaseLayerBuilder = builder_queue.get()
-        try:
-            logger.info(f"Building layer {layer_builder.layer_type.name}")
-            layer_builder.build()
-            logger.info(f"Layer {layer_builder.layer_type.name} built")
-        except KeyError or AttributeError as e:
-            failed_num.setdefault(layer_builder.layer_type, 0)
-            failed_num[layer_builder.layer_type] += 1
-            if (
-                failed_num[layer_builder.layer_type] >= 3
-            ):  # Retrying more than three times indicates a problem
-                logger.exception(e)
-                logger.error(
-                    f"Layer {layer_builder.layer_type.name} not built"
-                )
-                raise e
-            builder_queue.put(layer_builder)
-            logger.warning(f"Layer {layer_builder.layer_type.name} requeued")
-            continue
+    levels = get_build_levels(LAYER_BUIDLERS)
+    # the gids of the layers other layers depend on are referenced by the
+    # dependents, they are taken from the build counter straight away
+    provided = {
+        layer_type
+        for builder_cls in LAYER_BUIDLERS.values()
+        for layer_type in builder_cls.depends_on
+    }
+    max_workers = builder_context.parser_config.get("build_workers", 1)
+    for level in levels:
+        concurrent = [
+            builder_cls
+            for builder_cls in level
+            if builder_cls.layer_type not in provided
+        ]
+        if max_workers <= 1 or len(concurrent) <= 1:
+            concurrent = []
+        for builder_cls in level:
+            if builder_cls not in concurrent:
+                build_map_layer(builder_context, builder_cls)
+        if concurrent:
+            build_map_layers_concurrently(
+                builder_context, concurrent, max_workers
+            )
 
+    # layers are written in the build order
+    layer_datum = builder_context.layer_datum
+    builder_context.layer_datum = {
+        builder_cls.layer_type: layer_datum[builder_cls.layer_type]
+        for level in levels
+        for builder_cls in level
+        if builder_cls.layer_type in layer_datum
+    }
     return builder_context.layer_datum, builder_context.logs
 
 
+def build_map_layer(
+    builder_context: BuilderContext,
+    builder_cls: t.Type[BaseLayerBuilder],
+) -> None:
+    layer_name = builder_cls.layer_type.name
+    try:
+        logger.info(f"Building layer {layer_name}")
+        with record_stage(f"build/{layer_name}") as counts:
+            builder_cls(builder_context).build()
+            layer = builder_context.layer_datum.get(builder_cls.layer_type)
+            counts["features"] = 0 if layer is None else len(layer)
+        logger.info(f"Layer {layer_name} built")
+    except Exception as e:
+        logger.exception(e)
+        logger.error(f"Layer {layer_name} not built")
+        raise
+
+
+def build_map_layers_concurrently(
+    builder_context: BuilderContext,
+    builder_classes: t.List[t.Type[BaseLayerBuilder]],
+    max_workers: int,
+) -> None:
+    """Build independent layers in a thread pool.
+
+    Every builder counts its gids from 1 in its own context. The gids of
+    the layers are shifted in the order of `builder_classes` afterwards, so
+    they are the same as the ones of a sequential build.
+    """
+    with ThreadPoolExecutor(
+        max_workers=min(max_workers, len(builder_classes))
+    ) as executor:
+        tasks = []
+        for builder_cls in builder_classes:
+            gids = itertools.count(1)
+            # copied context, the profiler stage path is kept
+            context = copy_context()
+            context.run(_builder_gids.set, gids)
+            future = executor.submit(
+                context.run, build_map_layer, builder_context, builder_cls
+            )
+            tasks.append((builder_cls, gids, future))
+
+        for builder_cls, gids, future in tasks:
+            future.result()
+            gid_num = next(gids) - 1
+            offset = builder_context.gids.reserve(gid_num)
+            layer = builder_context.layer_datum.get(builder_cls.layer_type)
+            if layer is not None and gid_num > 0:
+                layer["gid"] += offset
+
+
 def write_map_layer_to_gpkg(
     layer_datum: t.Dict[MegMapLayerType, MegMapLayer],
     gpkg_path: str,
     matadata: t.Optional[t.Dict[str, str]] = None,
+    max_workers: int = 4,
 ) -> None:
-    layer_append = False
+    """Write the layers into a new GeoPackage, see `gpkg_writer`.
+
+    The layers are encoded in ``max_workers`` threads while the previous
+    ones are written, the indexes of the id columns in the
+    ``layer_id_name_map`` of the metadata are created at the end.
+    """
     logger.info("Writing map data to file")
-    for idx, (layer_type, layer) in enumerate(layer_datum.items()):
-        logger.info(f"Writing layer {layer_type.name}")
+    profiler = get_current_profiler()
+    layers: t.Dict[str, MegMapLayer] = {}
+    for layer_type, layer in layer_datum.items():
         if layer.empty:
             logger.warning(f"Layer {layer_type.name} is empty")
             continue
-        if idx == 0:
-            pyogrio.write_dataframe(
-                layer,
-                gpkg_path,
-                layer=layer_type.name,
-                append=layer_append,
-                dataset_metadata=matadata,
-            )
-            layer_append = True
-        else:
-            pyogrio.write_dataframe(
-                layer,
-                gpkg_path,
-                layer=layer_type.name,
-                append=layer_append,
-            )
-        logger.info(f"Layer {layer_type.name} written")
+        layers[layer_type.name] = layer
+    if not layers:
+        return
+
+    id_name_map: t.Dict[str, str] = json.loads(
+        (matadata or {}).get("layer_id_name_map", "{}")
+    )
+    id_columns = {
+        name: id_name_map[name.lower()]
+        for name, layer in layers.items()
+        if id_name_map.get(name.lower()) in layer.columns
+    }
+
+    last_name = list(layers)[-1]
+    written = False
+    with gpkg_writer.atomic_path(gpkg_path) as tmp_path:
+        for prepared in gpkg_writer.prepare_layers(layers, max_workers):
+            name = prepared.name
+            logger.info(f"Writing layer {name}")
+            dataset_metadata = None
+            if not written:
+                dataset_metadata = matadata
+            if name == last_name and profiler is not None:
+                # any later write can update the metadata, so the stages
+                # are written with the last layer, whose own write and the
+                # id indexes are the only stages missing from the file
+                dataset_metadata = {
+                    **(matadata or {}),
+                    BUILD_STAGES_KEY: json.dumps(profiler.stages),
+                }
+            with record_stage(f"write/{name}", features=len(layers[name])):
+                gpkg_writer.write_prepared_layer(
+                    tmp_path,
+                    prepared,
+                    append=written,
+                    dataset_metadata=dataset_metadata,
+                )
+            written = True
+            logger.info(f"Layer {name} written")
+        with record_stage("write/attribute_index", layers=len(id_columns)):
+            gpkg_writer.create_attribute_indexes(tmp_path, id_columns)
+
+
+def write_map_layer_to_parquet(
+    layer_datum: t.Dict[MegMapLayerType, MegMapLayer],
+    map_path: str,
+    matadata: t.Optional[t.Dict[str, str]] = None,
+) -> None:
+    """Write the layers into a new GeoParquet map directory, see
+    `geoparquet`. The dataset metadata is written last, with the stages of
+    all layer writes."""
+    logger.info("Writing map data to file")
+    profiler = get_current_profiler()
+    with gpkg_writer.atomic_path(map_path) as tmp_path:
+        os.mkdir(tmp_path)
+        for layer_type, layer in layer_datum.items():
+            if layer.empty:
+                logger.warning(f"Layer {layer_type.name} is empty")
+                continue
+            logger.info(f"Writing layer {layer_type.name}")
+            with record_stage(f"write/{layer_type.name}", features=len(layer)):
+                geoparquet.write_layer(
+                    geoparquet.get_layer_path(Path(tmp_path), layer_type.name),
+                    layer,
+                )
+            logger.info(f"Layer {layer_type.name} written")
+        dataset_metadata = dict(matadata or {})
+        if profiler is not None:
+            dataset_metadata[BUILD_STAGES_KEY] = json.dumps(profiler.stages)
+        geoparquet.write_dataset_metadata(Path(tmp_path), dataset_metadata)
+
+
+MapLayerWriter = t.Callable[
+    [t.Dict[MegMapLayerType, MegMapLayer], str, t.Optional[t.Dict[str, str]]],
+    None,
+]
+
+
+def get_map_layer_writer(layer_format: str) -> MapLayerWriter:
+    """Writer of the maps of a `LayerStore` of the format."""
+    map_layer_writer_map: t.Dict[str, MapLayerWriter] = {
+        "gpkg": write_map_layer_to_gpkg,
+        "parquet": write_map_layer_to_parquet,
+    }
+    return map_layer_writer_map[layer_format]
 
 
 def get_builder_context_cls(
@@ -0,0 +1,262 @@
+"""GeoParquet encoding of the map layers.
+
+A map is a directory with one GeoParquet (1.1) file per layer and the
+dataset metadata of the map in a json file. The geometries of a layer are
+WKB with a ``bbox`` covering column, the boxes of the features as a struct
+of ``xmin``, ``ymin``, ``xmax``, ``ymax``.
+
+The features are sorted by the Hilbert distance of the centers of their
+boxes, so the features of a row group are close to each other and the
+min/max statistics of the ``bbox`` columns of the row groups are tight.
+Reads of a bbox or of ids only decode the row groups whose statistics
+match. The ``fid`` column keeps the written order of the features, the
+order in which they are read back, like from a GPKG.
+"""
+from __future__ import annotations
+import json
+import typing as t
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+from numpy import typing as npt
+import pyarrow as pa
+import pyarrow.parquet as pq
+import shapely
+
+from .gpkg_writer import GEOMETRY_TYPES
+
+if t.TYPE_CHECKING:
+    from ..datatypes import MegMapLayer
+
+
+LAYER_SUFFIX = ".parquet"
+METADATA_FILENAME = "metadata.json"
+GEOPARQUET_VERSION = "1.1.0"
+GEOMETRY_COLUMN = "geometry"
+BBOX_COLUMN = "bbox"
+BBOX_FIELDS = ("xmin", "ymin", "xmax", "ymax")
+FID_COLUMN = "fid"
+ROW_GROUP_SIZE = 2048
+# cells of the Hilbert curve per side, 2 ** HILBERT_LEVEL
+HILBERT_LEVEL = 16
+
+Bounds = t.Tuple[float, float, float, float]
+
+
+def hilbert_distance(
+    bounds: npt.NDArray[np.float64], level: int = HILBERT_LEVEL
+) -> npt.NDArray[np.int64]:
+    """Distance along a Hilbert curve over the total bounds of the centers
+    of the boxes. Null boxes (NaN) come last."""
+    valid = ~np.isnan(bounds[:, 0])
+    rv = np.full(len(bounds), 1 << (2 * level), dtype=np.int64)
+    if not valid.any():
+        return rv
+    centers = (bounds[valid, :2] + bounds[valid, 2:]) / 2
+    mins = centers.min(axis=0)
+    spans = np.maximum(centers.max(axis=0) - mins, np.finfo(np.float64).tiny)
+    side = 1 << level
+    cells = np.minimum(
+        ((centers - mins) / spans * side).astype(np.int64), side - 1
+    )
+    x, y = cells[:, 0], cells[:, 1]
+    distance = np.zeros(len(cells), dtype=np.int64)
+    s = side >> 1
+    while s:
+        rx = (x & s) > 0
+        ry = (y & s) > 0
+        distance += s * s * ((3 * rx) ^ ry)
+        # rotate the quadrant
+        flip = ~ry & rx
+        x = np.where(flip, side - 1 - x, x)
+        y = np.where(flip, side - 1 - y, y)
+        x, y = np.where(ry, x, y), np.where(ry, y, x)
+        s >>= 1
+    rv[valid] = distance
+    return rv
+
+
+def _to_strings(values: npt.NDArray[np.object_]) -> t.List[t.Optional[str]]:
+    """Values of an object column as GDAL stores them in a string field."""
+    return [
+        None
+        if value is None or (isinstance(value, float) and np.isnan(value))
+        else value
+        if isinstance(value, str)
+        else str(value)
+        for value in values
+    ]
+
+
+def layer_to_table(layer: MegMapLayer) -> pa.Table:
+    geometry_column = layer.geometry.name
+    geometries = np.asarray(layer.geometry.values, dtype=object)
+    bounds = shapely.bounds(geometries)
+    bounds[shapely.is_empty(geometries)] = np.nan
+    valid = ~np.isnan(bounds[:, 0])
+    # geometry type names, with a " Z" suffix if 3D
+    geometry_types = sorted(
+        {
+            GEOMETRY_TYPES[type_id] + (" Z" if has_z else "")
+            for type_id, has_z in zip(
+                shapely.get_type_id(geometries[valid]).tolist(),
+                shapely.has_z(geometries[valid]).tolist(),
+            )
+        }
+    )
+    order = np.argsort(hilbert_distance(bounds), kind="stable")
+    bounds = bounds[order]
+
+    arrays: t.Dict[str, pa.Array] = {}
+    for column in layer.columns:
+        if column == geometry_column:
+            continue
+        values = layer[column].iloc[order]
+        if values.dtype == object:
+            arrays[column] = pa.array(
+                _to_strings(values.to_numpy()), type=pa.string()
+            )
+        else:
+            arrays[column] = pa.Array.from_pandas(values)
+    arrays[GEOMETRY_COLUMN] = pa.array(
+        shapely.to_wkb(geometries[order]), type=pa.binary()
+    )
+    arrays[BBOX_COLUMN] = pa.StructArray.from_arrays(
+        [pa.array(bounds[:, idx]) for idx in range(len(BBOX_FIELDS))],
+        names=BBOX_FIELDS,
+        mask=pa.array(np.isnan(bounds[:, 0])),
+    )
+    arrays[FID_COLUMN] = pa.array(order + 1)
+
+    column_meta: t.Dict[str, t.Any] = {
+        "encoding": "WKB",
+        "geometry_types": geometry_types,
+        "crs": layer.crs.to_json_dict() if layer.crs else None,
+        "covering": {
+            BBOX_COLUMN: {field: [BBOX_COLUMN, field] for field in BBOX_FIELDS}
+        },
+    }
+    if valid.any():
+        column_meta["bbox"] = [
+            float(np.nanmin(bounds[:, 0])),
+            float(np.nanmin(bounds[:, 1])),
+            float(np.nanmax(bounds[:, 2])),
+            float(np.nanmax(bounds[:, 3])),
+        ]
+    geo = {
+        "version": GEOPARQUET_VERSION,
+        "primary_column": GEOMETRY_COLUMN,
+        "columns": {GEOMETRY_COLUMN: column_meta},
+    }
+    return pa.table(arrays).replace_schema_metadata(
+        {b"geo": json.dumps(geo).encode()}
+    )
+
+
+def write_layer(path: Path, layer: MegMapLayer) -> None:
+    pq.write_table(
+        layer_to_table(layer), str(path), row_group_size=ROW_GROUP_SIZE
+    )
+
+
+def select_row_groups(
+    metadata: pq.FileMetaData,
+    bbox: t.Optional[Bounds] = None,
+    id_column: t.Optional[str] = None,
+    ids: t.Optional[t.Collection[t.Any]] = None,
+) -> t.List[int]:
+    """Row groups which may hold features whose box intersects ``bbox``
+    and whose ``id_column`` is one of ``ids``, by their statistics."""
+    column_idxs = {
+        metadata.schema.column(idx).path: idx
+        for idx in range(metadata.num_columns)
+    }
+    rv = []
+    for group_idx in range(metadata.num_row_groups):
+        row_group = metadata.row_group(group_idx)
+        if bbox is not None:
+            stats = [
+                row_group.column(
+                    column_idxs[f"{BBOX_COLUMN}.{field}"]
+                ).statistics
+                for field in BBOX_FIELDS
+            ]
+            if all(stat is not None and stat.has_min_max for stat in stats):
+                minx, miny, maxx, maxy = bbox
+                if (
+                    stats[0].min > maxx
+                    or stats[1].min > maxy
+                    or stats[2].max < minx
+                    or stats[3].max < miny
+                ):
+                    continue
+        if id_column is not None and ids is not None:
+            stat = row_group.column(column_idxs[id_column]).statistics
+            if stat is not None and stat.has_min_max:
+                try:
+                    if not any(stat.min <= id_ <= stat.max for id_ in ids):
+                        continue
+                except TypeError:
+                    # ids of another type than the column, like "1" of an
+                    # int column, are filtered out by `read_layer`
+                    pass
+        rv.append(group_idx)
+    return rv
+
+
+def read_layer(
+    path: Path,
+    bbox: t.Optional[Bounds] = None,
+    id_column: t.Optional[str] = None,
+    ids: t.Optional[t.Collection[t.Any]] = None,
+) -> MegMapLayer:
+    """Read a layer, only the features whose box intersects ``bbox`` and
+    whose ``id_column`` is one of ``ids`` if given, in written order."""
+    parquet_file = pq.ParquetFile(str(path))
+    table = parquet_file.read_row_groups(
+        select_row_groups(parquet_file.metadata, bbox, id_column, ids)
+    )
+    if bbox is not None:
+        boxes = table.column(BBOX_COLUMN).combine_chunks()
+        minx, miny, maxx, maxy = (
+            boxes.field(field).to_numpy(zero_copy_only=False)
+            for field in BBOX_FIELDS
+        )
+        # NaN of the null boxes compares False
+        mask = (
+            (minx <= bbox[2])
+            & (miny <= bbox[3])
+            & (maxx >= bbox[0])
+            & (maxy >= bbox[1])
+        )
+        table = table.filter(pa.array(mask))
+
+    geo = json.loads(parquet_file.schema_arrow.metadata[b"geo"])
+    crs = geo["columns"][GEOMETRY_COLUMN]["crs"]
+    data = table.drop([BBOX_COLUMN]).to_pandas()
+    if ids is not None and id_column is not None:
+        data = data[data[id_column].isin(ids)]
+    data = data.sort_values(FID_COLUMN, kind="stable").reset_index(drop=True)
+    geometries = shapely.from_wkb(data.pop(GEOMETRY_COLUMN).to_numpy())
+    return gpd.GeoDataFrame(
+        data.drop(columns=FID_COLUMN),
+        geometry=gpd.GeoSeries(geometries, index=data.index),
+        crs=crs,
+    )
+
+
+def write_dataset_metadata(map_path: Path, metadata: t.Dict[str, str]) -> None:
+    (map_path / METADATA_FILENAME).write_text(
+        json.dumps(metadata), encoding="utf-8"
+    )
+
+
+def read_dataset_metadata(map_path: Path) -> t.Dict[str, str]:
+    return json.loads(
+        (map_path / METADATA_FILENAME).read_text(encoding="utf-8")
+    )
+
+
+def get_layer_path(map_path: Path, layer_name: str) -> Path:
+    return map_path / f"{layer_name}{LAYER_SUFFIX}"
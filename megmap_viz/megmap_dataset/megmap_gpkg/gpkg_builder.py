@@ -1,15 +1,28 @@
 from __future__ import annotations
-import abc
 import typing as t
-import geopandas as gpd
-from shapely.geometry import LineString, Point, Polygon, MultiPoint, box
-from dataclasses import asdict
+import numpy as np
+from shapely.geometry import LineString, Polygon, box
+
+from megmap_viz.utils.profiler import record_stage
 
 from .base_builder import BaseLayerBuilder, register_layer_builder
 from ..datatypes import MegMapLayerType
-from .gpkg_datatypes import DataRow, LaneProperty, BoundaryInfo
+from ..megmap_memo.memo_data_parser import (
+    LaneDict,
+    LinePointDict,
+    LinePolylineDict,
+    ObjectDict,
+    RoadDict,
+)
+from .gpkg_datatypes import (
+    LayerColumns,
+    BoundaryInfo,
+    LANE_SCHEMA,
+)
 
 if t.TYPE_CHECKING:
+    from shapely.geometry.base import BaseGeometry
+
     from ..datatypes import MegMapLayer
     from ..megmap_apollo.lane import (
         ApolloLane,
@@ -20,9 +33,43 @@ if t.TYPE_CHECKING:
     from ..megmap_memo.memo_data_parser import MemoParserResult
 
 
-def build_gdf(datum: t.Any) -> MegMapLayer:
-    gdf = gpd.GeoDataFrame(data=datum, crs=4326)  # type: ignore
-    gdf.set_geometry("geometry", inplace=True)
+def get_memo_schema(
+    id_name: str, *raw_data_types: type
+) -> t.Dict[str, t.Optional[str]]:
+    """Columns of a memo layer, its id followed by the keys of the raw data
+    of its features. Their dtypes are inferred from the values."""
+    schema: t.Dict[str, t.Optional[str]] = {id_name: "object"}
+    for raw_data_type in raw_data_types:
+        schema.update(dict.fromkeys(raw_data_type.__annotations__))
+    return schema
+
+
+MEMO_LANE_SCHEMA = get_memo_schema("lane_id", LaneDict)
+MEMO_LINE_SCHEMA = get_memo_schema("line_id", LinePointDict, LinePolylineDict)
+MEMO_ROAD_SCHEMA = get_memo_schema("road_id", RoadDict)
+MEMO_STOP_LINE_SCHEMA = get_memo_schema("stop_line_id", ObjectDict)
+
+
+def append_memo_feature(
+    datum: LayerColumns,
+    gid: int,
+    geometry: BaseGeometry,
+    memo_id: str,
+    raw_data: t.Mapping[str, t.Any],
+) -> None:
+    """Append a memo feature, keys missing from its raw data are NaN."""
+    datum.append(
+        gid,
+        geometry,
+        memo_id,
+        *[raw_data.get(name, np.nan) for name in datum.names[1:]],
+    )
+
+
+def build_gdf(datum: LayerColumns) -> MegMapLayer:
+    with record_stage("build_gdf") as counts:
+        gdf = datum.to_gdf(crs=4326)
+        counts["features"] = len(gdf)
     # gdf["geometry_albers"] = gdf.to_crs(
     #     "+proj=aea +lat_1=25 +lat_2=47 +lat_0=0 "
     #     f"+lon_0=105 +x_0=0 +y_0=0 +ellps=GRS80 +units=m +no_defs",
@@ -32,38 +79,6 @@ def build_gdf(datum: t.Any) -> MegMapLayer:
     return gdf
 
 
-def get_pre_and_suc_road_section_ids(
-    builder: BaseLayerBuilder,
-    apollo_lane_section: ApolloLaneSection,
-    side: t.Literal["left", "right"],
-) -> t.Tuple[t.List[str], t.List[str]]:
-    if side == "left":
-        lanes = apollo_lane_section.left_lanes
-    elif side == "right":
-        lanes = apollo_lane_section.right_lanes
-    else:
-        return [], []
-
-    pre_road_section_ids = set()
-    suc_road_section_ids = set()
-
-    for lane in lanes:
-        for pre in lane.link.predecessors:
-            if pre.lane_uid not in builder.context.data.lane_datum:
-                continue
-            pre_road_section_ids.add(
-                builder.context.data.lane_datum[pre.lane_uid].road_section_id
-            )
-        for suc in lane.link.successors:
-            if suc.lane_uid not in builder.context.data.lane_datum:
-                continue
-            suc_road_section_ids.add(
-                builder.context.data.lane_datum[suc.lane_uid].road_section_id
-            )
-
-    return list(pre_road_section_ids), list(suc_road_section_ids)
-
-
 def get_lane_group_boundary(
     apollo_lane_section: ApolloLaneSection, side: t.Literal["right", "left"]
 ) -> Polygon:
@@ -126,150 +141,111 @@ def get_lane_section_boundary(
     return Polygon(list(left_line.reverse().coords) + list(right_line.coords))
 
 
-def get_boundary_geom(
-    boundary_gid: int, boundaries_layer: MegMapLayer
-) -> LineString:
-    geom_df = boundaries_layer.loc[
-        boundaries_layer["gid"] == boundary_gid, "geometry"
-    ]  # type: ignore
-    return geom_df.iloc[0]
-
-
-def get_lane_polygon(
-    boundary_info: BoundaryInfo, boundaries_layer: MegMapLayer
-) -> Polygon:
-    left_bdry_gid = boundary_info.left_line_gid
-    right_bdry_gid = boundary_info.right_line_gid
-
-    left_bdry_geo: LineString = get_boundary_geom(
-        left_bdry_gid, boundaries_layer
-    )
-    right_bdry_geo: LineString = get_boundary_geom(
-        right_bdry_gid, boundaries_layer
-    )
-
-    rlbg: LineString = left_bdry_geo.reverse()
-    return Polygon(list(right_bdry_geo.coords) + list(rlbg.coords))
-
-
-def get_lane_data_row(
-    gid: int,
-    apollo_lane: ApolloLane,
-    boundary_info: BoundaryInfo,
-    boundaries_layer: MegMapLayer,
-) -> DataRow:
-    boundary_geo = get_lane_polygon(boundary_info, boundaries_layer)
-
+def get_lane_values(
+    apollo_lane: ApolloLane, boundary_info: BoundaryInfo
+) -> t.Tuple[t.Any, ...]:
+    """Values of the LANE_SCHEMA columns of a lane, in order."""
     if apollo_lane.border.border_type is None:
         is_virtual: bool = False
     else:
         is_virtual: bool = apollo_lane.border.border_type.type == "virtual"
 
-    lane_property: LaneProperty = {
-        "road_id": apollo_lane.road_id,
-        "road_section_id": apollo_lane.road_section_id,
-        "lane_id": apollo_lane.id,
-        "lane_uid": apollo_lane.uid,
-        "lane_type": apollo_lane.type,
-        "turn_type": apollo_lane.turn_type,
-        "direction": apollo_lane.direction,
-        "is_virtual": is_virtual,
-        "length": apollo_lane.center_line.length,
-        "color": apollo_lane.color,
-        "border_type": apollo_lane.border_type,
-        "speed_limit": "unkown",
-        "predecessor_lane_uids": [],
-        "successor_lane_uids": [],
-        "left_same_neighbor_lane_uids": [],
-        "right_same_neighbor_lane_uids": [],
-        "left_opposite_neighbor_lane_uids": [],
-        "right_opposite_neighbor_lane_uids": [],
-        "signal_references": [],
-        "object_references": [],
-        "junction_references": [],
-        "lane_references": [],
-        "left_boundary_gid": boundary_info.left_line_gid,
-        "right_boundary_gid": boundary_info.right_line_gid,
-    }
-
-    # add speed limit
-    if apollo_lane.speed_limit:
-        lane_property["speed_limit"] = str(apollo_lane.speed_limit.max)
-
-    # add lane links
-    for predecessor in apollo_lane.link.predecessors:
-        t.cast(t.List[str], lane_property["predecessor_lane_uids"]).append(
-            predecessor.lane_uid
-        )
-    for successor in apollo_lane.link.successors:
-        t.cast(t.List[str], lane_property["successor_lane_uids"]).append(
-            successor.lane_uid
+    link = apollo_lane.link
+    return (
+        apollo_lane.road_id,
+        apollo_lane.road_section_id,
+        apollo_lane.id,
+        apollo_lane.uid,
+        apollo_lane.type,
+        apollo_lane.turn_type,
+        apollo_lane.direction,
+        is_virtual,
+        apollo_lane.center_line.length,
+        apollo_lane.color,
+        apollo_lane.border_type,
+        (
+            str(apollo_lane.speed_limit.max)
+            if apollo_lane.speed_limit
+            else "unkown"
+        ),
+        # lane links
+        [predecessor.lane_uid for predecessor in link.predecessors],
+        [successor.lane_uid for successor in link.successors],
+        [
+            neighbor.lane_uid
+            for neighbor in link.neighbors
+            if neighbor.side == "left" and neighbor.direction == "same"
+        ],
+        [
+            neighbor.lane_uid
+            for neighbor in link.neighbors
+            if neighbor.side == "right" and neighbor.direction == "same"
+        ],
+        [
+            neighbor.lane_uid
+            for neighbor in link.neighbors
+            if neighbor.side == "left" and neighbor.direction != "same"
+        ],
+        [
+            neighbor.lane_uid
+            for neighbor in link.neighbors
+            if neighbor.side == "right" and neighbor.direction != "same"
+        ],
+        # overlap groups
+        [signal_ref.id for signal_ref in apollo_lane.signal_overlap_group],
+        [object_ref.id for object_ref in apollo_lane.object_overlap_group],
+        [
+            junction_ref.id
+            for junction_ref in apollo_lane.junction_overlap_group
+        ],
+        [lane_ref.id for lane_ref in apollo_lane.lane_overlap_group],
+        boundary_info.left_line_gid,
+        boundary_info.right_line_gid,
+    )
+
+
+def get_lane_columns(
+    builder: BaseLayerBuilder, apollo_lanes: t.List[ApolloLane]
+) -> LayerColumns:
+    boundary_infos = [
+        builder.context.lane_boundary_info[apollo_lane.uid]
+        for apollo_lane in apollo_lanes
+    ]
+    polygons = builder.context.boundary_store.get_polygons(
+        [boundary_info.right_line_gid for boundary_info in boundary_infos],
+        [boundary_info.left_line_gid for boundary_info in boundary_infos],
+    )
+    columns = LayerColumns(LANE_SCHEMA)
+    for apollo_lane, boundary_info, polygon in zip(
+        apollo_lanes, boundary_infos, polygons
+    ):
+        columns.append(
+            builder.context.auto_id,
+            polygon,
+            *get_lane_values(apollo_lane, boundary_info),
         )
-    for neighbor in apollo_lane.link.neighbors:
-        if neighbor.direction != "same":
-            t.cast(
-                t.List[str],
-                lane_property[
-                    f"{neighbor.side}_opposite_neighbor_lane_uids"
-                ],  # type: ignore
-            ).append(neighbor.lane_uid)
-        else:
-            t.cast(
-                t.List[str],
-                lane_property[
-                    f"{neighbor.side}_same_neighbor_lane_uids"
-                ],  # type: ignore
-            ).append(neighbor.lane_uid)
-
-    # add signal overlap group
-    for signal_ref in apollo_lane.signal_overlap_group:
-        t.cast(t.Dict[str, t.List[str]], lane_property).setdefault(
-            "signal_references", []
-        ).append(signal_ref.id)
-    # add object overlap group
-    for object_ref in apollo_lane.object_overlap_group:
-        t.cast(t.Dict[str, t.List[str]], lane_property).setdefault(
-            "object_references", []
-        ).append(object_ref.id)
-    # add junction overlap group
-    for junction_ref in apollo_lane.junction_overlap_group:
-        t.cast(t.Dict[str, t.List[str]], lane_property).setdefault(
-            "junction_references", []
-        ).append(junction_ref.id)
-    # add lane overlap group
-    for lane_ref in apollo_lane.lane_overlap_group:
-        t.cast(t.Dict[str, t.List[str]], lane_property).setdefault(
-            "lane_references", []
-        ).append(lane_ref.id)
-
-    return DataRow(gid=gid, geometry=boundary_geo, **lane_property)
+    return columns
 
 
 @register_layer_builder
 class LaneBuilder(BaseLayerBuilder):
     layer_type = MegMapLayerType.LANE
+    depends_on = (MegMapLayerType.LANE_BOUNDARY,)
 
     def build_from_apollo(self) -> None:
         self.context.data = t.cast("ApolloParserResult", self.context.data)
-        lane_datum = []
-
-        for apollo_lane in self.context.data.lane_datum.values():
+        apollo_lanes = [
+            apollo_lane
+            for apollo_lane, is_connecting in zip(
+                self.context.data.lane_datum.values(),
+                self.context.topology.lane_is_connecting.tolist(),
+            )
             # virtual lanes are handled separately
-            if apollo_lane.road_id in self.context.connecting_road_ids:
-                continue
-
+            if not is_connecting
             # ignore reference lanes
-            if apollo_lane.id == 0:
-                continue
-
-            lane_datum.append(
-                get_lane_data_row(
-                    self.context.auto_id,
-                    apollo_lane,
-                    self.context.lane_boundary_info[apollo_lane.uid],
-                    self.context.boudary_layer,
-                )
-            )
+            and apollo_lane.id != 0
+        ]
+        lane_datum = get_lane_columns(self, apollo_lanes)
 
         self.context.layer_datum[self.layer_type] = build_gdf(lane_datum)
 
@@ -277,18 +253,17 @@ class LaneBuilder(BaseLayerBuilder):
 
     def build_from_memo(self) -> None:
         self.context.data = t.cast("MemoParserResult", self.context.data)
-        datum = []
+        datum = LayerColumns(MEMO_LANE_SCHEMA)
 
         for road_rv in self.context.data.roads.values():
             for lane_id in road_rv.raw_data["lane_ids"]:
                 lane_rv = self.context.data.lanes[lane_id]
-                datum.append(
-                    DataRow(
-                        gid=self.context.auto_id,
-                        geometry=lane_rv.polygon,
-                        lane_id=lane_id,
-                        **lane_rv.raw_data,
-                    )
+                append_memo_feature(
+                    datum,
+                    self.context.auto_id,
+                    lane_rv.polygon,
+                    lane_id,
+                    lane_rv.raw_data,
                 )
 
         if len(datum) == 0:
@@ -300,27 +275,21 @@ class LaneBuilder(BaseLayerBuilder):
 @register_layer_builder
 class LaneConnectorBuilder(BaseLayerBuilder):
     layer_type = MegMapLayerType.LANE_CONNECTOR
+    depends_on = (MegMapLayerType.LANE_BOUNDARY,)
 
     def build_from_apollo(self) -> None:
         self.context.data = t.cast("ApolloParserResult", self.context.data)
-        lane_datum = []
-
-        for apollo_lane in self.context.data.lane_datum.values():
-            if apollo_lane.road_id not in self.context.connecting_road_ids:
-                continue
-
-            # ignore reference lanes
-            if apollo_lane.id == 0:
-                continue
-
-            lane_datum.append(
-                get_lane_data_row(
-                    self.context.auto_id,
-                    apollo_lane,
-                    self.context.lane_boundary_info[apollo_lane.uid],
-                    self.context.boudary_layer,
-                )
+        apollo_lanes = [
+            apollo_lane
+            for apollo_lane, is_connecting in zip(
+                self.context.data.lane_datum.values(),
+                self.context.topology.lane_is_connecting.tolist(),
             )
+            if is_connecting
+            # ignore reference lanes
+            and apollo_lane.id != 0
+        ]
+        lane_datum = get_lane_columns(self, apollo_lanes)
         if len(lane_datum) == 0:
             return
         
@@ -336,7 +305,17 @@ class LaneBoundariesBuilder(BaseLayerBuilder):
 
     def build_from_apollo(self) -> None:
         self.context.data = t.cast("ApolloParserResult", self.context.data)
-        border_datum: t.List[DataRow] = []
+        border_datum = LayerColumns(
+            {
+                "color": "object",
+                "is_virtual": "bool",
+                "border_type": "object",
+                "length": "float64",
+                "on_lane_uid": "object",
+                "is_left_border": "bool",
+            }
+        )
+        used_gids: t.Set[int] = set()
 
         for (
             apollo_lane_section
@@ -355,8 +334,6 @@ class LaneBoundariesBuilder(BaseLayerBuilder):
                     continue
 
                 lanes = [ref_line] + side_lanes
-                tmp_border_datum = []
-                used_gids = set()
                 lane_gids = []
                 for idx, lane in enumerate(lanes):
                     if idx == 0:
@@ -366,19 +343,18 @@ class LaneBoundariesBuilder(BaseLayerBuilder):
                             else lane.border.geometry.sim_line.reverse()
                         )
                     lane_geom = lane.border.geometry.sim_line
-                    tmp_border_datum.append(
-                        DataRow(
-                            gid=self.context.auto_id,
-                            geometry=lane_geom,
-                            color=lane.color,
-                            is_virtual=lane.border.is_virtual,
-                            border_type=lane.border_type,
-                            length=lane.border.geometry.line.length,
-                            on_lane_uid=lane.uid,
-                            is_left_border=False,
-                        )
+                    lane_gid = self.context.auto_id
+                    border_datum.append(
+                        lane_gid,
+                        lane_geom,
+                        lane.color,
+                        lane.border.is_virtual,
+                        lane.border_type,
+                        lane.border.geometry.line.length,
+                        lane.uid,
+                        False,
                     )
-                    lane_gids.append(tmp_border_datum[-1].gid)
+                    lane_gids.append(lane_gid)
 
                 lane_groups = [
                     lane_gids[i : i + 2] for i in range(len(lane_gids) - 1)
@@ -389,19 +365,17 @@ class LaneBoundariesBuilder(BaseLayerBuilder):
                         left_border = t.cast(
                             "ApolloLaneBorder", lanes[idx].left_border
                         )
-                        tmp_border_datum.append(
-                            DataRow(
-                                gid=self.context.auto_id,
-                                geometry=left_border.geometry.sim_line,
-                                color=left_border.color,
-                                border_type=left_border.type,
-                                is_virtual=left_border.is_virtual,
-                                length=left_border.geometry.line.length,
-                                on_lane_uid=lanes[idx].uid,
-                                is_left_border=True,
-                            )
+                        left_line_gid = self.context.auto_id
+                        border_datum.append(
+                            left_line_gid,
+                            left_border.geometry.sim_line,
+                            left_border.color,
+                            left_border.is_virtual,
+                            left_border.type,
+                            left_border.geometry.line.length,
+                            lanes[idx].uid,
+                            True,
                         )
-                        left_line_gid = tmp_border_datum[-1].gid
                     used_gids.update((left_line_gid, right_line_gid))
                     self.context.lane_boundary_info[lanes[idx].uid] = (
                         BoundaryInfo(
@@ -410,15 +384,18 @@ class LaneBoundariesBuilder(BaseLayerBuilder):
                         )
                     )
 
-                for bd in tmp_border_datum:
-                    if bd.gid in used_gids:
-                        border_datum.append(bd)
+        # only the boundaries of lanes
+        border_datum = border_datum.compress(
+            gid in used_gids for gid in border_datum.gids
+        )
+        for gid, geometry in zip(border_datum.gids, border_datum.geometries):
+            self.context.boundary_store.add(gid, geometry)
 
         self.context.layer_datum[self.layer_type] = build_gdf(border_datum)
 
     def build_from_memo(self) -> None:
         self.context.data = t.cast("MemoParserResult", self.context.data)
-        datum = []
+        datum = LayerColumns(MEMO_LINE_SCHEMA)
 
         line_ids = set()
         for road_rv in self.context.data.roads.values():
@@ -429,13 +406,12 @@ class LaneBoundariesBuilder(BaseLayerBuilder):
 
         for line_id, line_rv in self.context.data.lines.items():
             if line_id in line_ids:
-                datum.append(
-                    DataRow(
-                        gid=self.context.auto_id,
-                        geometry=line_rv.geometry,
-                        line_id=line_id,
-                        **line_rv.raw_data,
-                    )
+                append_memo_feature(
+                    datum,
+                    self.context.auto_id,
+                    line_rv.geometry,
+                    line_id,
+                    line_rv.raw_data,
                 )
 
         if len(datum) == 0:
@@ -450,7 +426,14 @@ class TrafficLightBuilder(BaseLayerBuilder):
 
     def build_from_apollo(self) -> None:
         self.context.data = t.cast("ApolloParserResult", self.context.data)
-        traffic_light_datum = []
+        traffic_light_datum = LayerColumns(
+            {
+                "self_id": "object",
+                "stopline_ref_ids": "object",
+                "layout_type": "object",
+                "sub_signals_info": "object",
+            }
+        )
 
         for apollo_signal in self.context.data.signal_datum.values():
             if apollo_signal.type.lower() != "trafficlight":
@@ -469,14 +452,12 @@ class TrafficLightBuilder(BaseLayerBuilder):
             ]
 
             traffic_light_datum.append(
-                DataRow(
-                    gid=self.context.auto_id,
-                    geometry=outline_geom,
-                    self_id=signal_id,
-                    stopline_ref_ids=apollo_signal.stop_line_refs,
-                    layout_type=apollo_signal.layout_type,
-                    sub_signals_info=subsignal_info,
-                )
+                self.context.auto_id,
+                outline_geom,
+                signal_id,
+                apollo_signal.stop_line_refs,
+                apollo_signal.layout_type,
+                subsignal_info,
             )
 
         if len(traffic_light_datum) == 0:
@@ -496,20 +477,14 @@ class StopLineBuilder(BaseLayerBuilder):
 
     def build_from_apollo(self) -> None:
         self.context.data = t.cast("ApolloParserResult", self.context.data)
-        datum = []
+        datum = LayerColumns({"self_id": "object"})
 
         for apollo_object in self.context.data.object_datum.values():
             if apollo_object.type.lower() != "stopline":
                 continue
             object_id = apollo_object.id
             geom = t.cast(LineString, apollo_object.outline)
-            datum.append(
-                DataRow(
-                    gid=self.context.auto_id,
-                    geometry=geom,
-                    self_id=object_id,
-                )
-            )
+            datum.append(self.context.auto_id, geom, object_id)
 
         if len(datum) == 0:
             return
@@ -518,17 +493,12 @@ class StopLineBuilder(BaseLayerBuilder):
 
     def build_from_memo(self) -> None:
         self.context.data = t.cast("MemoParserResult", self.context.data)
-        datum = []
+        datum = LayerColumns(MEMO_STOP_LINE_SCHEMA)
         for oid, obj in self.context.data.objects.items():
             if obj.raw_data["type"] != "stopline":
                 continue
-            datum.append(
-                DataRow(
-                    gid=self.context.auto_id,
-                    geometry=obj.geometry,
-                    stop_line_id=oid,
-                    **obj.raw_data,
-                )
+            append_memo_feature(
+                datum, self.context.auto_id, obj.geometry, oid, obj.raw_data
             )
 
         if len(datum) == 0:
@@ -543,20 +513,14 @@ class CrosswalkBuilder(BaseLayerBuilder):
 
     def build_from_apollo(self) -> None:
         self.context.data = t.cast("ApolloParserResult", self.context.data)
-        datum = []
+        datum = LayerColumns({"self_id": "object"})
 
         for apollo_object in self.context.data.object_datum.values():
             if apollo_object.type.lower() != "crosswalk":
                 continue
             object_id = apollo_object.id
             geom = t.cast(Polygon, apollo_object.outline)
-            datum.append(
-                DataRow(
-                    gid=self.context.auto_id,
-                    geometry=geom,
-                    self_id=object_id,
-                )
-            )
+            datum.append(self.context.auto_id, geom, object_id)
 
         if len(datum) == 0:
             return
@@ -578,7 +542,13 @@ class IntersectionBuilder(BaseLayerBuilder):
         if not hasattr(self.context.data, 'junction_datum') or not self.context.data.junction_datum:
             return
         
-        datum = []
+        datum = LayerColumns(
+            {
+                "junction_id": "object",
+                "connecting_road_ids": "object",
+                "incomming_lane_uids": "object",
+            }
+        )
 
         for apollo_junction in self.context.data.junction_datum.values():
             junct_id = apollo_junction.id
@@ -591,13 +561,11 @@ class IntersectionBuilder(BaseLayerBuilder):
                 incomming_lane_uids.append(conn.incoming_road)
 
             datum.append(
-                DataRow(
-                    gid=self.context.auto_id,
-                    geometry=geom,
-                    junction_id=junct_id,
-                    connecting_road_ids=connecting_road_ids,
-                    incomming_lane_uids=incomming_lane_uids,
-                )
+                self.context.auto_id,
+                geom,
+                junct_id,
+                connecting_road_ids,
+                incomming_lane_uids,
             )
 
         self.context.layer_datum[self.layer_type] = build_gdf(datum)
@@ -612,7 +580,7 @@ class BaselinePathsBuilder(BaseLayerBuilder):
 
     def build_from_apollo(self) -> None:
         self.context.data = t.cast("ApolloParserResult", self.context.data)
-        datum = []
+        datum = LayerColumns({"lane_uid": "object", "is_virtual": "bool"})
 
         for apollo_lane in self.context.data.lane_datum.values():
             geom = apollo_lane.center_line.sim_line
@@ -625,31 +593,23 @@ class BaselinePathsBuilder(BaseLayerBuilder):
                     apollo_lane.border.border_type.type == "virtual"
                 )
 
-            datum.append(
-                DataRow(
-                    gid=self.context.auto_id,
-                    geometry=geom,
-                    lane_uid=lane_uid,
-                    is_virtual=is_virtual,
-                )
-            )
+            datum.append(self.context.auto_id, geom, lane_uid, is_virtual)
 
         self.context.layer_datum[self.layer_type] = build_gdf(datum)
 
     def build_from_memo(self) -> None:
         self.context.data = t.cast("MemoParserResult", self.context.data)
-        datum = []
+        datum = LayerColumns(MEMO_LANE_SCHEMA)
 
         for road_rv in self.context.data.roads.values():
             for lane_id in road_rv.raw_data["lane_ids"]:
                 lane_rv = self.context.data.lanes[lane_id]
-                datum.append(
-                    DataRow(
-                        gid=self.context.auto_id,
-                        geometry=lane_rv.centerline,
-                        lane_id=lane_id,
-                        **lane_rv.raw_data,
-                    )
+                append_memo_feature(
+                    datum,
+                    self.context.auto_id,
+                    lane_rv.centerline,
+                    lane_id,
+                    lane_rv.raw_data,
                 )
 
         if len(datum) == 0:
@@ -665,7 +625,17 @@ class LaneGroupPolygonBuilder(BaseLayerBuilder):
     def build_from_apollo(self) -> None:
         self.context.data = t.cast("ApolloParserResult", self.context.data)
 
-        datum = []
+        datum = LayerColumns(
+            {
+                "road_section_id": "object",
+                "road_type": "object",
+                "lane_uids": "object",
+                "side_on_ref_line": "object",
+                "junction_id": "object",
+                "pre_road_section_ids": "object",
+                "suc_road_section_ids": "object",
+            }
+        )
 
         for apollo_road in self.context.data.road_datum.values():
             road_id = apollo_road.id
@@ -685,41 +655,38 @@ class LaneGroupPolygonBuilder(BaseLayerBuilder):
                     (
                         pre_road_section_ids,
                         suc_road_section_ids,
-                    ) = get_pre_and_suc_road_section_ids(
-                        self, apollo_lane_section, side
+                    ) = self.context.topology.get_lane_group_links(
+                        f"{road_id}_{lane_section_id}", side
                     )
                     datum.append(
-                        DataRow(
-                            gid=self.context.auto_id,
-                            geometry=bdry_polygon,
-                            road_section_id=f"{road_id}_{lane_section_id}",
-                            road_type=apollo_road.type,
-                            lane_uids=get_lane_uids(apollo_lane_section, side),
-                            side_on_ref_line=side,
-                            junction_id=(
-                                apollo_road.junction
-                                if apollo_road.junction != "-1"
-                                else None
-                            ),
-                            pre_road_section_ids=pre_road_section_ids,
-                            suc_road_section_ids=suc_road_section_ids,
-                        )
+                        self.context.auto_id,
+                        bdry_polygon,
+                        f"{road_id}_{lane_section_id}",
+                        apollo_road.type,
+                        get_lane_uids(apollo_lane_section, side),
+                        side,
+                        (
+                            apollo_road.junction
+                            if apollo_road.junction != "-1"
+                            else None
+                        ),
+                        pre_road_section_ids,
+                        suc_road_section_ids,
                     )
 
         self.context.layer_datum[self.layer_type] = build_gdf(datum)
 
     def build_from_memo(self) -> None:
         self.context.data = t.cast("MemoParserResult", self.context.data)
-        datum = []
+        datum = LayerColumns(MEMO_ROAD_SCHEMA)
 
         for road_id, road_rv in self.context.data.roads.items():
-            datum.append(
-                DataRow(
-                    gid=self.context.auto_id,
-                    geometry=road_rv.polygon,
-                    road_id=road_id,
-                    **road_rv.raw_data,
-                )
+            append_memo_feature(
+                datum,
+                self.context.auto_id,
+                road_rv.polygon,
+                road_id,
+                road_rv.raw_data,
             )
 
         if len(datum) == 0:
@@ -732,35 +699,20 @@ class LaneGroupPolygonBuilder(BaseLayerBuilder):
 class ReferenceLineBuilder(BaseLayerBuilder):
     layer_type = MegMapLayerType.REFERENCE_LINE
 
-    def get_pre_and_suc_road_section_ids(
-        self, apollo_lane_section: ApolloLaneSection
-    ) -> t.Tuple[t.List[str], t.List[str]]:
-        pre_road_section_ids = set()
-        suc_road_section_ids = set()
-
-        lanes = (
-            apollo_lane_section.left_lanes + apollo_lane_section.right_lanes
-        )
-        for lane in lanes:
-            for pre in lane.link.predecessors:
-                if pre.lane_uid not in self.context.data.lane_datum:
-                    continue
-                pre_road_section_ids.add(
-                    self.context.data.lane_datum[pre.lane_uid].road_section_id
-                )
-            for suc in lane.link.successors:
-                if suc.lane_uid not in self.context.data.lane_datum:
-                    continue
-                suc_road_section_ids.add(
-                    self.context.data.lane_datum[suc.lane_uid].road_section_id
-                )
-
-        return list(pre_road_section_ids), list(suc_road_section_ids)
-
     def build_from_apollo(self) -> None:
         self.context.data = t.cast("ApolloParserResult", self.context.data)
 
-        datum = []
+        datum = LayerColumns(
+            {
+                "road_section_id": "object",
+                "left_backward_lane_uids": "object",
+                "right_forward_lane_uids": "object",
+                "road_type": "object",
+                "junction_id": "object",
+                "pre_road_section_ids": "object",
+                "suc_road_section_ids": "object",
+            }
+        )
 
         for apollo_road in self.context.data.road_datum.values():
             road_id = apollo_road.id
@@ -780,46 +732,45 @@ class ReferenceLineBuilder(BaseLayerBuilder):
                 (
                     pre_road_section_ids,
                     suc_road_section_ids,
-                ) = self.get_pre_and_suc_road_section_ids(apollo_lane_section)
+                ) = self.context.topology.get_section_links(
+                    f"{road_id}_{lane_section_id}"
+                )
 
                 reference_line = (
                     apollo_lane_section.ref_line.border.geometry.sim_line
                 )
                 datum.append(
-                    DataRow(
-                        gid=self.context.auto_id,
-                        geometry=reference_line,
-                        road_section_id=f"{road_id}_{lane_section_id}",
-                        left_backward_lane_uids=left_lane_uids,
-                        right_forward_lane_uids=right_lane_uids,
-                        road_type=apollo_road.type,
-                        junction_id=(
-                            apollo_road.junction
-                            if apollo_road.junction != "-1"
-                            else None
-                        ),
-                        pre_road_section_ids=pre_road_section_ids,
-                        suc_road_section_ids=suc_road_section_ids,
-                    )
+                    self.context.auto_id,
+                    reference_line,
+                    f"{road_id}_{lane_section_id}",
+                    left_lane_uids,
+                    right_lane_uids,
+                    apollo_road.type,
+                    (
+                        apollo_road.junction
+                        if apollo_road.junction != "-1"
+                        else None
+                    ),
+                    pre_road_section_ids,
+                    suc_road_section_ids,
                 )
 
         self.context.layer_datum[self.layer_type] = build_gdf(datum)
 
     def build_from_memo(self) -> None:
         self.context.data = t.cast("MemoParserResult", self.context.data)
-        datum = []
+        datum = LayerColumns(MEMO_LINE_SCHEMA)
 
         for line_id, line_rv in self.context.data.lines.items():
             if line_rv.raw_data.get("border_type") == "ins":
                 if not line_rv.raw_data.get("length"):
                     line_rv.raw_data["length"] = -1
-                datum.append(
-                    DataRow(
-                        gid=self.context.auto_id,
-                        geometry=line_rv.sim_geometry,
-                        line_id=line_id,
-                        **line_rv.raw_data,
-                    )
+                append_memo_feature(
+                    datum,
+                    self.context.auto_id,
+                    line_rv.sim_geometry,
+                    line_id,
+                    line_rv.raw_data,
                 )
 
         if len(datum) == 0:
@@ -1,9 +1,18 @@
 from __future__ import annotations
 import typing as t
+from array import array
+from itertools import compress
 from dataclasses import dataclass, asdict
 
+import numpy as np
+from numpy import typing as npt
+import pandas as pd
+import geopandas as gpd
+import shapely
+
 if t.TYPE_CHECKING:
-    from shapely.geometry import LineString, Polygon, MultiPoint
+    from shapely.geometry import LineString
+    from shapely.geometry.base import BaseGeometry
 
 
 class BoundaryInfo(t.NamedTuple):
@@ -11,45 +20,174 @@ class BoundaryInfo(t.NamedTuple):
     right_line_gid: int
 
 
-class LaneProperty(t.TypedDict):
-    road_id: str
-    road_section_id: str
-    lane_id: int
-    lane_uid: str
-    lane_type: str
-    turn_type: str
-    direction: str
-    is_virtual: bool
-    length: float
-    color: str
-    border_type: str
-    speed_limit: str
-    predecessor_lane_uids: t.List[str]
-    successor_lane_uids: t.List[str]
-    left_same_neighbor_lane_uids: t.List[str]
-    right_same_neighbor_lane_uids: t.List[str]
-    left_opposite_neighbor_lane_uids: t.List[str]
-    right_opposite_neighbor_lane_uids: t.List[str]
-    signal_references: t.List[str]
-    object_references: t.List[str]
-    junction_references: t.List[str]
-    lane_references: t.List[str]
-    left_boundary_gid: int
-    right_boundary_gid: int
-
-
-class DataRow(dict):
-    def __init__(
+class LineStore:
+    """Lines addressed by their gid.
+
+    The coordinates of all lines are packed into one buffer on the first
+    read, so the geometries of many features are assembled from them at
+    once instead of looking the lines up in a layer one by one.
+    """
+
+    def __init__(self) -> None:
+        self._gid_index: t.Dict[int, int] = {}
+        self._lines: t.List[LineString] = []
+        self._coords: t.Optional[npt.NDArray[np.float64]] = None
+        self._offsets: npt.NDArray[np.int64] = np.zeros(1, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self._lines)
+
+    def __contains__(self, gid: int) -> bool:
+        return gid in self._gid_index
+
+    def add(self, gid: int, line: LineString) -> None:
+        self._gid_index[gid] = len(self._lines)
+        self._lines.append(line)
+        self._coords = None
+
+    def _pack(
         self,
-        gid: int,
-        geometry: t.Union[Polygon, LineString, MultiPoint],
-        **kwrgs,
-    ) -> None:
-        super().__init__(gid=gid, geometry=geometry, **kwrgs)
+    ) -> t.Tuple[npt.NDArray[np.float64], npt.NDArray[np.int64]]:
+        if self._coords is None:
+            lines = np.empty(len(self._lines), dtype=object)
+            lines[:] = self._lines
+            self._coords, line_index = shapely.get_coordinates(
+                lines,
+                include_z=bool(shapely.has_z(lines).any()),
+                return_index=True,
+            )
+            self._offsets = np.zeros(len(lines) + 1, dtype=np.int64)
+            np.cumsum(
+                np.bincount(line_index, minlength=len(lines)),
+                out=self._offsets[1:],
+            )
+        return self._coords, self._offsets
 
-    @property
-    def gid(self) -> int:
-        return self["gid"]
+    def _get_rows(self, gids: t.Sequence[int]) -> npt.NDArray[np.intp]:
+        return np.fromiter(
+            (self._gid_index[gid] for gid in gids),
+            dtype=np.intp,
+            count=len(gids),
+        )
+
+    def get_coords(self, gid: int) -> npt.NDArray[np.float64]:
+        coords, offsets = self._pack()
+        row = self._gid_index[gid]
+        return coords[offsets[row] : offsets[row + 1]]
+
+    def get_polygons(
+        self, right_gids: t.Sequence[int], left_gids: t.Sequence[int]
+    ) -> npt.NDArray[np.object_]:
+        """Polygons of the right lines followed by the reversed left lines,
+        e.g. the lanes between their boundaries."""
+        if not right_gids:
+            return np.empty(0, dtype=object)
+        coords, offsets = self._pack()
+        right_rows = self._get_rows(right_gids)
+        left_rows = self._get_rows(left_gids)
+        right_starts = offsets[right_rows]
+        right_sizes = offsets[right_rows + 1] - right_starts
+        left_ends = offsets[left_rows + 1]
+        sizes = right_sizes + left_ends - offsets[left_rows]
+
+        # position of every point of the rings inside its ring
+        ring_index = np.repeat(np.arange(len(sizes)), sizes)
+        pos = np.arange(sizes.sum()) - np.repeat(
+            np.cumsum(sizes) - sizes, sizes
+        )
+        right_sizes = right_sizes[ring_index]
+        point_index = np.where(
+            pos < right_sizes,
+            right_starts[ring_index] + pos,
+            left_ends[ring_index] - 1 - (pos - right_sizes),
+        )
+        # rings are closed by linearrings, as by Polygon
+        rings = shapely.linearrings(coords[point_index], indices=ring_index)
+        return shapely.polygons(rings)
+
+
+# columns of the LANE and LANE_CONNECTOR layers, list columns hold the
+# uids or ids of the features a lane refers to
+LANE_SCHEMA: t.Dict[str, t.Optional[str]] = {
+    "road_id": "object",
+    "road_section_id": "object",
+    "lane_id": "int64",
+    "lane_uid": "object",
+    "lane_type": "object",
+    "turn_type": "object",
+    "direction": "object",
+    "is_virtual": "bool",
+    "length": "float64",
+    "color": "object",
+    "border_type": "object",
+    "speed_limit": "object",
+    "predecessor_lane_uids": "object",
+    "successor_lane_uids": "object",
+    "left_same_neighbor_lane_uids": "object",
+    "right_same_neighbor_lane_uids": "object",
+    "left_opposite_neighbor_lane_uids": "object",
+    "right_opposite_neighbor_lane_uids": "object",
+    "signal_references": "object",
+    "object_references": "object",
+    "junction_references": "object",
+    "lane_references": "object",
+    "left_boundary_gid": "int64",
+    "right_boundary_gid": "int64",
+}
+
+
+class LayerColumns:
+    """Column buffers of a layer, one row per appended feature.
+
+    The columns are those of the schema, in its order, and the GeoDataFrame
+    is created once from them. A column gets the dtype of the schema, a
+    dtype of None is inferred from the values of the column.
+    """
+
+    def __init__(self, schema: t.Mapping[str, t.Optional[str]]) -> None:
+        self.schema = dict(schema)
+        self.names = tuple(self.schema)
+        self.gids = array("q")
+        self.geometries: t.List[BaseGeometry] = []
+        self.columns: t.Dict[str, t.List[t.Any]] = {
+            name: [] for name in self.names
+        }
+        self._column_lists = tuple(self.columns.values())
+
+    def __len__(self) -> int:
+        return len(self.gids)
+
+    def append(self, gid: int, geometry: BaseGeometry, *values: t.Any) -> None:
+        """Add a feature with the values of the schema columns, in order."""
+        if len(values) != len(self._column_lists):
+            raise ValueError(
+                f"Expected {len(self._column_lists)} values, got {len(values)}"
+            )
+        self.gids.append(gid)
+        self.geometries.append(geometry)
+        for column, value in zip(self._column_lists, values):
+            column.append(value)
+
+    def compress(self, selectors: t.Iterable[bool]) -> LayerColumns:
+        """Columns of the features whose selector is true."""
+        selectors = list(selectors)
+        columns = LayerColumns(self.schema)
+        columns.gids = array("q", compress(self.gids, selectors))
+        columns.geometries = list(compress(self.geometries, selectors))
+        for column, values in zip(columns._column_lists, self._column_lists):
+            column.extend(compress(values, selectors))
+        return columns
+
+    def to_gdf(self, crs: t.Any = 4326) -> gpd.GeoDataFrame:
+        geometries = np.empty(len(self.geometries), dtype=object)
+        geometries[:] = self.geometries
+        data: t.Dict[str, t.Any] = {
+            "gid": np.frombuffer(self.gids, dtype=np.int64).copy(),
+            "geometry": gpd.array.from_shapely(geometries, crs=crs),
+        }
+        for name, values in self.columns.items():
+            data[name] = pd.Series(values, dtype=self.schema[name])
+        return gpd.GeoDataFrame(data, geometry="geometry", crs=crs)
 
 
 @dataclass(eq=True, frozen=True, unsafe_hash=True)
@@ -1,87 +1,131 @@
-import json
+import math
+import numbers
+import sqlite3
 import typing as t
-from pathlib import Path
-from dataclasses import dataclass
+import warnings
+from contextlib import closing
 from functools import lru_cache
+from pathlib import Path
 
 import pyogrio
-import geopandas as gpd
-import numpy as np
-import numpy.typing as npt
 
+from ..datatypes import MegMapLayer
+from .gpkg_datatypes import MegMapFileInfo
+from .gpkg_writer import _quote
+from .layer_store import Bounds, LayerStore, filter_layer
 
-from ..datatypes import MegMapLayer, MegMapLayerType
-from .gpkg_datatypes import MegMapFileInfo, MayLayerMetadata
 
+def _to_sql_literal(value: t.Any) -> str:
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return "NULL"
+    if isinstance(value, numbers.Integral):
+        return str(int(value))
+    if isinstance(value, numbers.Real):
+        return repr(float(value))
+    return "'" + str(value).replace("'", "''") + "'"
 
-class GPKGDB:
-    def __init__(self, root_path: str) -> None:
-        self.root_path = Path(root_path).absolute()
 
-    @property
-    def all_megmap_file_info(self) -> t.List[MegMapFileInfo]:
-        file_info = []
-        for file_path in self.root_path.iterdir():
-            if file_path.is_dir():
-                continue
-            if file_path.suffix != ".gpkg":
-                continue
-            remark, md5 = file_path.stem.rsplit("_", 1)
-            file_info.append(MegMapFileInfo(remark=remark, md5=md5))
-        return file_info
+def get_ids_where(id_column: str, ids: t.Collection[t.Any]) -> str:
+    """SQL condition of `pyogrio.read_dataframe` on ``id_column`` being one
+    of ``ids``. SQLite compares the ids with the affinity of the column, so
+    this may match more features than `filter_layer`."""
+    return (
+        f"{_quote(id_column)} IN "
+        f"({', '.join(_to_sql_literal(id_) for id_ in ids)})"
+    )
 
-    def exists(self, info: MegMapFileInfo) -> bool:
-        return (self.root_path / info.filename).exists()
 
-    def delete(self, info: MegMapFileInfo) -> None:
-        (self.root_path / info.filename).unlink(missing_ok=True)
+class GPKGDB(LayerStore):
+    """Maps stored as GPKG files.
 
-    @lru_cache()
-    def get_metadata(self, info: MegMapFileInfo) -> MayLayerMetadata:
-        meta = pyogrio.read_info(str(self.root_path / info.filename))[
-            "dataset_metadata"
-        ]
-        apollo_path: str = meta["map_s3_path"]
-        apollo_md5: str = meta["map_md5"]
-        remark: str = meta["map_remark"]
-        available_layers: t.List[str] = json.loads(meta["available_layers"])
-        layer_id_name_map: t.Dict[str, str] = json.loads(
-            meta["layer_id_name_map"]
-        )
-        map_type: str = meta["map_type"]
-        return MayLayerMetadata(
-            map_s3_path=apollo_path,
-            map_md5=apollo_md5,
-            map_remark=remark,
-            available_layers=available_layers,
-            layer_id_name_map=layer_id_name_map,
-            map_type=map_type,
-        )
+    Reads of a bbox or of ids use the R-tree of the layer and an SQL
+    condition on the id column, see `read_layer`. Lookups of ids in an
+    indexed column always read only those features, see
+    `get_indexed_columns`.
+    """
 
-    @lru_cache()
-    def load_map_layer(
-        self, info: MegMapFileInfo, layer_name: str
-    ) -> t.Optional[MegMapLayer]:
-        try:
-            map_layer = pyogrio.read_dataframe(
-                str(self.root_path / info.filename),
+    suffix = ".gpkg"
+
+    def get_path(self, info: MegMapFileInfo) -> Path:
+        return self.root_path / info.filename
+
+    def read_dataset_metadata(self, info: MegMapFileInfo) -> t.Dict[str, str]:
+        return pyogrio.read_info(str(self.get_path(info)))["dataset_metadata"]
+
+    def read_layer(
+        self,
+        info: MegMapFileInfo,
+        layer_name: str,
+        bbox: t.Optional[Bounds] = None,
+        id_column: t.Optional[str] = None,
+        ids: t.Optional[t.Collection[t.Any]] = None,
+    ) -> MegMapLayer:
+        if bbox is None and (id_column is None or ids is None):
+            return pyogrio.read_dataframe(
+                str(self.get_path(info)),
                 layer=layer_name,
                 use_arrow=True,
             )
-            return map_layer  # type: ignore
-        except Exception:
-            return None
+        with warnings.catch_warnings():
+            # of a query without matches
+            warnings.filterwarnings(
+                "ignore", "Layer .* does not have any features to read"
+            )
+            # not with arrow, which neither returns the fids nor reads the
+            # features of a bbox in order
+            map_layer = pyogrio.read_dataframe(
+                str(self.get_path(info)),
+                layer=layer_name,
+                bbox=bbox,
+                where=(
+                    None
+                    if id_column is None or ids is None
+                    else get_ids_where(id_column, ids)
+                ),
+                fid_as_index=True,
+            )
+        map_layer = filter_layer(
+            map_layer.sort_index(), bbox, id_column, ids  # type: ignore
+        )
+        return map_layer.reset_index(drop=True)
 
     @lru_cache()
-    def load_all_map_layer(
-        self, info: MegMapFileInfo
-    ) -> t.Dict[MegMapLayerType, MegMapLayer]:
-        layer_datum = {}
-        for layer_type in MegMapLayerType:
-            try:
-                layer_datum[layer_type] = self.load_map_layer(
-                    info, layer_type.name
+    def get_indexed_columns(
+        self, info: MegMapFileInfo, layer_name: str
+    ) -> t.FrozenSet[str]:
+        """Columns of a layer which are the first column of an SQLite
+        index, none for maps written before their id columns were indexed."""
+        uri = f"{self.get_path(info).as_uri()}?mode=ro"
+        try:
+            with closing(sqlite3.connect(uri, uri=True)) as con:
+                return frozenset(
+                    name
+                    for name, in con.execute(
+                        "SELECT info.name FROM pragma_index_list(?) AS list, "
+                        "pragma_index_info(list.name) AS info "
+                        "WHERE info.seqno = 0",
+                        (layer_name,),
+                    )
                 )
+        except sqlite3.Error:
+            return frozenset()
+
+    def query_map_layer(
+        self,
+        info: MegMapFileInfo,
+        layer_name: str,
+        bbox: t.Optional[Bounds] = None,
+        id_column: t.Optional[str] = None,
+        ids: t.Optional[t.Collection[t.Any]] = None,
+    ) -> t.Optional[MegMapLayer]:
+        if (
+            bbox is None
+            and id_column is not None
+            and ids is not None
+            and id_column in self.get_indexed_columns(info, layer_name)
+        ):
+            try:
+                return self.read_layer(info, layer_name, bbox, id_column, ids)
             except Exception:
-                continue
-        return layer_datum
+                return None
+        return super().query_map_layer(info, layer_name, bbox, id_column, ids)
@@ -0,0 +1,228 @@
+"""Bulk writer of the map layers into a GeoPackage.
+
+The encoding of the layers (WKB, geometry type, bounds) is prepared in a
+thread pool, shapely releases the GIL for it, while GDAL writes the layers
+prepared before. GDAL creates the spatial index of every layer while it
+writes it. The id columns of the layers get an SQLite index, for lookups of
+features by id.
+
+The file is written in a hidden temporary directory next to the target and
+moved to it once complete, so readers never see a partial map.
+"""
+from __future__ import annotations
+import os
+import shutil
+import sqlite3
+import threading
+import typing as t
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+from numpy import typing as npt
+import pandas as pd
+import pyogrio
+import shapely
+from pyogrio.errors import DataSourceError
+from pyproj.enums import WktVersion
+
+if t.TYPE_CHECKING:
+    from ..datatypes import MegMapLayer
+
+
+GEOMETRY_COLUMN = "geom"
+FID_COLUMN = "fid"
+# OGR names of the shapely geometry type ids
+GEOMETRY_TYPES = (
+    "Point",
+    "LineString",
+    "LinearRing",
+    "Polygon",
+    "MultiPoint",
+    "MultiLineString",
+    "MultiPolygon",
+    "GeometryCollection",
+)
+MULTI_TYPES = {
+    "Point": "MultiPoint",
+    "LineString": "MultiLineString",
+    "Polygon": "MultiPolygon",
+}
+
+
+class PreparedLayer(t.NamedTuple):
+    name: str
+    geometry: npt.NDArray[np.object_]  # WKB
+    geometry_type: str
+    promote_to_multi: bool
+    crs: t.Optional[str]
+    fields: t.List[str]
+    field_data: t.List[t.Any]
+    field_mask: t.List[t.Optional[npt.NDArray[np.bool_]]]
+
+
+def get_geometry_type(
+    geometries: npt.NDArray[np.object_],
+) -> t.Tuple[str, bool]:
+    """Layer geometry type and whether single geometries are promoted to
+    multi ones, as inferred by `pyogrio.write_dataframe` for GPKG."""
+    valid = geometries[
+        ~(shapely.is_missing(geometries) | shapely.is_empty(geometries))
+    ]
+    has_z = shapely.has_z(valid)
+    if has_z.any() and not has_z.all():
+        raise DataSourceError(
+            "Mixed 2D and 3D coordinates are not supported by GPKG"
+        )
+    names = {
+        GEOMETRY_TYPES[type_id]
+        for type_id in np.unique(shapely.get_type_id(valid)).tolist()
+    }
+    promote_to_multi = False
+    geometry_type = "Unknown"
+    if len(names) == 1:
+        geometry_type = names.pop()
+    elif len(names) == 2:
+        for single, multi in MULTI_TYPES.items():
+            if names == {single, multi}:
+                geometry_type, promote_to_multi = multi, True
+    if has_z.any() and geometry_type != "Unknown":
+        geometry_type = f"{geometry_type} Z"
+    return geometry_type, promote_to_multi
+
+
+def prepare_layer(name: str, layer: MegMapLayer) -> PreparedLayer:
+    """Encode a layer the way `pyogrio.write_dataframe` does."""
+    geometry_column = layer.geometry.name
+    geometries = np.asarray(layer.geometry.values, dtype=object)
+    fields = [c for c in layer.columns if c != geometry_column]
+    field_data: t.List[t.Any] = []
+    field_mask: t.List[t.Optional[npt.NDArray[np.bool_]]] = []
+    for field in fields:
+        values = layer[field].values
+        if isinstance(
+            values,
+            (
+                pd.arrays.IntegerArray,
+                pd.arrays.FloatingArray,
+                pd.arrays.BooleanArray,
+            ),
+        ):
+            field_data.append(values._data)
+            field_mask.append(values._mask)
+        elif isinstance(values, pd.api.extensions.ExtensionArray):
+            field_data.append(np.asarray(values))
+            field_mask.append(np.asarray(layer[field].isna()))
+        else:
+            field_data.append(values)
+            field_mask.append(None)
+
+    crs = None
+    if layer.crs:
+        epsg = layer.crs.to_epsg()
+        if epsg:
+            crs = f"EPSG:{epsg}"
+        else:
+            crs = layer.crs.to_wkt(WktVersion.WKT1_GDAL)
+
+    geometry_type, promote_to_multi = get_geometry_type(geometries)
+    return PreparedLayer(
+        name=name,
+        geometry=shapely.to_wkb(geometries),
+        geometry_type=geometry_type,
+        promote_to_multi=promote_to_multi,
+        crs=crs,
+        fields=fields,
+        field_data=field_data,
+        field_mask=field_mask,
+    )
+
+
+def write_prepared_layer(
+    gpkg_path: str,
+    layer: PreparedLayer,
+    append: bool,
+    dataset_metadata: t.Optional[t.Dict[str, str]] = None,
+) -> None:
+    pyogrio.raw.write(
+        gpkg_path,
+        layer=layer.name,
+        driver="GPKG",
+        geometry=layer.geometry,
+        field_data=layer.field_data,
+        field_mask=layer.field_mask,
+        fields=layer.fields,
+        crs=layer.crs,
+        geometry_type=layer.geometry_type,
+        promote_to_multi=layer.promote_to_multi,
+        append=append,
+        dataset_metadata=dataset_metadata,
+    )
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def get_attribute_index_name(table: str, column: str) -> str:
+    return f"idx_{table}_{column}"
+
+
+def create_attribute_indexes(
+    gpkg_path: str, layer_columns: t.Dict[str, str]
+) -> None:
+    """Index a column of every layer in ``layer_columns``, by layer name."""
+    con = sqlite3.connect(gpkg_path, isolation_level=None)
+    try:
+        con.execute("PRAGMA synchronous = OFF")
+        con.execute("BEGIN")
+        for name, column in layer_columns.items():
+            con.execute(
+                "CREATE INDEX "
+                f"{_quote(get_attribute_index_name(name, column))} "
+                f"ON {_quote(name)} ({_quote(column)})"
+            )
+        con.execute("COMMIT")
+    except BaseException:
+        if con.in_transaction:
+            con.execute("ROLLBACK")
+        raise
+    finally:
+        con.close()
+
+
+@contextmanager
+def atomic_path(path: str) -> t.Iterator[str]:
+    """Temporary path of the same name as ``path`` in a hidden directory
+    next to it, moved to ``path`` when the block succeeds. The directory is
+    not listed as a map and is removed in any case, with the replaced
+    ``path`` if it is a directory."""
+    target = Path(path)
+    tmp_dir = target.with_name(
+        f".{target.name}.{os.getpid()}.{threading.get_ident()}.tmp"
+    )
+    tmp_dir.mkdir()
+    try:
+        tmp_path = tmp_dir / target.name
+        yield str(tmp_path)
+        if target.is_dir():
+            # a directory can only be replaced by a rename if it is empty
+            os.replace(target, tmp_dir / f"{target.name}.old")
+        os.replace(tmp_path, target)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def prepare_layers(
+    layers: t.Dict[str, MegMapLayer], max_workers: int
+) -> t.Iterator[PreparedLayer]:
+    """Prepare the layers in a thread pool, yielded in order as soon as
+    they are ready, while the following ones are still prepared."""
+    with ThreadPoolExecutor(max_workers=max(max_workers, 1)) as executor:
+        futures = [
+            executor.submit(prepare_layer, name, layer)
+            for name, layer in layers.items()
+        ]
+        for future in futures:
+            yield future.result()
@@ -0,0 +1,201 @@
+from __future__ import annotations
+import abc
+import json
+import shutil
+import typing as t
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+import shapely
+
+from megmap_viz.utils.profiler import StageStat
+
+from ..datatypes import MegMapLayer, MegMapLayerType
+from ..utils import get_remark_info
+from .base_builder import BUILD_STAGES_KEY
+from .gpkg_datatypes import MegMapFileInfo, MayLayerMetadata
+
+Bounds = t.Tuple[float, float, float, float]
+
+
+def filter_layer(
+    layer: MegMapLayer,
+    bbox: t.Optional[Bounds] = None,
+    id_column: t.Optional[str] = None,
+    ids: t.Optional[t.Collection[t.Any]] = None,
+) -> MegMapLayer:
+    """Features whose box intersects ``bbox`` and whose ``id_column`` is one
+    of ``ids``, the arguments of `LayerStore.query_map_layer`. The boxes are
+    looked up in the spatial index of the layer, kept with the layer."""
+    if bbox is not None:
+        idxs = layer.sindex.query(shapely.box(*bbox))
+        layer = layer.iloc[np.sort(idxs)]  # type: ignore
+    if id_column is not None and ids is not None:
+        layer = layer[layer[id_column].isin(ids)]
+    return layer
+
+
+class LayerStore(abc.ABC):
+    """The maps built in a directory, one file or directory per map named
+    ``{remark}_{md5}{suffix}``.
+
+    With ``low_memory``, `query_map_layer` reads the features of every
+    query from the map instead of keeping whole layers in memory.
+    """
+
+    suffix: t.ClassVar[str]
+
+    def __init__(self, root_path: str, low_memory: bool = False) -> None:
+        self.root_path = Path(root_path).absolute()
+        self.low_memory = low_memory
+
+    def get_path(self, info: MegMapFileInfo) -> Path:
+        return self.root_path / f"{info.remark}_{info.md5}{self.suffix}"
+
+    def _is_map_path(self, path: Path) -> bool:
+        return path.is_file()
+
+    @abc.abstractmethod
+    def read_dataset_metadata(self, info: MegMapFileInfo) -> t.Dict[str, str]:
+        pass
+
+    @abc.abstractmethod
+    def read_layer(
+        self,
+        info: MegMapFileInfo,
+        layer_name: str,
+        bbox: t.Optional[Bounds] = None,
+        id_column: t.Optional[str] = None,
+        ids: t.Optional[t.Collection[t.Any]] = None,
+    ) -> MegMapLayer:
+        """Read a layer, see `query_map_layer`. Raises if the layer does not
+        exist."""
+
+    @property
+    def all_megmap_file_info(self) -> t.List[MegMapFileInfo]:
+        file_info = []
+        for file_path in self.root_path.iterdir():
+            if file_path.suffix != self.suffix:
+                continue
+            if not self._is_map_path(file_path):
+                continue
+            remark, md5 = file_path.stem.rsplit("_", 1)
+            file_info.append(MegMapFileInfo(remark=remark, md5=md5))
+        return file_info
+
+    def get_previous_version(self, remark: str) -> t.Optional[MegMapFileInfo]:
+        """The latest map built from an earlier version of ``remark``."""
+        remark_info = get_remark_info(remark)
+        if not remark_info.is_true:
+            return None
+
+        candidates: t.List[t.Tuple[t.Tuple, MegMapFileInfo]] = []
+        for file_info in self.all_megmap_file_info:
+            if file_info.remark.rsplit("_", 2)[0] != remark_info.name:
+                continue
+            other_info = get_remark_info(file_info.remark)
+            if not other_info.is_true:
+                continue
+            other_key = (other_info.date, other_info.version)
+            if other_key < (remark_info.date, remark_info.version):
+                candidates.append((other_key, file_info))
+        if not candidates:
+            return None
+        return max(candidates, key=lambda x: x[0])[1]
+
+    def exists(self, info: MegMapFileInfo) -> bool:
+        return self.get_path(info).exists()
+
+    def delete(self, info: MegMapFileInfo) -> None:
+        path = self.get_path(info)
+        if path.is_dir():
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            path.unlink(missing_ok=True)
+
+    @lru_cache()
+    def get_metadata(self, info: MegMapFileInfo) -> MayLayerMetadata:
+        meta = self.read_dataset_metadata(info)
+        apollo_path: str = meta["map_s3_path"]
+        apollo_md5: str = meta["map_md5"]
+        remark: str = meta["map_remark"]
+        available_layers: t.List[str] = json.loads(meta["available_layers"])
+        layer_id_name_map: t.Dict[str, str] = json.loads(
+            meta["layer_id_name_map"]
+        )
+        map_type: str = meta["map_type"]
+        return MayLayerMetadata(
+            map_s3_path=apollo_path,
+            map_md5=apollo_md5,
+            map_remark=remark,
+            available_layers=available_layers,
+            layer_id_name_map=layer_id_name_map,
+            map_type=map_type,
+        )
+
+    def get_build_stages(self, info: MegMapFileInfo) -> t.List[StageStat]:
+        """Stage report of the build of a map, empty for older files."""
+        meta = self.read_dataset_metadata(info)
+        if not meta or BUILD_STAGES_KEY not in meta:
+            return []
+        return json.loads(meta[BUILD_STAGES_KEY])
+
+    @lru_cache()
+    def load_map_layer(
+        self, info: MegMapFileInfo, layer_name: str
+    ) -> t.Optional[MegMapLayer]:
+        try:
+            return self.read_layer(info, layer_name)
+        except Exception:
+            return None
+
+    def query_map_layer(
+        self,
+        info: MegMapFileInfo,
+        layer_name: str,
+        bbox: t.Optional[Bounds] = None,
+        id_column: t.Optional[str] = None,
+        ids: t.Optional[t.Collection[t.Any]] = None,
+    ) -> t.Optional[MegMapLayer]:
+        """The features of a layer whose box intersects ``bbox`` and whose
+        ``id_column`` is one of ``ids``, in the order of the layer. None if
+        the layer does not exist.
+
+        Unless ``low_memory``, the cached layer of `load_map_layer` is
+        filtered.
+        """
+        if self.low_memory:
+            try:
+                return self.read_layer(info, layer_name, bbox, id_column, ids)
+            except Exception:
+                return None
+        layer = self.load_map_layer(info, layer_name)
+        if layer is None:
+            return None
+        return filter_layer(layer, bbox, id_column, ids)
+
+    @lru_cache()
+    def load_all_map_layer(
+        self, info: MegMapFileInfo
+    ) -> t.Dict[MegMapLayerType, MegMapLayer]:
+        layer_datum = {}
+        for layer_type in MegMapLayerType:
+            try:
+                layer_datum[layer_type] = self.load_map_layer(
+                    info, layer_type.name
+                )
+            except Exception:
+                continue
+        return layer_datum
+
+
+def get_layer_store_cls(layer_format: str) -> t.Type[LayerStore]:
+    from .gpkg_db import GPKGDB
+    from .parquet_db import ParquetDB
+
+    layer_store_cls_map: t.Dict[str, t.Type[LayerStore]] = {
+        "gpkg": GPKGDB,
+        "parquet": ParquetDB,
+    }
+    return layer_store_cls_map[layer_format]
@@ -0,0 +1,54 @@
+import typing as t
+from pathlib import Path
+
+from ..datatypes import MegMapLayer
+from . import geoparquet
+from .gpkg_datatypes import MegMapFileInfo
+from .layer_store import Bounds, LayerStore
+
+
+class ParquetDB(LayerStore):
+    """Maps stored as directories of GeoParquet layers, see `geoparquet`.
+
+    Reads of a bbox or of ids are pushed down to the row groups of the
+    layer file, so `query_map_layer` does not load the whole layer even
+    without ``low_memory``.
+    """
+
+    suffix = ".parquet"
+
+    def _is_map_path(self, path: Path) -> bool:
+        return path.is_dir()
+
+    def read_dataset_metadata(self, info: MegMapFileInfo) -> t.Dict[str, str]:
+        return geoparquet.read_dataset_metadata(self.get_path(info))
+
+    def read_layer(
+        self,
+        info: MegMapFileInfo,
+        layer_name: str,
+        bbox: t.Optional[Bounds] = None,
+        id_column: t.Optional[str] = None,
+        ids: t.Optional[t.Collection[t.Any]] = None,
+    ) -> MegMapLayer:
+        return geoparquet.read_layer(
+            geoparquet.get_layer_path(self.get_path(info), layer_name),
+            bbox,
+            id_column,
+            ids,
+        )
+
+    def query_map_layer(
+        self,
+        info: MegMapFileInfo,
+        layer_name: str,
+        bbox: t.Optional[Bounds] = None,
+        id_column: t.Optional[str] = None,
+        ids: t.Optional[t.Collection[t.Any]] = None,
+    ) -> t.Optional[MegMapLayer]:
+        if bbox is None and ids is None and not self.low_memory:
+            return self.load_map_layer(info, layer_name)
+        try:
+            return self.read_layer(info, layer_name, bbox, id_column, ids)
+        except Exception:
+            return None
@@ -3,11 +3,11 @@ from functools import lru_cache
 
 from megmap_viz.megmap_dataset.megmap_gpkg.gpkg_db import MegMapFileInfo
 from megmap_viz.megmap_dataset.megmap import MegMap, PointsType
-from megmap_viz.megmap_dataset.megmap_gpkg.gpkg_db import GPKGDB
+from megmap_viz.megmap_dataset.megmap_gpkg.layer_store import LayerStore
 
 
 class MegMapManager:
-    def __init__(self, gpkg_db: GPKGDB) -> None:
+    def __init__(self, gpkg_db: LayerStore) -> None:
         self.gpkg_db = gpkg_db
 
     @lru_cache()
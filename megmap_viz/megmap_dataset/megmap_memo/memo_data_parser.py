@@ -1,16 +1,31 @@
 import typing as t
 import dataclasses
 import traceback
+from concurrent.futures import Future, ProcessPoolExecutor
 
-from shapely.geometry import Point, LineString, Polygon
+from shapely.geometry import LineString, Polygon
 import numpy as np
+from numpy import typing as npt
 
 from megmap_viz.utils.coord_converter import WGS84
-from megmap_viz.megmap_dataset.utils import simplify_line
+from megmap_viz.megmap_dataset.utils import (
+    get_pool_context,
+    partition_by_cost,
+    simplify_line,
+    simplify_lines,
+)
+from megmap_viz.megmap_dataset.megmap_memo.memo_loader import (
+    MemoNodeColumns,
+    load_memo_json,
+)
 from megmap_viz.datatypes import LogType
 from megmap_viz.utils.datetime_str import get_datetime_str
 
 
+DEFAULT_POLYLINE_STEP = 1.0
+POLYLINE_COEFF_KEYS = ("a0", "a1", "a2", "a3", "b0", "b1", "b2", "b3")
+
+
 class RoadDict(t.TypedDict):
     ins_status: str
     ins_trajectory: str
@@ -86,7 +101,8 @@ class ObjectDict(t.TypedDict):
 class MemoDataDict(t.TypedDict):
     lanes: t.Dict[str, LaneDict]
     lines: t.Dict[str, t.Union[LinePointDict, LinePolylineDict]]
-    nodes: t.Dict[str, NodeDict]
+    # columns when loaded by `load_memo_json`
+    nodes: t.Union[t.Dict[str, NodeDict], MemoNodeColumns]
     roads: t.Dict[str, RoadDict]
     objects: t.Dict[str, ObjectDict]
 
@@ -108,10 +124,8 @@ class MemoLaneResult:
 class MemoLineResult:
     raw_data: t.Union[LinePointDict, LinePolylineDict]
     geometry: LineString
-    sim_geometry: LineString = dataclasses.field(init=False)
-
-    def __post_init__(self) -> None:
-        self.sim_geometry = simplify_line(self.geometry)
+    # simplified in bulk by MemoParser.run, given by the parse cache
+    sim_geometry: LineString = t.cast(LineString, None)
 
 
 @dataclasses.dataclass
@@ -120,6 +134,18 @@ class MemoObjectResult:
     geometry: t.Union[Polygon, LineString]
 
 
+# node id -> row index, wgs84 coordinates of the nodes
+NodeTable = t.Tuple[t.Dict[str, int], npt.NDArray[np.float64]]
+
+
+class PolylineSamples(t.NamedTuple):
+    s: npt.NDArray[np.float64]
+    # equation coefficients of every sample, see POLYLINE_COEFF_KEYS
+    coeffs: npt.NDArray[np.float64]
+    # coordinates of the start and end nodes
+    ends: t.Optional[npt.NDArray[np.float64]]
+
+
 @dataclasses.dataclass
 class MemoParserResult:
     roads: t.Dict[str, MemoRoadResult]
@@ -132,104 +158,146 @@ class MemoParserResult:
 class MemoParser:
     memo_data: MemoDataDict
 
-    def __init__(self, memo_data: MemoDataDict) -> None:
+    def __init__(
+        self,
+        memo_data: MemoDataDict,
+        polyline_step: float = DEFAULT_POLYLINE_STEP,
+        node_table: t.Optional[NodeTable] = None,
+    ) -> None:
         self.memo_data = memo_data
+        # sampling step of the polylines, meters
+        self.polyline_step = polyline_step
 
         self.roads: t.Dict[str, MemoRoadResult] = {}
         self.lanes: t.Dict[str, MemoLaneResult] = {}
         self.lines: t.Dict[str, MemoLineResult] = {}
         self.objects: t.Dict[str, MemoObjectResult] = {}
 
-        self.default_utm_zone = list(self.memo_data["nodes"].values())[0][
-            "zone_id"
-        ]
+        nodes = self.memo_data["nodes"]
+        if isinstance(nodes, MemoNodeColumns):
+            self.default_utm_zone = int(nodes.zone_id[0])
+        else:
+            self.default_utm_zone = next(iter(nodes.values()))["zone_id"]
+        # wgs84 coordinates of all nodes, addressed by `node_index`
+        self.node_index, self.node_coords = (
+            node_table if node_table is not None else self._convert_nodes()
+        )
 
         self.logs = []
 
     def run(self) -> MemoParserResult:
         try:
-            for line_id in self.memo_data["lines"]:
-                try:
-                    self.lines[line_id] = self._parse_line(line_id)
-                except Exception:
-                    self.logs.append(
-                        (
-                            get_datetime_str(),
-                            f"Line: {line_id}\n" f"{traceback.format_exc()}",
-                            "warning",
-                        )
-                    )
+            self.parse_lines(self.memo_data["lines"])
+            self.parse_lanes(self.memo_data["lanes"])
+            self.parse_roads(self.memo_data["roads"])
+            self.parse_objects(self.memo_data["objects"])
+        except Exception:
+            self.logs.append(
+                (
+                    get_datetime_str(),
+                    traceback.format_exc(),
+                    "warning",
+                )
+            )
 
-            for lane_id in self.memo_data["lanes"]:
-                try:
-                    self.lanes[lane_id] = self._parse_lane(lane_id)
-                except Exception:
-                    self.logs.append(
-                        (
-                            get_datetime_str(),
-                            f"Lane: {lane_id}\n" f"{traceback.format_exc()}",
-                            "warning",
-                        )
+        return self.get_result()
+
+    def get_result(self) -> MemoParserResult:
+        return MemoParserResult(
+            self.roads, self.lanes, self.lines, self.objects, self.logs
+        )
+
+    def parse_lines(self, line_ids: t.Iterable[str]) -> None:
+        self._parse_lines(line_ids)
+        self._simplify_lines()
+
+    def parse_lanes(self, lane_ids: t.Iterable[str]) -> None:
+        """Lanes are built from the lines, which have to be parsed."""
+        for lane_id in lane_ids:
+            try:
+                self.lanes[lane_id] = self._parse_lane(lane_id)
+            except Exception:
+                self.logs.append(
+                    (
+                        get_datetime_str(),
+                        f"Lane: {lane_id}\n" f"{traceback.format_exc()}",
+                        "warning",
                     )
+                )
 
-            for road_id in self.memo_data["roads"]:
-                try:
-                    rv = self._parse_road(road_id)
-                except Exception:
-                    self.logs.append(
-                        (
-                            get_datetime_str(),
-                            f"Road: {road_id}\n" f"{traceback.format_exc()}",
-                            "warning",
-                        )
+    def parse_roads(self, road_ids: t.Iterable[str]) -> None:
+        """Roads are built from the lanes and lines, which have to be
+        parsed."""
+        for road_id in road_ids:
+            try:
+                rv = self._parse_road(road_id)
+            except Exception:
+                self.logs.append(
+                    (
+                        get_datetime_str(),
+                        f"Road: {road_id}\n" f"{traceback.format_exc()}",
+                        "warning",
                     )
-                    continue
+                )
+                continue
+            if rv is None:
+                self.logs.append(
+                    (
+                        get_datetime_str(),
+                        f"road {road_id} has no lanes",
+                        "warning",
+                    )
+                )
+                continue
+            self.roads[road_id] = rv
+
+    def parse_objects(self, object_ids: t.Iterable[str]) -> None:
+        for object_id in object_ids:
+            try:
+                rv = self._parse_object(object_id)
+            except Exception:
+                self.logs.append(
+                    (
+                        get_datetime_str(),
+                        f"Object: {object_id}\n" f"{traceback.format_exc()}",
+                        "warning",
+                    )
+                )
+            else:
                 if rv is None:
                     self.logs.append(
                         (
                             get_datetime_str(),
-                            f"road {road_id} has no lanes",
+                            f"Object: {object_id} is not supported yet.",
                             "warning",
                         )
                     )
                     continue
-                self.roads[road_id] = rv
+                self.objects[object_id] = rv
 
-            for object_id in self.memo_data["objects"]:
+    def _simplify_lines(self) -> None:
+        try:
+            sim_geometries = simplify_lines(
+                [line_rv.geometry for line_rv in self.lines.values()]
+            )
+        except Exception:
+            # 逐条重试, 丢弃无法简化的线
+            for line_id, line_rv in list(self.lines.items()):
                 try:
-                    rv = self._parse_object(object_id)
+                    line_rv.sim_geometry = simplify_line(line_rv.geometry)
                 except Exception:
+                    del self.lines[line_id]
                     self.logs.append(
                         (
                             get_datetime_str(),
-                            f"Object: {object_id}\n"
-                            f"{traceback.format_exc()}",
+                            f"Line: {line_id}\n" f"{traceback.format_exc()}",
                             "warning",
                         )
                     )
-                else:
-                    if rv is None:
-                        self.logs.append(
-                            (
-                                get_datetime_str(),
-                                f"Object: {object_id} is not supported yet.",
-                                "warning",
-                            )
-                        )
-                        continue
-                    self.objects[object_id] = rv
-        except Exception:
-            self.logs.append(
-                (
-                    get_datetime_str(),
-                    traceback.format_exc(),
-                    "warning",
-                )
-            )
+            return
 
-        return MemoParserResult(
-            self.roads, self.lanes, self.lines, self.objects, self.logs
-        )
+        for line_rv, sim_geometry in zip(self.lines.values(), sim_geometries):
+            line_rv.sim_geometry = sim_geometry
 
     def _parse_road(self, road_id: str) -> t.Optional[MemoRoadResult]:
         road_dat = self.memo_data["roads"][road_id]
@@ -310,77 +378,418 @@ class MemoParser:
         )
         return MemoLaneResult(lane_dat, polygon_geom, centerline_geom)
 
-    def _parse_line(self, line_id: str) -> MemoLineResult:
-        line = self.memo_data["lines"][line_id]
-
-        if line.get("equalization"):
-            line = t.cast(LinePolylineDict, line)
-            polyline_geom = self._calc_polyline(line)
-        else:
-            line = t.cast(LinePointDict, line)
-            polyline_geom = t.cast(
-                LineString,
-                LineString(
-                    [self._get_point(node_id) for node_id in line["nodes"]]
-                ),
-            )
-
-        return MemoLineResult(line, polyline_geom)
+    def _parse_lines(self, line_ids: t.Iterable[str]) -> None:
+        polyline_samples: t.Dict[str, PolylineSamples] = {}
+        for line_id in line_ids:
+            line = self.memo_data["lines"][line_id]
+            try:
+                if line.get("equalization"):
+                    polyline_samples[line_id] = self._sample_polyline(
+                        t.cast(LinePolylineDict, line)
+                    )
+                    # evaluated in bulk by `_calc_polylines`
+                    geometry = t.cast(LineString, None)
+                else:
+                    line = t.cast(LinePointDict, line)
+                    geometry = LineString(self._get_coords(line["nodes"]))
+            except Exception:
+                self._add_line_log(line_id)
+                continue
+            self.lines[line_id] = MemoLineResult(line, geometry)
+        self._calc_polylines(polyline_samples)
 
     def _parse_object(self, object_id: str) -> t.Optional[MemoObjectResult]:
         object_dict = self.memo_data["objects"][object_id]
         if object_dict["type"] == "stopline":
             sn_id, en_id = object_dict["outline"]
-            sn, en = self._get_point(sn_id), self._get_point(en_id)
-            line_obj = LineString([sn, en])
+            line_obj = LineString(self._get_coords([sn_id, en_id]))
             return MemoObjectResult(object_dict, line_obj)
         return None
 
-    def _get_polyline_func(
-        self, equation: EqualizationDict
-    ) -> t.Callable[[float], Point]:
-        def func(s: float) -> Point:
-            utm_x = (
-                equation["a3"]
-                + equation["a2"] * s
-                + equation["a1"] * s**2
-                + equation["a0"] * s**3
+    def _sample_polyline(self, polyline: LinePolylineDict) -> PolylineSamples:
+        if "equalization" not in polyline:
+            raise ValueError("polyline must have equalization")
+        equations = polyline["equalization"]
+        s = [
+            np.arange(equation["smin"], equation["smax"], self.polyline_step)
+            for equation in equations
+        ]
+        coeffs = np.array(
+            [
+                [equation[k] for k in POLYLINE_COEFF_KEYS]
+                for equation in equations
+            ],
+            dtype=np.float64,
+        ).reshape(-1, len(POLYLINE_COEFF_KEYS))
+
+        ends = None
+        if "start" in polyline and "end" in polyline:
+            ends = self._get_coords([polyline["start"], polyline["end"]])
+        return PolylineSamples(
+            s=np.concatenate(s) if s else np.empty(0),
+            coeffs=np.repeat(coeffs, [len(x) for x in s], axis=0),
+            ends=ends,
+        )
+
+    def _calc_polylines(
+        self, polyline_samples: t.Dict[str, PolylineSamples]
+    ) -> None:
+        """Evaluate the cubic equations of all polylines at once, and
+        project all sample points with one utm conversion."""
+        if not polyline_samples:
+            return
+        samples = list(polyline_samples.values())
+        offsets = np.zeros(len(samples) + 1, dtype=np.intp)
+        np.cumsum([len(x.s) for x in samples], out=offsets[1:])
+        try:
+            coords = self._eval_polyline(
+                np.concatenate([x.s for x in samples]),
+                np.concatenate([x.coeffs for x in samples]),
             )
-            utm_y = (
-                equation["b3"]
-                + equation["b2"] * s
-                + equation["b1"] * s**2
-                + equation["b0"] * s**3
+        except Exception:
+            coords = None
+
+        for (line_id, x), start, end in zip(
+            polyline_samples.items(), offsets[:-1], offsets[1:]
+        ):
+            try:
+                if coords is None:
+                    # 批量转换失败, 逐条计算以定位出错的线
+                    line_coords = self._eval_polyline(x.s, x.coeffs)
+                else:
+                    line_coords = coords[start:end]
+                if x.ends is not None:
+                    line_coords = np.concatenate(
+                        [x.ends[:1], line_coords, x.ends[1:]]
+                    )
+                self.lines[line_id].geometry = LineString(line_coords)
+            except Exception:
+                del self.lines[line_id]
+                self._add_line_log(line_id)
+
+    def _eval_polyline(
+        self, s: npt.NDArray[np.float64], coeffs: npt.NDArray[np.float64]
+    ) -> npt.NDArray[np.float64]:
+        if not len(s):
+            return np.empty((0, 2), dtype=np.float64)
+        a0, a1, a2, a3, b0, b1, b2, b3 = coeffs.T
+        utm_x = a3 + a2 * s + a1 * s**2 + a0 * s**3
+        utm_y = b3 + b2 * s + b1 * s**2 + b0 * s**3
+        lon, lat = WGS84.from_utm(
+            utm_x, utm_y, self.default_utm_zone, northern=True
+        )
+        return np.stack([lon, lat], axis=1)
+
+    def _add_line_log(self, line_id: str) -> None:
+        self.logs.append(
+            (
+                get_datetime_str(),
+                f"Line: {line_id}\n" f"{traceback.format_exc()}",
+                "warning",
             )
-            wgs84_x, wgs84_y = WGS84.from_utm(
-                utm_x, utm_y, self.default_utm_zone, northern=True
+        )
+
+    def _convert_nodes(self) -> NodeTable:
+        """Convert all nodes to wgs84 at once, one call per utm zone."""
+        nodes = self.memo_data["nodes"]
+        if not isinstance(nodes, MemoNodeColumns):
+            nodes = MemoNodeColumns.from_dict(nodes)
+        node_index = {node_id: idx for idx, node_id in enumerate(nodes.ids)}
+
+        node_coords = np.empty((len(nodes.ids), 2), dtype=np.float64)
+        for zone in np.unique(nodes.zone_id).tolist():
+            mask = nodes.zone_id == zone
+            lon, lat = WGS84.from_utm(
+                nodes.utm_x[mask], nodes.utm_y[mask], zone, northern=True
             )
-            return Point(wgs84_x, wgs84_y)
+            node_coords[mask, 0] = lon
+            node_coords[mask, 1] = lat
+        return node_index, node_coords
+
+    def _get_coords(
+        self, node_ids: t.Sequence[str]
+    ) -> npt.NDArray[np.float64]:
+        idxs = np.fromiter(
+            (self.node_index[node_id] for node_id in node_ids),
+            dtype=np.intp,
+            count=len(node_ids),
+        )
+        return self.node_coords[idxs]
 
-        return func
 
-    def _calc_polyline(
-        self, polyline: LinePolylineDict, step: float = 1.0
-    ) -> LineString:
-        if "equalization" not in polyline:
-            raise ValueError("polyline must have equalization")
-        middle_points: t.List[Point] = []
-        for equation in polyline["equalization"]:
-            polyline_func = self._get_polyline_func(equation)
-            for s in np.arange(equation["smin"], equation["smax"], step):
-                middle_points.append(polyline_func(s))
-        if "start" in polyline and "end" in polyline:
-            start_point = self._get_point(polyline["start"])
-            end_point = self._get_point(polyline["end"])
-            return LineString([start_point, *middle_points, end_point])
-        else:
-            return LineString(middle_points)
-
-    def _get_point(self, node_id: str) -> Point:
-        utm_x = self.memo_data["nodes"][node_id]["utm_x"]
-        utm_y = self.memo_data["nodes"][node_id]["utm_y"]
-        utm_zone = self.memo_data["nodes"][node_id]["zone_id"]
-        wgs84_x, wgs84_y = WGS84.from_utm(
-            utm_x, utm_y, utm_zone, northern=True
+class MemoLineTask(t.NamedTuple):
+    line_ids: t.List[str]
+    cost: float
+
+
+class MemoRoadTask(t.NamedTuple):
+    road_ids: t.List[str]
+    lane_ids: t.List[str]
+    object_ids: t.List[str]
+    # geometries of the lines the lanes and roads are built from
+    line_geometries: t.Dict[str, LineString]
+    cost: float
+
+
+class MemoTaskResult(t.NamedTuple):
+    """Geometries parsed by a worker, the raw data is taken from the memo
+    data of the parent instead of being sent back."""
+
+    lines: t.Dict[str, t.Tuple[LineString, LineString]]
+    lanes: t.Dict[str, t.Tuple[Polygon, LineString]]
+    roads: t.Dict[str, Polygon]
+    objects: t.Dict[str, t.Union[Polygon, LineString]]
+    logs: t.List[LogType]
+
+    @classmethod
+    def from_parser(cls, parser: MemoParser) -> "MemoTaskResult":
+        return cls(
+            lines={
+                k: (v.geometry, v.sim_geometry)
+                for k, v in parser.lines.items()
+            },
+            lanes={
+                k: (v.polygon, v.centerline) for k, v in parser.lanes.items()
+            },
+            roads={k: v.polygon for k, v in parser.roads.items()},
+            objects={k: v.geometry for k, v in parser.objects.items()},
+            logs=parser.logs,
+        )
+
+
+# arguments of the MemoParser of the worker processes
+_memo_worker_args: t.Optional[t.Tuple[MemoDataDict, float, NodeTable]] = None
+
+
+def _init_memo_worker(
+    memo_source: t.Union[MemoDataDict, str],
+    polyline_step: float,
+    node_table: NodeTable,
+) -> None:
+    """Set up a worker process, ``memo_source`` is either the memo data or
+    the path of the file to load it from."""
+    global _memo_worker_args
+    if isinstance(memo_source, str):
+        rv = load_memo_json(memo_source)
+        if rv is None:
+            raise FileNotFoundError(memo_source)
+        memo_source = rv[0]
+    _memo_worker_args = (memo_source, polyline_step, node_table)
+
+
+def run_memo_line_task(task: MemoLineTask) -> MemoTaskResult:
+    assert _memo_worker_args is not None, "not a memo worker process"
+    parser = MemoParser(*_memo_worker_args)
+    parser.parse_lines(task.line_ids)
+    return MemoTaskResult.from_parser(parser)
+
+
+def run_memo_road_task(task: MemoRoadTask) -> MemoTaskResult:
+    assert _memo_worker_args is not None, "not a memo worker process"
+    parser = MemoParser(*_memo_worker_args)
+    parser.lines = {
+        line_id: MemoLineResult(parser.memo_data["lines"][line_id], geometry)
+        for line_id, geometry in task.line_geometries.items()
+    }
+    parser.parse_lanes(task.lane_ids)
+    parser.parse_roads(task.road_ids)
+    parser.parse_objects(task.object_ids)
+    # the lines are known to the parent already
+    parser.lines = {}
+    return MemoTaskResult.from_parser(parser)
+
+
+class MultiMemoParser:
+    """Parse a memo map in a process pool.
+
+    The lines are parsed first, split into chunks of similar point numbers.
+    Lanes and roads are built from the lines, so they are parsed in a
+    second round, split by roads. Every chunk gets the lanes of its roads
+    and the geometries of their lines. The objects are parsed along with
+    the lanes which belong to no road.
+
+    The node table is converted once in the parent and sent to the
+    workers. With ``memo_path``, the local file ``memo_data`` was loaded
+    from, the workers load the memo data themselves instead of receiving
+    it pickled. The results are merged in the order of the memo data, so
+    they equal those of `MemoParser`.
+    """
+
+    def __init__(
+        self,
+        memo_data: MemoDataDict,
+        max_workers: int = 4,
+        chunks_per_worker: int = 4,
+        polyline_step: float = DEFAULT_POLYLINE_STEP,
+        memo_path: t.Optional[str] = None,
+    ) -> None:
+        self.memo_data = memo_data
+        self.max_workers = max(1, max_workers)
+        self.chunks_per_worker = max(1, chunks_per_worker)
+        # merges the results of the workers
+        self.parser = MemoParser(memo_data, polyline_step)
+        self._proc_pool = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=get_pool_context(),
+            initializer=_init_memo_worker,
+            initargs=(
+                memo_path if memo_path is not None else memo_data,
+                polyline_step,
+                (self.parser.node_index, self.parser.node_coords),
+            ),
         )
-        return Point(wgs84_x, wgs84_y)
+
+    @property
+    def chunk_num(self) -> int:
+        return self.max_workers * self.chunks_per_worker
+
+    def get_line_cost(self, line_id: str) -> float:
+        line = self.memo_data["lines"][line_id]
+        try:
+            if line.get("equalization"):
+                line = t.cast(LinePolylineDict, line)
+                return 2 + sum(
+                    (equation["smax"] - equation["smin"])
+                    / self.parser.polyline_step
+                    for equation in line["equalization"]
+                )
+            return len(t.cast(LinePointDict, line)["nodes"])
+        except Exception:
+            # broken lines fail fast
+            return 1
+
+    def get_line_tasks(self) -> t.List[MemoLineTask]:
+        line_ids = list(self.memo_data["lines"])
+        costs = [self.get_line_cost(line_id) for line_id in line_ids]
+        return [
+            MemoLineTask(line_ids[start:end], sum(costs[start:end]))
+            for start, end in partition_by_cost(costs, self.chunk_num)
+        ]
+
+    def get_road_tasks(self) -> t.List[MemoRoadTask]:
+        lanes = self.memo_data["lanes"]
+        road_ids = list(self.memo_data["roads"])
+        road_lane_ids = [
+            [
+                lane_id
+                for lane_id in self.memo_data["roads"][road_id]["lane_ids"]
+                if lane_id in lanes
+            ]
+            for road_id in road_ids
+        ]
+
+        chunks: t.List[t.Tuple[t.List[str], t.List[str], t.List[str]]] = []
+        for start, end in partition_by_cost(
+            [len(x) + 1 for x in road_lane_ids], self.chunk_num
+        ):
+            chunks.append(
+                (
+                    road_ids[start:end],
+                    [x for ids in road_lane_ids[start:end] for x in ids],
+                    [],
+                )
+            )
+        road_lanes = {x for ids in road_lane_ids for x in ids}
+        other_lane_ids = [x for x in lanes if x not in road_lanes]
+        if other_lane_ids or self.memo_data["objects"]:
+            chunks.append(
+                ([], other_lane_ids, list(self.memo_data["objects"]))
+            )
+
+        tasks: t.List[MemoRoadTask] = []
+        for chunk_road_ids, chunk_lane_ids, object_ids in chunks:
+            line_geometries: t.Dict[str, LineString] = {}
+            for lane_id in chunk_lane_ids:
+                lane = lanes[lane_id]
+                for key in ("left_border", "right_border", "centerline"):
+                    line_rv = self.parser.lines.get(lane.get(key))
+                    if line_rv is not None:
+                        line_geometries[lane[key]] = line_rv.geometry
+            tasks.append(
+                MemoRoadTask(
+                    road_ids=chunk_road_ids,
+                    lane_ids=chunk_lane_ids,
+                    object_ids=object_ids,
+                    line_geometries=line_geometries,
+                    cost=len(chunk_lane_ids) + len(object_ids),
+                )
+            )
+        return tasks
+
+    def run(self) -> MemoParserResult:
+        try:
+            line_results = self._run_tasks(
+                run_memo_line_task, self.get_line_tasks()
+            )
+            lines: t.Dict[str, t.Tuple[LineString, LineString]] = {}
+            for rv in line_results:
+                lines.update(rv.lines)
+                self.parser.logs.extend(rv.logs)
+            self.parser.lines = {
+                line_id: MemoLineResult(line, *lines[line_id])
+                for line_id, line in self.memo_data["lines"].items()
+                if line_id in lines
+            }
+
+            road_results = self._run_tasks(
+                run_memo_road_task, self.get_road_tasks()
+            )
+            self._merge_road_results(road_results)
+        finally:
+            self._proc_pool.shutdown(wait=False)
+
+        return self.parser.get_result()
+
+    def _merge_road_results(self, results: t.List[MemoTaskResult]) -> None:
+        lanes: t.Dict[str, t.Tuple[Polygon, LineString]] = {}
+        roads: t.Dict[str, Polygon] = {}
+        objects: t.Dict[str, t.Union[Polygon, LineString]] = {}
+        for rv in results:
+            lanes.update(rv.lanes)
+            roads.update(rv.roads)
+            objects.update(rv.objects)
+            self.parser.logs.extend(rv.logs)
+
+        self.parser.lanes = {
+            k: MemoLaneResult(v, *lanes[k])
+            for k, v in self.memo_data["lanes"].items()
+            if k in lanes
+        }
+        self.parser.roads = {
+            k: MemoRoadResult(v, roads[k])
+            for k, v in self.memo_data["roads"].items()
+            if k in roads
+        }
+        self.parser.objects = {
+            k: MemoObjectResult(v, objects[k])
+            for k, v in self.memo_data["objects"].items()
+            if k in objects
+        }
+
+    def _run_tasks(
+        self,
+        func: t.Callable[[t.Any], MemoTaskResult],
+        tasks: t.Sequence[t.Union[MemoLineTask, MemoRoadTask]],
+    ) -> t.List[MemoTaskResult]:
+        """Run the tasks, the most expensive first, and return the results
+        in the order of the tasks."""
+        futures: t.Dict[int, Future] = {}
+        for idx in sorted(
+            range(len(tasks)), key=lambda x: tasks[x].cost, reverse=True
+        ):
+            futures[idx] = self._proc_pool.submit(func, tasks[idx])
+
+        results: t.List[MemoTaskResult] = []
+        for idx in range(len(tasks)):
+            try:
+                results.append(futures[idx].result())
+            except Exception:
+                self.parser.logs.append(
+                    (
+                        get_datetime_str(),
+                        f"Memo parser task {idx} failed\n"
+                        f"{traceback.format_exc()}",
+                        "warning",
+                    )
+                )
+        return results
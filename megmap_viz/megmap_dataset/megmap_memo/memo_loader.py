@@ -0,0 +1,304 @@
+"""Streaming loader of memo map json files.
+
+A memo file is a json object of sections (``nodes``, ``lines``, ``lanes``,
+...), each one an object of elements keyed by their id. The file is read in
+chunks and decoded one element at a time, the md5 of the file is updated
+with every chunk, so neither the raw bytes nor the decoded text of the
+whole file are held in memory.
+
+The ``nodes`` section, by far the largest one, is decoded straight into
+typed numpy columns instead of one dict per node. The elements of the other
+sections stay dicts, but their keys and string values (ids, types, colors)
+are shared between all elements, e.g. a node id referenced by a line is the
+same string object as the id of the node column.
+"""
+from __future__ import annotations
+import codecs
+import hashlib
+import json
+import re
+import typing as t
+from array import array
+
+import numpy as np
+from numpy import typing as npt
+import refile
+from megfile import SmartPath
+
+from megmap_viz.utils.file_op import smart_open_source
+
+if t.TYPE_CHECKING:
+    from .memo_data_parser import MemoDataDict, NodeDict
+
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+# sections whose elements are kept as dicts
+ELEMENT_SECTIONS = ("lanes", "lines", "roads", "objects")
+# delimiter, key and colon in front of a value of an object
+ITEM_PREFIX = re.compile(
+    r'[ \t\n\r]*(,?)[ \t\n\r]*"((?:[^"\\]|\\.)*)"[ \t\n\r]*:[ \t\n\r]*',
+    re.S,
+)
+# longest unmatched text in front of an item before it is a syntax error
+MAX_ITEM_PREFIX = 64 * 1024
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+# chars a number may go on with
+NUMBER_TAIL = re.compile(r"[0-9.eE+-]*")
+# chars which can follow a complete value
+VALUE_ENDS = frozenset(",}] \t\n\r")
+
+
+class MemoNodeColumns(t.NamedTuple):
+    """The nodes of a memo map as columns, row ``i`` is the node ``ids[i]``."""
+
+    ids: t.List[str]
+    utm_x: npt.NDArray[np.float64]
+    utm_y: npt.NDArray[np.float64]
+    utm_z: npt.NDArray[np.float64]
+    zone_id: npt.NDArray[np.int32]
+
+    @classmethod
+    def from_dict(cls, nodes: t.Dict[str, NodeDict]) -> MemoNodeColumns:
+        return cls(
+            ids=list(nodes),
+            utm_x=np.fromiter(
+                (node["utm_x"] for node in nodes.values()),
+                dtype=np.float64,
+                count=len(nodes),
+            ),
+            utm_y=np.fromiter(
+                (node["utm_y"] for node in nodes.values()),
+                dtype=np.float64,
+                count=len(nodes),
+            ),
+            utm_z=np.fromiter(
+                (node["utm_z"] for node in nodes.values()),
+                dtype=np.float64,
+                count=len(nodes),
+            ),
+            zone_id=np.fromiter(
+                (node["zone_id"] for node in nodes.values()),
+                dtype=np.int32,
+                count=len(nodes),
+            ),
+        )
+
+
+class _JSONStream:
+    """Text buffer over a binary json stream, refilled on demand.
+
+    Values are decoded by `json.JSONDecoder.raw_decode`, the stream only
+    splits the document into them.
+    """
+
+    def __init__(self, fobj: t.IO[bytes], md5: t.Any, chunk_size: int) -> None:
+        self.fobj = fobj
+        self.md5 = md5
+        self.chunk_size = chunk_size
+        self.text_decoder = codecs.getincrementaldecoder("utf-8")()
+        self.json_decoder = json.JSONDecoder()
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        # shared strings of the decoded document
+        self.strings: t.Dict[str, str] = {}
+
+    def share(self, s: str) -> str:
+        return self.strings.setdefault(s, s)
+
+    def _fill(self) -> None:
+        if self.eof:
+            raise json.JSONDecodeError(
+                "Unexpected end of data", self.buf, len(self.buf)
+            )
+        chunk = self.fobj.read(self.chunk_size)
+        self.md5.update(chunk)
+        self.eof = not chunk
+        self.buf = self.buf[self.pos :] + self.text_decoder.decode(
+            chunk, final=self.eof
+        )
+        self.pos = 0
+
+    def peek(self) -> str:
+        """Skip the whitespaces, the next char or "" at the end of data."""
+        while True:
+            self.pos = WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf) or self.eof:
+                return self.buf[self.pos : self.pos + 1]
+            self._fill()
+
+    def expect(self, char: str) -> None:
+        if self.peek() != char:
+            raise json.JSONDecodeError(
+                f"Expecting {char!r}", self.buf, self.pos
+            )
+        self.pos += 1
+
+    def is_cut(self, end: int) -> bool:
+        """Whether a value decoded up to ``end`` may go on in the next
+        chunk, e.g. the number "1." of "1.5"."""
+        if self.eof:
+            return False
+        if end < len(self.buf) and self.buf[end] in VALUE_ENDS:
+            return False
+        return NUMBER_TAIL.match(self.buf, end).end() == len(self.buf)
+
+    def read_value(self) -> t.Any:
+        self.peek()
+        while True:
+            try:
+                value, end = self.json_decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            else:
+                if not self.is_cut(end):
+                    self.pos = end
+                    return value
+            self._fill()
+
+    def read_key(self) -> str:
+        if self.peek() != '"':
+            raise json.JSONDecodeError(
+                "Expecting property name enclosed in double quotes",
+                self.buf,
+                self.pos,
+            )
+        key = self.read_value()
+        self.expect(":")
+        return self.share(key)
+
+    def iter_object(self) -> t.Iterator[str]:
+        """Yield the keys of an object, the caller reads every value."""
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            yield self.read_key()
+            char = self.peek()
+            if char not in (",", "}"):
+                raise json.JSONDecodeError(
+                    "Expecting ',' delimiter", self.buf, self.pos
+                )
+            self.pos += 1
+            if char == "}":
+                return
+
+    def iter_items(self) -> t.Iterator[t.Tuple[str, t.Any]]:
+        """Yield the items of an object, the fast path of `iter_object` for
+        the many small elements of a section."""
+        self.expect("{")
+        raw_decode = self.json_decoder.raw_decode
+        share = self.strings.setdefault
+        first = True
+        while True:
+            match = ITEM_PREFIX.match(self.buf, self.pos)
+            if match is None:
+                if self.peek() == "}":
+                    self.pos += 1
+                    return
+                if len(self.buf) - self.pos > MAX_ITEM_PREFIX:
+                    raise json.JSONDecodeError(
+                        "Expecting property name", self.buf, self.pos
+                    )
+                # the item is split by the end of the buffer
+                self._fill()
+                continue
+            comma, key = match.groups()
+            if first == bool(comma):
+                raise json.JSONDecodeError(
+                    "Expecting ',' delimiter", self.buf, self.pos
+                )
+            try:
+                value, end = raw_decode(self.buf, match.end())
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+                self._fill()
+                continue
+            if self.is_cut(end):
+                self._fill()
+                continue
+            self.pos = end
+            if "\\" in key:
+                key = json.loads(f'"{key}"')
+            first = False
+            yield share(key, key), value
+
+
+def _read_nodes(stream: _JSONStream) -> MemoNodeColumns:
+    ids: t.List[str] = []
+    utm_x, utm_y, utm_z = array("d"), array("d"), array("d")
+    zone_id = array("i")
+    append_x, append_y, append_z = utm_x.append, utm_y.append, utm_z.append
+    append_zone, append_id = zone_id.append, ids.append
+    for node_id, node in stream.iter_items():
+        append_id(node_id)
+        append_x(node["utm_x"])
+        append_y(node["utm_y"])
+        append_z(node["utm_z"])
+        append_zone(node["zone_id"])
+    return MemoNodeColumns(
+        ids,
+        np.frombuffer(utm_x, dtype=np.float64),
+        np.frombuffer(utm_y, dtype=np.float64),
+        np.frombuffer(utm_z, dtype=np.float64),
+        np.frombuffer(zone_id, dtype=np.int32),
+    )
+
+
+def _share_element(
+    stream: _JSONStream, element: t.Dict[str, t.Any]
+) -> t.Dict[str, t.Any]:
+    share = stream.share
+    rv = {}
+    for key, value in element.items():
+        if isinstance(value, str):
+            value = share(value)
+        elif value and isinstance(value, list) and isinstance(value[0], str):
+            value = [share(v) for v in value]
+        rv[share(key)] = value
+    return rv
+
+
+def load_memo_stream(
+    fobj: t.IO[bytes], chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> t.Tuple[MemoDataDict, str]:
+    """Decode a memo map from a binary stream.
+
+    Args:
+        fobj (t.IO[bytes]): binary file-like object of the memo json
+        chunk_size (int): bytes read at a time
+
+    Returns:
+        t.Tuple[MemoDataDict, str]: memo data and md5 of the stream
+    """
+    md5 = hashlib.md5()
+    stream = _JSONStream(fobj, md5, chunk_size)
+    memo_data: t.Dict[str, t.Any] = {}
+    for section in stream.iter_object():
+        if section == "nodes":
+            memo_data[section] = _read_nodes(stream)
+        elif section in ELEMENT_SECTIONS:
+            memo_data[section] = {
+                element_id: _share_element(stream, element)
+                for element_id, element in stream.iter_items()
+            }
+        else:
+            memo_data[section] = stream.read_value()
+    if stream.peek():
+        raise json.JSONDecodeError("Extra data", stream.buf, stream.pos)
+    return t.cast("MemoDataDict", memo_data), md5.hexdigest()
+
+
+def load_memo_json(
+    json_path: str, chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> t.Optional[t.Tuple[MemoDataDict, str]]:
+    """`load_memo_stream` of a local or s3 memo json file, None if the file
+    does not exist."""
+    if not refile.smart_exists(SmartPath(json_path)):
+        return None
+
+    with smart_open_source(json_path) as file:
+        return load_memo_stream(file, chunk_size)
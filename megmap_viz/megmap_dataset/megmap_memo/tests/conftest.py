@@ -1,4 +1,5 @@
 import json
+import typing as t
 from pathlib import Path
 
 import pytest
@@ -6,6 +7,132 @@ import pytest
 
 from megmap_viz.megmap_dataset.megmap_memo.memo_data_parser import MemoDataDict
 
+UTM_ZONE = 51
+LANE_WIDTH = 3.5
+
+
+def make_memo_data(
+    road_num: int = 4, lane_num: int = 2, point_num: int = 10
+) -> MemoDataDict:
+    """Build a small memo map of parallel roads.
+
+    Lane borders are point lines, the centerlines and the ``ins`` trajectory
+    of every road are cubic polylines.
+    """
+    memo_data: t.Dict[str, t.Dict[str, t.Any]] = {
+        "lanes": {},
+        "lines": {},
+        "nodes": {},
+        "roads": {},
+        "objects": {},
+    }
+    nodes, lines = memo_data["nodes"], memo_data["lines"]
+
+    def add_node(x: float, y: float) -> str:
+        node_id = str(len(nodes))
+        nodes[node_id] = {
+            "utm_x": x,
+            "utm_y": y,
+            "utm_z": 0.0,
+            "zone_id": UTM_ZONE,
+        }
+        return node_id
+
+    def add_polyline(line_id: str, x: float, y: float, length: float) -> None:
+        lines[line_id] = {
+            "border_color": "white",
+            "border_type": "ins" if line_id.endswith("ins") else "virtual",
+            "conf": 1.0,
+            "equalization": [
+                {
+                    # x = a3 + a2 s + a1 s^2 + a0 s^3, y likewise
+                    "a0": 0.0,
+                    "a1": 1e-4,
+                    "a2": 1.0,
+                    "a3": x,
+                    "b0": 1e-6,
+                    "b1": 0.0,
+                    "b2": 0.0,
+                    "b3": y,
+                    "c0": 0.0,
+                    "c1": 0.0,
+                    "c2": 0.0,
+                    "c3": 0.0,
+                    "smax": length,
+                    "smin": 0.0,
+                }
+            ],
+            "start": add_node(x, y),
+            "end": add_node(x + length, y),
+            "length": length,
+        }
+
+    length = float(point_num - 1) * 5
+    for road_idx in range(road_num):
+        road_id = f"road_{road_idx}"
+        x0, y0 = 350000.0 + road_idx * 100, 3350000.0 + road_idx * 50
+        border_ids = []
+        for border_idx in range(lane_num + 1):
+            border_id = f"{road_id}_border_{border_idx}"
+            y = y0 - border_idx * LANE_WIDTH
+            lines[border_id] = {
+                "border_color": "white",
+                "border_type": "solid",
+                "conf": 1.0,
+                "nodes": [
+                    add_node(x0 + i * 5, y + (i % 2) * 0.1)
+                    for i in range(point_num)
+                ],
+                "length": length,
+            }
+            border_ids.append(border_id)
+        add_polyline(f"{road_id}_ins", x0, y0 + 1, length)
+
+        lane_ids = []
+        for lane_idx in range(lane_num):
+            lane_id = f"{road_id}_lane_{lane_idx}"
+            centerline_id = f"{road_id}_center_{lane_idx}"
+            add_polyline(
+                centerline_id,
+                x0,
+                y0 - (lane_idx + 0.5) * LANE_WIDTH,
+                length,
+            )
+            memo_data["lanes"][lane_id] = {
+                "centerline": centerline_id,
+                "lane_type": "normal",
+                "lane_type_conf": 1.0,
+                "left_border": border_ids[lane_idx],
+                "max_speed": 60,
+                "min_speed": 0,
+                "overlaps": [],
+                "pres": [],
+                "right_border": border_ids[lane_idx + 1],
+                "road_id": road_id,
+                "sucs": [],
+                "turn_type": "straight",
+            }
+            lane_ids.append(lane_id)
+
+        memo_data["roads"][road_id] = {
+            "ins_status": "ok",
+            "ins_trajectory": f"{road_id}_ins",
+            "lane_ids": lane_ids,
+            "lane_num": lane_num,
+            "pres": [],
+        }
+        memo_data["objects"][f"{road_id}_stopline"] = {
+            "outline": [
+                add_node(x0 + length, y0),
+                add_node(x0 + length, y0 - lane_num * LANE_WIDTH),
+            ],
+            "overlaps": [],
+            "self_id": f"{road_id}_stopline",
+            "type": "stopline",
+        }
+
+    return t.cast(MemoDataDict, memo_data)
+
 
 @pytest.fixture
 def test_memo_data() -> MemoDataDict:
@@ -15,3 +142,8 @@ def test_memo_data() -> MemoDataDict:
         memo_data: MemoDataDict = json.load(f)
 
     return memo_data
+
+
+@pytest.fixture
+def synthetic_memo_data() -> MemoDataDict:
+    return make_memo_data()
@@ -1,9 +1,196 @@
+import json
+from pathlib import Path
+
+import numpy as np
+
+from megmap_viz.megmap_dataset.megmap_memo.memo_loader import load_memo_json
 from megmap_viz.megmap_dataset.megmap_memo.memo_data_parser import (
     MemoParser,
     MemoDataDict,
+    MultiMemoParser,
 )
+from megmap_viz.megmap_dataset.megmap_gpkg import MemoBuilderContext
+from megmap_viz.megmap_dataset.utils import simplify_line
+from megmap_viz.utils.coord_converter import WGS84
 
 
 def test_memo_parser(test_memo_data: MemoDataDict) -> None:
     memo_parser = MemoParser(test_memo_data)
     rv = memo_parser.run()
+
+
+def test_memo_parser_simplify_lines(
+    synthetic_memo_data: MemoDataDict,
+) -> None:
+    rv = MemoParser(synthetic_memo_data).run()
+    assert len(rv.lines) == len(synthetic_memo_data["lines"])
+    assert len(rv.lanes) == 8 and len(rv.roads) == 4
+    for line_rv in rv.lines.values():
+        assert line_rv.sim_geometry.equals_exact(
+            simplify_line(line_rv.geometry), 0
+        )
+    # the zigzag of the borders is within the 0.5 m tolerance
+    border = rv.lines["road_0_border_0"]
+    assert len(border.sim_geometry.coords) == 2
+
+
+def test_memo_parser_node_table(synthetic_memo_data: MemoDataDict) -> None:
+    nodes = synthetic_memo_data["nodes"]
+    # a node in another utm zone
+    nodes["other_zone"] = {
+        "utm_x": 350000.0,
+        "utm_y": 3450000.0,
+        "utm_z": 0.0,
+        "zone_id": 50,
+    }
+    memo_parser = MemoParser(synthetic_memo_data)
+    assert memo_parser.node_coords.shape == (len(nodes), 2)
+    for node_id, node in nodes.items():
+        lon, lat = WGS84.from_utm(
+            node["utm_x"], node["utm_y"], node["zone_id"], northern=True
+        )
+        np.testing.assert_allclose(
+            memo_parser.node_coords[memo_parser.node_index[node_id]],
+            (lon, lat),
+            rtol=0,
+            atol=1e-9,
+        )
+
+    rv = memo_parser.run()
+    for line_id, line in synthetic_memo_data["lines"].items():
+        if "nodes" not in line:
+            continue
+        np.testing.assert_array_equal(
+            rv.lines[line_id].geometry.coords,
+            memo_parser.node_coords[
+                [memo_parser.node_index[node_id] for node_id in line["nodes"]]
+            ],
+        )
+    assert len(rv.objects) == 4
+
+
+def test_memo_parser_polyline_step(synthetic_memo_data: MemoDataDict) -> None:
+    lines = synthetic_memo_data["lines"]
+    ins = lines["road_0_ins"]
+    # a second equation segment
+    ins["equalization"].append({**ins["equalization"][0], "smin": 45.0})
+    ins["equalization"][-1]["smax"] = 50.0
+    # start node is missing, the line is dropped
+    lines["broken"] = {**lines["road_1_ins"], "start": "missing"}
+
+    rv = MemoParser(synthetic_memo_data, polyline_step=0.5).run()
+    assert "broken" not in rv.lines
+    assert any("Line: broken" in log[1] for log in rv.logs)
+
+    equations = ins["equalization"]
+    expected = [synthetic_memo_data["nodes"][ins["start"]]]
+    for eq in equations:
+        for s in np.arange(eq["smin"], eq["smax"], 0.5):
+            expected.append(
+                {
+                    "utm_x": eq["a3"]
+                    + eq["a2"] * s
+                    + eq["a1"] * s**2
+                    + eq["a0"] * s**3,
+                    "utm_y": eq["b3"]
+                    + eq["b2"] * s
+                    + eq["b1"] * s**2
+                    + eq["b0"] * s**3,
+                }
+            )
+    expected.append(synthetic_memo_data["nodes"][ins["end"]])
+    coords = [
+        WGS84.from_utm(p["utm_x"], p["utm_y"], 51, northern=True)
+        for p in expected
+    ]
+    geometry = rv.lines["road_0_ins"].geometry
+    assert len(geometry.coords) == 2 + 90 + 10
+    np.testing.assert_allclose(geometry.coords, coords, rtol=0, atol=1e-9)
+
+    step_1 = MemoParser(synthetic_memo_data).run()
+    assert len(step_1.lines["road_0_ins"].geometry.coords) == 2 + 45 + 5
+
+
+def test_memo_parse_cache_key() -> None:
+    ctx = MemoBuilderContext()
+    assert ctx.get_parse_cache_key("md5") == "md5"
+    ctx = MemoBuilderContext({"polyline_step": 0.5})
+    assert ctx.get_parse_cache_key("md5") == "md5_step0.5"
+
+
+def test_multi_memo_parser(synthetic_memo_data: MemoDataDict) -> None:
+    lines, lanes = synthetic_memo_data["lines"], synthetic_memo_data["lanes"]
+    lines["broken"] = {**lines["road_1_ins"], "start": "missing"}
+    # a lane which belongs to no road, and one with a broken border
+    lanes["single"] = {**lanes["road_0_lane_0"]}
+    lanes["road_2_lane_1"]["right_border"] = "broken"
+
+    expected = MemoParser(synthetic_memo_data).run()
+    parser = MultiMemoParser(
+        synthetic_memo_data, max_workers=2, chunks_per_worker=2
+    )
+    assert len(parser.get_line_tasks()) == 4
+    rv = parser.run()
+
+    for kind, geom_fields in (
+        ("lines", ("geometry", "sim_geometry")),
+        ("lanes", ("polygon", "centerline")),
+        ("roads", ("polygon",)),
+        ("objects", ("geometry",)),
+    ):
+        datum, expected_datum = getattr(rv, kind), getattr(expected, kind)
+        assert list(datum) == list(expected_datum)
+        for key, value in datum.items():
+            assert value.raw_data is expected_datum[key].raw_data
+            for field in geom_fields:
+                assert getattr(value, field).equals_exact(
+                    getattr(expected_datum[key], field), 0
+                )
+    assert "single" in rv.lanes and "road_2_lane_1" not in rv.lanes
+    assert "road_2" not in rv.roads
+    assert sorted(log[1].split("\n")[0] for log in rv.logs) == sorted(
+        log[1].split("\n")[0] for log in expected.logs
+    )
+
+
+def test_multi_memo_parser_path(
+    synthetic_memo_data: MemoDataDict, tmp_path: Path
+) -> None:
+    memo_path = tmp_path / "memo.json"
+    memo_path.write_text(json.dumps(synthetic_memo_data))
+    rv = load_memo_json(str(memo_path))
+    assert rv is not None
+    memo_data = rv[0]
+
+    expected = MemoParser(memo_data).run()
+    # the workers load the memo data from the file
+    result = MultiMemoParser(
+        memo_data, max_workers=2, chunks_per_worker=2, memo_path=str(memo_path)
+    ).run()
+    assert list(result.lanes) == list(expected.lanes)
+    for key, value in result.lanes.items():
+        assert value.polygon.equals_exact(expected.lanes[key].polygon, 0)
+    assert list(result.roads) == list(expected.roads)
+    assert not result.logs
+
+
+def test_memo_builder_workers(
+    synthetic_memo_data: MemoDataDict, monkeypatch
+) -> None:
+    from megmap_viz.megmap_dataset.megmap_gpkg import base_builder
+
+    pools = []
+
+    class RecordingParser(MultiMemoParser):
+        def __init__(self, *args, **kwargs) -> None:
+            pools.append(kwargs["max_workers"])
+            super().__init__(*args, **kwargs)
+
+    monkeypatch.setattr(base_builder, "MultiMemoParser", RecordingParser)
+    # the size of the apollo pool does not start a memo pool
+    MemoBuilderContext({"max_workers": 4}).set_data(synthetic_memo_data)
+    assert pools == []
+    ctx = MemoBuilderContext({"memo_workers": 2})
+    ctx.set_data(synthetic_memo_data)
+    assert pools == [2]
+    assert ctx.data.lanes
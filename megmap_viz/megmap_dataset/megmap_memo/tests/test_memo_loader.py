@@ -0,0 +1,102 @@
+import hashlib
+import io
+import json
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from megmap_viz.megmap_dataset.megmap_memo.memo_data_parser import (
+    MemoDataDict,
+    MemoParser,
+)
+from megmap_viz.megmap_dataset.megmap_memo.memo_loader import (
+    MemoNodeColumns,
+    load_memo_json,
+    load_memo_stream,
+)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 1024 * 1024])
+def test_load_memo_stream(
+    synthetic_memo_data: MemoDataDict, chunk_size: int
+) -> None:
+    synthetic_memo_data["lines"]["road_0_border_0"]["border_color"] = "白色"
+    # a key with escapes
+    objects = synthetic_memo_data["objects"]
+    objects['stop "0"\n'] = {**objects["road_0_stopline"]}
+    content = json.dumps(
+        synthetic_memo_data, ensure_ascii=False, indent=2
+    ).encode()
+
+    memo_data, md5 = load_memo_stream(io.BytesIO(content), chunk_size)
+    assert md5 == hashlib.md5(content).hexdigest()
+    for section in ("lanes", "lines", "roads", "objects"):
+        assert memo_data[section] == synthetic_memo_data[section]
+
+    nodes = memo_data["nodes"]
+    assert isinstance(nodes, MemoNodeColumns)
+    expected = MemoNodeColumns.from_dict(synthetic_memo_data["nodes"])
+    assert nodes.ids == expected.ids
+    for name in ("utm_x", "utm_y", "utm_z", "zone_id"):
+        np.testing.assert_array_equal(
+            getattr(nodes, name), getattr(expected, name)
+        )
+
+    # ids are shared between the sections
+    node_ids = {node_id: node_id for node_id in nodes.ids}
+    line = memo_data["lines"]["road_0_border_0"]
+    assert all(node_ids[node_id] is node_id for node_id in line["nodes"])
+    line_ids = {line_id: line_id for line_id in memo_data["lines"]}
+    lane = memo_data["lanes"]["road_0_lane_0"]
+    assert line_ids[lane["left_border"]] is lane["left_border"]
+
+    rv = MemoParser(memo_data).run()
+    expected_rv = MemoParser(synthetic_memo_data).run()
+    assert rv.lines.keys() == expected_rv.lines.keys()
+    for line_id, line_rv in rv.lines.items():
+        assert line_rv.geometry.equals_exact(
+            expected_rv.lines[line_id].geometry, 0
+        )
+
+
+def test_load_memo_stream_numbers() -> None:
+    content = (
+        b'{"version": -1.5e+3, "count": 10,'
+        b' "lines": {"a": {"width": 2.25}}, "scale": 0.125}'
+    )
+    # every chunk size cuts the numbers somewhere else
+    for chunk_size in range(1, len(content) + 1):
+        memo_data, _ = load_memo_stream(io.BytesIO(content), chunk_size)
+        assert memo_data == json.loads(content)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 4, 1024 * 1024])
+def test_load_memo_stream_error(chunk_size: int) -> None:
+    for content in (
+        b"",
+        b"[]",
+        b'{"nodes": {"1": {"utm_x": 1',
+        b'{"lines": {} "lanes"',
+        b'{"lines": {"a": {} "b": {}}}',
+        b'{"lines": {, "a": {}}}',
+        b'{"lines": {"a": {},}}',
+        b'{"lines": {"a": tru}}',
+        b'{"lines": {"a\\x": {}}}',
+        b"{1: {}}",
+        b'{"version": 1.}',
+        b'{"lines": {}} {}',
+    ):
+        with pytest.raises(json.JSONDecodeError):
+            load_memo_stream(io.BytesIO(content), chunk_size)
+
+
+def test_load_memo_json(
+    tmp_path: Path, synthetic_memo_data: MemoDataDict
+) -> None:
+    path = tmp_path / "memo.json"
+    path.write_text(json.dumps(synthetic_memo_data))
+    assert load_memo_json(str(tmp_path / "missing.json")) is None
+    rv = load_memo_json(str(path))
+    assert rv is not None
+    assert rv[1] == hashlib.md5(path.read_bytes()).hexdigest()
@@ -0,0 +1,217 @@
+"""On disk cache of parsed maps, keyed by the md5 of the source file.
+
+Apollo maps are stored as the columns of `ApolloColumnarResult`, memo maps
+as their raw json plus the WKB of their geometries. Both go into a
+compressed, pickle free ``.npz`` file. Bump `PARSE_CACHE_VERSION` whenever
+the output of a parser changes, so that old entries are ignored. Entries of
+a map are removed with the map by `ParseCache.delete`.
+
+An entry may also keep the content hashes of the map elements, which let
+a later version of the map be parsed incrementally.
+"""
+from __future__ import annotations
+import os
+import json
+import threading
+import typing as t
+import logging
+from pathlib import Path
+
+import numpy as np
+import shapely
+
+from .datatypes import BuilderType
+from .megmap_apollo.apollo_parser import ApolloParserResult
+from .megmap_apollo.columnar import ApolloColumnarResult
+from .megmap_apollo.incremental import ElementHashes
+from .megmap_memo.memo_data_parser import (
+    MemoParserResult,
+    MemoRoadResult,
+    MemoLaneResult,
+    MemoLineResult,
+    MemoObjectResult,
+)
+
+logger = logging.getLogger(__name__)
+
+PARSE_CACHE_VERSION = 1
+ELEMENT_KEYS = "__element_keys__"
+ELEMENT_DIGESTS = "__element_digests__"
+
+ParsedMapType = t.Union[
+    ApolloParserResult, ApolloColumnarResult, MemoParserResult
+]
+
+# memo result kind -> (result class, geometry fields)
+MEMO_RESULT_FIELDS: t.Dict[str, t.Tuple[type, t.Tuple[str, ...]]] = {
+    "roads": (MemoRoadResult, ("polygon",)),
+    "lanes": (MemoLaneResult, ("polygon", "centerline")),
+    "lines": (MemoLineResult, ("geometry", "sim_geometry")),
+    "objects": (MemoObjectResult, ("geometry",)),
+}
+
+
+def pack_json(obj: t.Any) -> np.ndarray:
+    return np.frombuffer(json.dumps(obj).encode(), dtype=np.uint8)
+
+
+def unpack_json(buffer: np.ndarray) -> t.Any:
+    return json.loads(buffer.tobytes().decode())
+
+
+def pack_geometries(geoms: t.Sequence) -> t.Tuple[np.ndarray, np.ndarray]:
+    """Pack geometries as one WKB byte buffer and its offsets."""
+    wkbs = shapely.to_wkb(np.asarray(geoms, dtype=object))
+    offsets = np.zeros(len(wkbs) + 1, dtype=np.int64)
+    np.cumsum([len(wkb) for wkb in wkbs], out=offsets[1:])
+    buffer = np.frombuffer(b"".join(wkbs), dtype=np.uint8)
+    return buffer, offsets
+
+
+def unpack_geometries(buffer: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    data = buffer.tobytes()
+    return shapely.from_wkb(
+        [data[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+    )
+
+
+def pack_memo_result(result: MemoParserResult) -> t.Dict[str, np.ndarray]:
+    rv: t.Dict[str, np.ndarray] = {"logs": pack_json(result.logs)}
+    for kind, (_, geom_fields) in MEMO_RESULT_FIELDS.items():
+        datum: t.Dict[str, t.Any] = getattr(result, kind)
+        rv[f"{kind}_raw"] = pack_json(
+            [[key, value.raw_data] for key, value in datum.items()]
+        )
+        for field in geom_fields:
+            buffer, offsets = pack_geometries(
+                [getattr(value, field) for value in datum.values()]
+            )
+            rv[f"{kind}_{field}"] = buffer
+            rv[f"{kind}_{field}_offsets"] = offsets
+    return rv
+
+
+def unpack_memo_result(
+    columns: t.Mapping[str, np.ndarray]
+) -> MemoParserResult:
+    datum: t.Dict[str, t.Dict[str, t.Any]] = {}
+    for kind, (result_cls, geom_fields) in MEMO_RESULT_FIELDS.items():
+        raws = unpack_json(columns[f"{kind}_raw"])
+        geoms = [
+            unpack_geometries(
+                columns[f"{kind}_{field}"], columns[f"{kind}_{field}_offsets"]
+            )
+            for field in geom_fields
+        ]
+        datum[kind] = {
+            key: result_cls(raw, *values)
+            for (key, raw), *values in zip(raws, *geoms)
+        }
+    return MemoParserResult(
+        roads=datum["roads"],
+        lanes=datum["lanes"],
+        lines=datum["lines"],
+        objects=datum["objects"],
+        logs=[tuple(log) for log in unpack_json(columns["logs"])],
+    )
+
+
+class ParseCache:
+    def __init__(self, cache_dir: t.Union[str, Path]) -> None:
+        self.cache_dir = Path(cache_dir).absolute()
+
+    def get_path(self, file_md5: str, builder_type: BuilderType) -> Path:
+        return self.cache_dir / (
+            f"{file_md5}_{builder_type.value}.v{PARSE_CACHE_VERSION}.npz"
+        )
+
+    def load(
+        self, file_md5: str, builder_type: BuilderType
+    ) -> t.Optional[ParsedMapType]:
+        path = self.get_path(file_md5, builder_type)
+        if not path.exists():
+            return None
+
+        try:
+            with np.load(path, allow_pickle=False) as f:
+                columns = {
+                    key: f[key]
+                    for key in f.files
+                    if key not in (ELEMENT_KEYS, ELEMENT_DIGESTS)
+                }
+            if int(columns.pop("__version__")) != PARSE_CACHE_VERSION:
+                return None
+            if builder_type == BuilderType.APOLLO:
+                return ApolloColumnarResult(columns)
+            return unpack_memo_result(columns)
+        except Exception:
+            logger.exception("Failed to load parsed map %s", path)
+            return None
+
+    def load_element_hashes(
+        self, file_md5: str, builder_type: BuilderType
+    ) -> t.Optional[ElementHashes]:
+        path = self.get_path(file_md5, builder_type)
+        if not path.exists():
+            return None
+
+        try:
+            # members of a npz file are only read when accessed
+            with np.load(path, allow_pickle=False) as f:
+                if ELEMENT_KEYS not in f.files:
+                    return None
+                if int(f["__version__"]) != PARSE_CACHE_VERSION:
+                    return None
+                return dict(
+                    zip(f[ELEMENT_KEYS].tolist(), f[ELEMENT_DIGESTS].tolist())
+                )
+        except Exception:
+            logger.exception("Failed to load element hashes %s", path)
+            return None
+
+    def save(
+        self,
+        file_md5: str,
+        builder_type: BuilderType,
+        result: ParsedMapType,
+        element_hashes: t.Optional[ElementHashes] = None,
+    ) -> None:
+        path = self.get_path(file_md5, builder_type)
+        # builds of the same map may run in several threads
+        tmp_path = path.with_name(
+            f".{path.stem}.{os.getpid()}.{threading.get_ident()}.npz"
+        )
+        try:
+            if isinstance(result, MemoParserResult):
+                columns = pack_memo_result(result)
+            elif isinstance(result, ApolloColumnarResult):
+                columns = result.columns
+            else:
+                columns = ApolloColumnarResult.from_result(result).columns
+            if element_hashes is not None:
+                columns = {
+                    **columns,
+                    ELEMENT_KEYS: np.array(list(element_hashes), dtype=str),
+                    ELEMENT_DIGESTS: np.array(
+                        list(element_hashes.values()), dtype=str
+                    ),
+                }
+
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                np.savez_compressed(
+                    f,
+                    __version__=np.array(PARSE_CACHE_VERSION),
+                    **columns,
+                )
+            # readers never see a half written entry
+            os.replace(tmp_path, path)
+        except Exception:
+            logger.exception("Failed to save parsed map %s", path)
+            tmp_path.unlink(missing_ok=True)
+
+    def delete(self, file_md5: str) -> None:
+        """Remove the entries of a map, of every parser and version."""
+        for path in self.cache_dir.glob(f"{file_md5}_*.npz"):
+            path.unlink(missing_ok=True)
+            logger.debug("Remove parsed map %s", path)
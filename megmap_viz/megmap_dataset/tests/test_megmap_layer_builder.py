@@ -1,15 +1,46 @@
 import json
+import sqlite3
 import typing as t
 import os
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pyogrio
+import pytest
+from geopandas.testing import assert_geodataframe_equal
+from shapely.geometry import LineString, Point, Polygon
+
+from megmap_viz.megmap_dataset.datatypes import (
+    MegMapLayer,
+    MegMapLayerType,
+    ParserConfig,
+)
+from megmap_viz.megmap_dataset.megmap_apollo.tests.conftest import (
+    make_apollo_xml,
+)
 from megmap_viz.megmap_dataset.megmap_gpkg import (
     build_all_map_layer,
     write_map_layer_to_gpkg,
     MemoBuilderContext,
     ApolloBuilderContext,
 )
+from megmap_viz.megmap_dataset.megmap_gpkg.base_builder import (
+    LAYER_BUIDLERS,
+    BuilderContext,
+    get_build_levels,
+)
+from megmap_viz.megmap_dataset.megmap_gpkg.gpkg_builder import LaneBuilder
+from megmap_viz.megmap_dataset.megmap_gpkg.gpkg_datatypes import (
+    LayerColumns,
+    LineStore,
+)
 from megmap_viz.megmap_dataset.megmap_memo.memo_data_parser import MemoDataDict
+from megmap_viz.megmap_dataset.megmap_memo.tests.conftest import (
+    make_memo_data,
+)
 from megmap_viz.utils.file_op import load_xml, load_json
 
 
@@ -65,3 +96,275 @@ def test_build_memo_all_map_layer(test_memo_local_path: str) -> None:
         },
     )
     assert rv
+
+
+def test_get_build_levels() -> None:
+    levels = get_build_levels(LAYER_BUIDLERS)
+    layer_types = [[b.layer_type for b in level] for level in levels]
+    assert layer_types[0][0] == MegMapLayerType.LANE_BOUNDARY
+    assert layer_types[1] == [
+        MegMapLayerType.LANE,
+        MegMapLayerType.LANE_CONNECTOR,
+    ]
+    assert set(sum(layer_types, [])) == set(LAYER_BUIDLERS)
+
+    class CircularBuilder(LaneBuilder):
+        layer_type = MegMapLayerType.LANE_BOUNDARY
+        depends_on = (MegMapLayerType.LANE,)
+
+    with pytest.raises(ValueError):
+        get_build_levels(
+            {
+                MegMapLayerType.LANE: LaneBuilder,
+                MegMapLayerType.LANE_BOUNDARY: CircularBuilder,
+            }
+        )
+    with pytest.raises(ValueError):
+        get_build_levels({MegMapLayerType.LANE: LaneBuilder})
+
+
+def _build_layers(
+    data: t.Any,
+    builder_context_cls: t.Type[BuilderContext],
+    parser_config: ParserConfig,
+) -> t.Dict[MegMapLayerType, MegMapLayer]:
+    layer_datum, _ = build_all_map_layer(
+        data, builder_context_cls, parser_config
+    )
+    return layer_datum
+
+
+@pytest.mark.parametrize("megmap_type", ["apollo", "memo"])
+def test_build_layers_concurrently(tmp_path: Path, megmap_type: str) -> None:
+    if megmap_type == "apollo":
+        data = str(tmp_path / "test_20240101_v0.xml")
+        Path(data).write_text(make_apollo_xml(road_num=6), encoding="utf-8")
+        builder_context_cls: t.Type[BuilderContext] = ApolloBuilderContext
+    else:
+        data = make_memo_data()
+        builder_context_cls = MemoBuilderContext
+
+    expected = _build_layers(data, builder_context_cls, {"max_workers": 1})
+    rv = _build_layers(
+        data, builder_context_cls, {"max_workers": 1, "build_workers": 4}
+    )
+    assert list(rv) == list(expected)
+    for layer_type, layer in rv.items():
+        pd.testing.assert_frame_equal(layer, expected[layer_type])
+
+    gids = np.concatenate([layer["gid"].to_numpy() for layer in rv.values()])
+    # every build counts its gids from 1
+    np.testing.assert_array_equal(np.sort(gids), np.arange(1, len(gids) + 1))
+    if megmap_type == "apollo":
+        boundary_gids = set(rv[MegMapLayerType.LANE_BOUNDARY]["gid"])
+        assert set(rv[MegMapLayerType.LANE]["left_boundary_gid"]) <= (
+            boundary_gids
+        )
+
+
+def test_build_maps_concurrently(tmp_path: Path) -> None:
+    paths = []
+    for road_num in (3, 6, 9):
+        path = tmp_path / f"test{road_num}_20240101_v0.xml"
+        path.write_text(make_apollo_xml(road_num=road_num), encoding="utf-8")
+        paths.append(str(path))
+    parser_config: ParserConfig = {"max_workers": 1}
+    expected = [
+        build_all_map_layer(path, ApolloBuilderContext, parser_config)
+        for path in paths
+    ]
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        rv = list(
+            executor.map(
+                lambda path: build_all_map_layer(
+                    path, ApolloBuilderContext, parser_config
+                ),
+                paths * 2,
+            )
+        )
+
+    for (layer_datum, logs), (expected_datum, expected_logs) in zip(
+        rv, expected * 2
+    ):
+        assert list(layer_datum) == list(expected_datum)
+        for layer_type, layer in layer_datum.items():
+            pd.testing.assert_frame_equal(layer, expected_datum[layer_type])
+        # every build has its own logs
+        assert [log[2] for log in logs] == [log[2] for log in expected_logs]
+
+
+def test_line_store() -> None:
+    store = LineStore()
+    lines = {
+        gid: LineString([(gid + x, x * 0.5) for x in range(gid % 4 + 2)])
+        for gid in range(10, 20)
+    }
+    for gid, line in lines.items():
+        store.add(gid, line)
+    assert len(store) == 10 and 10 in store and 20 not in store
+    np.testing.assert_array_equal(store.get_coords(13), lines[13].coords)
+
+    right_gids, left_gids = [11, 12, 19], [10, 17, 19]
+    polygons = store.get_polygons(right_gids, left_gids)
+    for polygon, right_gid, left_gid in zip(polygons, right_gids, left_gids):
+        expected = Polygon(
+            list(lines[right_gid].coords)
+            + list(lines[left_gid].reverse().coords)
+        )
+        assert polygon.equals_exact(expected, 0)
+    assert len(store.get_polygons([], [])) == 0
+
+    # lines added later are packed on the next read
+    store.add(20, LineString([(0, 0), (1, 1)]))
+    np.testing.assert_array_equal(store.get_coords(20), [(0, 0), (1, 1)])
+
+
+def test_layer_columns() -> None:
+    rows = [
+        {"gid": 1, "geometry": Point(0, 0), "a": 1, "b": "x", "c": [1]},
+        {"gid": 2, "geometry": Point(1, 0), "a": 2, "b": None, "c": []},
+        {"gid": 5, "geometry": Point(2, 0), "a": 3, "b": "y", "c": [2]},
+    ]
+    columns = LayerColumns({"a": None, "b": None, "c": "object"})
+    for row in rows:
+        columns.append(*row.values())
+    assert len(columns) == 3
+    expected = gpd.GeoDataFrame(data=rows, crs=4326)
+    expected.set_geometry("geometry", inplace=True)
+    assert_geodataframe_equal(columns.to_gdf(crs=4326), expected)
+    assert_geodataframe_equal(
+        columns.compress([True, False, True]).to_gdf(),
+        expected.iloc[[0, 2]].reset_index(drop=True),
+    )
+    with pytest.raises(ValueError):
+        columns.append(6, Point(3, 0), 4, "z")
+
+    columns = LayerColumns({"a": "int32", "b": "object"})
+    columns.append(1, Point(0, 0), 1, None)
+    gdf = columns.to_gdf()
+    assert gdf["a"].dtype == np.int32 and gdf["b"].dtype == object
+    assert gdf.crs == "EPSG:4326"
+    gdf = LayerColumns({"a": "int64"}).to_gdf()
+    assert len(gdf) == 0 and list(gdf.columns) == ["gid", "geometry", "a"]
+
+
+@pytest.mark.parametrize("metadata", [{"key": "value"}, None])
+def test_write_map_layer_to_gpkg(
+    tmp_path: Path, metadata: t.Optional[t.Dict[str, str]]
+) -> None:
+    xml_path = tmp_path / "test_20240101_v0.xml"
+    xml_path.write_text(make_apollo_xml(road_num=6), encoding="utf-8")
+    layer_datum = _build_layers(
+        str(xml_path), ApolloBuilderContext, {"max_workers": 1}
+    )
+    # enough features for an R-tree of two levels, null and empty ones
+    rng = np.random.default_rng(0)
+    points = [Point(x, y) for x, y in rng.uniform(0, 100, (3000, 2))]
+    layer_datum[MegMapLayerType.STOP_LINE] = gpd.GeoDataFrame(
+        {"gid": np.arange(3002), "geometry": points + [None, Point()]},
+        crs=4326,
+    )
+    layer_datum[MegMapLayerType.CROSSWALK] = layer_datum[
+        MegMapLayerType.CROSSWALK
+    ].iloc[:0]
+    gpkg_path = tmp_path / "test_20240101_v0_md5.gpkg"
+    write_map_layer_to_gpkg(
+        layer_datum, str(gpkg_path), matadata=metadata, max_workers=2
+    )
+    # no temporary files left
+    assert sorted(os.listdir(tmp_path)) == [xml_path.name, gpkg_path.name]
+
+    expected_path = tmp_path / "expected.gpkg"
+    layers = [
+        (layer_type.name, layer)
+        for layer_type, layer in layer_datum.items()
+        if not layer.empty
+    ]
+    for idx, (name, layer) in enumerate(layers):
+        pyogrio.write_dataframe(
+            layer,
+            str(expected_path),
+            layer=name,
+            append=idx > 0,
+            dataset_metadata=metadata if idx == 0 else None,
+        )
+    assert pyogrio.list_layers(gpkg_path).tolist() == (
+        pyogrio.list_layers(expected_path).tolist()
+    )
+    assert pyogrio.read_info(gpkg_path)["dataset_metadata"] == (
+        pyogrio.read_info(expected_path)["dataset_metadata"]
+    )
+
+    con = sqlite3.connect(gpkg_path)
+    expected_con = sqlite3.connect(expected_path)
+    for sql in (
+        "SELECT name, sql FROM sqlite_master ORDER BY name",
+        "SELECT * FROM gpkg_extensions ORDER BY table_name, extension_name",
+        "SELECT * FROM gpkg_geometry_columns ORDER BY table_name",
+    ):
+        assert con.execute(sql).fetchall() == (
+            expected_con.execute(sql).fetchall()
+        )
+    for name, layer in layers:
+        assert_geodataframe_equal(
+            pyogrio.read_dataframe(gpkg_path, layer=name),
+            pyogrio.read_dataframe(expected_path, layer=name),
+        )
+        rtree = f"rtree_{name}_geom"
+        assert con.execute(f"SELECT rtreecheck('{rtree}')").fetchone() == (
+            "ok",
+        )
+        rows = np.array(
+            con.execute(
+                f"SELECT id, minx, miny, maxx, maxy FROM {rtree} ORDER BY id"
+            ).fetchall()
+        )
+        bounds = layer.geometry.bounds.to_numpy()
+        valid = ~(layer.geometry.isna() | layer.geometry.is_empty).to_numpy()
+        np.testing.assert_array_equal(rows[:, 0], np.flatnonzero(valid) + 1)
+        # float32 boxes containing the features
+        assert (rows[:, 1:3] <= bounds[valid, :2]).all()
+        assert (rows[:, 3:] >= bounds[valid, 2:]).all()
+        assert (bounds[valid, :2] - rows[:, 1:3] < 1e-4).all()
+        assert (rows[:, 3:] - bounds[valid, 2:] < 1e-4).all()
+
+        minx, miny, maxx, maxy = layer.total_bounds
+        bbox = (minx, miny, (minx + maxx) / 2, (miny + maxy) / 2)
+        rv = con.execute(
+            f"SELECT id FROM {rtree} WHERE maxx >= ? AND minx <= ? "
+            "AND maxy >= ? AND miny <= ? ORDER BY id",
+            (bbox[0], bbox[2], bbox[1], bbox[3]),
+        ).fetchall()
+        hits = (
+            (rows[:, 3] >= bbox[0])
+            & (rows[:, 1] <= bbox[2])
+            & (rows[:, 4] >= bbox[1])
+            & (rows[:, 2] <= bbox[3])
+        )
+        assert [fid for (fid,) in rv] == rows[hits, 0].astype(int).tolist()
+        assert len(
+            pyogrio.read_dataframe(gpkg_path, layer=name, bbox=bbox)
+        ) == len(pyogrio.read_dataframe(expected_path, layer=name, bbox=bbox))
+    con.close()
+    expected_con.close()
+
+
+def test_write_map_layer_to_gpkg_empty_first_layer(tmp_path: Path) -> None:
+    points = gpd.GeoDataFrame(
+        {"gid": [1, 2], "geometry": [Point(0, 0), Point(1, 1)]}, crs=4326
+    )
+    layer_datum = {
+        MegMapLayerType.LANE_BOUNDARY: points.iloc[:0],
+        MegMapLayerType.STOP_LINE: points,
+        MegMapLayerType.CROSSWALK: points,
+    }
+    gpkg_path = tmp_path / "test_20240101_v0_md5.gpkg"
+    # no profiler, the metadata is written with the first non empty layer
+    write_map_layer_to_gpkg(layer_datum, str(gpkg_path), {"key": "value"})
+    assert pyogrio.list_layers(gpkg_path)[:, 0].tolist() == [
+        "STOP_LINE",
+        "CROSSWALK",
+    ]
+    assert pyogrio.read_info(gpkg_path)["dataset_metadata"] == {
+        "key": "value"
+    }
@@ -1,13 +1,33 @@
+import json
 import typing as t
 from pathlib import Path
 
+import numpy as np
+import pytest
+from geopandas.testing import assert_geodataframe_equal
 from shapely.geometry import box
 
+from megmap_viz.megmap_dataset.datatypes import MegMapLayerType
+from megmap_viz.megmap_dataset.megmap import MegMap
+from megmap_viz.megmap_dataset.megmap_apollo.tests.conftest import (
+    make_apollo_xml,
+)
+from megmap_viz.megmap_dataset.megmap_gpkg import (
+    ApolloBuilderContext,
+    ParquetDB,
+    build_all_map_layer,
+    write_map_layer_to_gpkg,
+    write_map_layer_to_parquet,
+)
+from megmap_viz.megmap_dataset.megmap_gpkg.geoparquet import (
+    hilbert_distance,
+)
 from megmap_viz.megmap_dataset.megmap_gpkg.gpkg_db import (
     GPKGDB,
     MegMapFileInfo,
 )
 from megmap_viz.megmap_dataset.utils import (
+    LOCAL_LAYER_BUFFER,
     box_from_gcj02,
     get_map_local_layer,
 )
@@ -49,3 +69,192 @@ def test_gpkg_db(
                 layer_intersection.total_bounds[3],
             )
         )
+
+
+@pytest.fixture
+def test_map_stores(
+    tmp_path: Path,
+) -> t.Tuple[MegMapFileInfo, GPKGDB, ParquetDB]:
+    xml_path = tmp_path / "test_20240101_v0.xml"
+    xml_path.write_text(make_apollo_xml(road_num=12), encoding="utf-8")
+    layer_datum, _ = build_all_map_layer(
+        str(xml_path), ApolloBuilderContext, {"max_workers": 1}
+    )
+    info = MegMapFileInfo(remark="test_20240101_v0", md5="md5")
+    metadata = {
+        "map_remark": info.remark,
+        "map_md5": info.md5,
+        "map_s3_path": str(xml_path),
+        "map_type": "apollo",
+        "available_layers": json.dumps(ApolloBuilderContext.avaliable_layers),
+        "layer_id_name_map": json.dumps(
+            ApolloBuilderContext.layer_id_name_map
+        ),
+    }
+    root_path = tmp_path / "maps"
+    root_path.mkdir()
+    gpkg_db, parquet_db = GPKGDB(str(root_path)), ParquetDB(str(root_path))
+    write_map_layer_to_gpkg(
+        layer_datum, str(gpkg_db.get_path(info)), matadata=metadata
+    )
+    write_map_layer_to_parquet(
+        layer_datum, str(parquet_db.get_path(info)), matadata=metadata
+    )
+    return info, gpkg_db, parquet_db
+
+
+def test_hilbert_distance() -> None:
+    # the first order curve, a box with its center in every quadrant
+    bounds = np.array(
+        [[0, 0, 0, 0], [0, 1, 0, 1], [1, 1, 1, 1], [1, 0, 1, 0]], dtype=float
+    )
+    np.testing.assert_array_equal(hilbert_distance(bounds, 1), [0, 1, 2, 3])
+    distance = hilbert_distance(np.array([[np.nan] * 4, [0, 0, 1, 1]]))
+    assert distance[0] > distance[1]
+
+
+def test_parquet_db(
+    test_map_stores: t.Tuple[MegMapFileInfo, GPKGDB, ParquetDB]
+) -> None:
+    info, gpkg_db, parquet_db = test_map_stores
+    assert parquet_db.all_megmap_file_info == [info]
+    assert gpkg_db.all_megmap_file_info == [info]
+    assert parquet_db.exists(info)
+    assert parquet_db.get_metadata(info) == gpkg_db.get_metadata(info)
+    assert parquet_db.get_build_stages(info) == []
+
+    for layer_type in MegMapLayerType:
+        layer = gpkg_db.load_map_layer(info, layer_type.name)
+        if layer is None:
+            assert parquet_db.load_map_layer(info, layer_type.name) is None
+            continue
+        assert_geodataframe_equal(
+            parquet_db.load_map_layer(info, layer_type.name), layer
+        )
+
+        minx, miny, maxx, maxy = layer.total_bounds
+        bbox = (minx, miny, (minx + maxx) / 2, (miny + maxy) / 2)
+        ids = layer["gid"].iloc[::7].tolist()
+        for kwargs in (
+            {"bbox": bbox},
+            {"id_column": "gid", "ids": ids},
+            {"bbox": bbox, "id_column": "gid", "ids": ids},
+            {"id_column": "gid", "ids": [str(gid) for gid in ids]},
+        ):
+            assert_geodataframe_equal(
+                parquet_db.query_map_layer(info, layer_type.name, **kwargs),
+                gpkg_db.query_map_layer(
+                    info, layer_type.name, **kwargs
+                ).reset_index(drop=True),
+            )
+
+    parquet_db.delete(info)
+    assert not parquet_db.exists(info)
+    assert gpkg_db.exists(info)
+
+
+def test_gpkg_id_lookup(
+    test_map_stores: t.Tuple[MegMapFileInfo, GPKGDB, ParquetDB],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    info, gpkg_db, _ = test_map_stores
+    lookup_db = GPKGDB(str(gpkg_db.root_path))
+
+    def load_map_layer(*args: t.Any) -> None:
+        raise AssertionError("whole layer loaded")
+
+    monkeypatch.setattr(lookup_db, "load_map_layer", load_map_layer)
+    for name, id_column in ApolloBuilderContext.layer_id_name_map.items():
+        layer = gpkg_db.load_map_layer(info, name.upper())
+        if layer is None:
+            assert not lookup_db.get_indexed_columns(info, name.upper())
+            continue
+        assert lookup_db.get_indexed_columns(info, name.upper()) == {id_column}
+        ids = layer[id_column].iloc[::5].tolist()
+        assert_geodataframe_equal(
+            lookup_db.query_map_layer(
+                info, name.upper(), None, id_column, ids
+            ),
+            layer[layer[id_column].isin(ids)].reset_index(drop=True),
+        )
+    assert not lookup_db.get_indexed_columns(
+        MegMapFileInfo(remark="missing", md5="md5"), "LANE"
+    )
+
+
+@pytest.mark.parametrize("store_idx", [1, 2])
+def test_low_memory_query(
+    test_map_stores: t.Tuple[MegMapFileInfo, GPKGDB, ParquetDB],
+    store_idx: int,
+) -> None:
+    info, layer_store = test_map_stores[0], test_map_stores[store_idx]
+    low_memory_store = type(layer_store)(
+        str(layer_store.root_path), low_memory=True
+    )
+    for layer_type in MegMapLayerType:
+        layer = layer_store.load_map_layer(info, layer_type.name)
+        if layer is None:
+            assert (
+                low_memory_store.query_map_layer(info, layer_type.name) is None
+            )
+            continue
+        minx, miny, maxx, maxy = layer.total_bounds
+        bbox = (minx, miny, (minx + maxx) / 2, (miny + maxy) / 2)
+        ids = layer["gid"].iloc[::7].tolist()
+        for kwargs in (
+            {},
+            {"bbox": bbox},
+            {"bbox": (maxx + 1, maxy + 1, maxx + 2, maxy + 2)},
+            {"id_column": "gid", "ids": ids},
+            {"id_column": "gid", "ids": []},
+            {"bbox": bbox, "id_column": "gid", "ids": ids},
+            {"id_column": "gid", "ids": [str(gid) for gid in ids] + ["'"]},
+        ):
+            assert_geodataframe_equal(
+                low_memory_store.query_map_layer(
+                    info, layer_type.name, **kwargs
+                ),
+                layer_store.query_map_layer(
+                    info, layer_type.name, **kwargs
+                ).reset_index(drop=True),
+            )
+
+
+@pytest.mark.parametrize("low_memory", [False, True])
+@pytest.mark.parametrize("store_idx", [1, 2])
+def test_megmap_query(
+    test_map_stores: t.Tuple[MegMapFileInfo, GPKGDB, ParquetDB],
+    store_idx: int,
+    low_memory: bool,
+) -> None:
+    info = test_map_stores[0]
+    layer_store = t.cast(GPKGDB, test_map_stores[store_idx])
+    # the layers are only queried by a fresh map, loaded by the other one
+    megmap = MegMap(
+        type(layer_store)(str(layer_store.root_path), low_memory=low_memory),
+        info,
+    )
+    expected = MegMap(layer_store, info)
+    expected.initialize_all_layers()
+    minx, miny, maxx, maxy = layer_store.load_map_layer(
+        info, "LANE"
+    ).total_bounds
+    # east of the map, the margin of the local layers reaches its center
+    center_x = (minx + maxx) / 2 + LOCAL_LAYER_BUFFER
+    bbox = box(center_x, miny, center_x + 0.001, maxy)
+    for layer_type in (MegMapLayerType.LANE, MegMapLayerType.LANE_BOUNDARY):
+        ids = expected.get_ids_by_bbox(bbox, layer_type)
+        assert 0 < len(ids) < len(expected.get_all_ids(layer_type))
+        assert megmap.get_ids_by_bbox(bbox, layer_type) == ids
+        assert megmap.get_map_objects_by_bbox(
+            bbox, layer_type
+        ) == expected.get_map_objects_by_bbox(bbox, layer_type)
+        assert megmap.get_map_objects_by_ids(
+            layer_type, ids[:3]
+        ) == expected.get_map_objects_by_ids(layer_type, ids[:3])
+        assert megmap.get_all_ids(layer_type) == expected.get_all_ids(
+            layer_type
+        )
+    assert megmap.get_total_bbox() == expected.get_total_bbox()
+    if low_memory:
+        assert not megmap._map_layer
@@ -0,0 +1,70 @@
+import geopandas as gpd
+import numpy as np
+from geopandas.testing import assert_geodataframe_equal
+from shapely.geometry import LineString, Point, box
+
+from megmap_viz.megmap_dataset.utils import (
+    LOCAL_LAYER_BUFFER,
+    get_map_local_layer,
+    simplify_lines,
+)
+from megmap_viz.utils.coord_converter import WGS84
+
+
+def simplify_line_in_own_zone(line: LineString) -> LineString:
+    lon, lat = (np.asarray(v) for v in line.coords.xy)
+    x, y, zone_number, zone_letter = WGS84.to_utm(lon, lat)
+    simplified = LineString(np.stack([x, y], axis=1)).simplify(0.5)
+    sx, sy = (np.asarray(v) for v in simplified.coords.xy)
+    lon, lat = WGS84.from_utm(sx, sy, zone_number, zone_letter)
+    return LineString(np.stack([lon, lat], axis=1))
+
+
+def test_simplify_lines() -> None:
+    rng = np.random.default_rng(0)
+    lines = []
+    # lines in several utm zones and both hemispheres
+    for lon, lat in [(121.3, 30.2), (116.9, 39.9), (-70.1, -33.4)] * 20:
+        n = int(rng.integers(2, 40))
+        lines.append(
+            LineString(
+                np.stack(
+                    [
+                        lon + np.cumsum(rng.normal(1e-5, 1e-5, n)),
+                        lat + np.cumsum(rng.normal(0, 1e-5, n)),
+                    ],
+                    axis=1,
+                )
+            )
+        )
+    lines.append(LineString())
+
+    rv = simplify_lines(lines)
+    assert len(rv) == len(lines)
+    for line, sim_line in zip(lines[:-1], rv[:-1]):
+        assert sim_line.equals_exact(simplify_line_in_own_zone(line), 0)
+    assert rv[-1].is_empty
+    assert len(simplify_lines([])) == 0
+
+
+def test_get_map_local_layer() -> None:
+    rng = np.random.default_rng(0)
+    lines = [
+        LineString(lon_lat + np.cumsum(rng.normal(0, 1e-3, (5, 2)), axis=0))
+        for lon_lat in rng.uniform([121.2, 30.2], [121.4, 30.3], (500, 2))
+    ]
+    layer = gpd.GeoDataFrame(
+        {"gid": np.arange(502)},
+        geometry=lines + [None, Point()],
+        index=np.arange(502) * 2,
+        crs=4326,
+    )
+    for minx, miny in rng.uniform([121.2, 30.2], [121.4, 30.3], (10, 2)):
+        bbox = box(minx, miny, minx + 0.01, miny + 0.01)
+        local_layer = get_map_local_layer(layer, bbox)
+        assert_geodataframe_equal(
+            local_layer,
+            layer[layer.intersects(bbox.buffer(LOCAL_LAYER_BUFFER))],
+        )
+        assert 0 < len(local_layer) < len(layer)
+    assert get_map_local_layer(layer, box(0, 0, 1, 1)).empty
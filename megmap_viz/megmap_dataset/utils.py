@@ -2,21 +2,21 @@ from __future__ import annotations
 import typing as t
 import datetime
 import logging
+import multiprocessing
 import re
+from multiprocessing.context import BaseContext
 
 import numpy as np
 import numpy.typing as npt
+import shapely
 from shapely.geometry import Polygon, LineString
 
-from megmap_viz.utils.file_op import (
-    load_xml,
-    load_json,
-)
+from megmap_viz.utils.file_op import load_xml_path
 from megmap_viz.utils.coord_converter import GCJ02, WGS84
+from .megmap_memo.memo_loader import load_memo_json
 from .datatypes import MegMapLayer, RemarkInfo, MegMapLayerType
 
 if t.TYPE_CHECKING:
-    from lxml import etree
     from .megmap_gpkg.base_builder import MemoDataDict
 
 logger = logging.getLogger(__name__)
@@ -37,33 +37,148 @@ def box_from_gcj02(points_str: t.List[str]) -> Polygon:
     return Polygon(points_wgs84)
 
 
+# margin around the bbox of a local layer
+LOCAL_LAYER_BUFFER = 0.008
+
+
+def get_local_bounds(bbox: Polygon) -> t.Tuple[float, float, float, float]:
+    """Bounds of the area of `get_map_local_layer`."""
+    return bbox.buffer(LOCAL_LAYER_BUFFER).bounds
+
+
 def get_map_local_layer(layer: MegMapLayer, bbox: Polygon) -> MegMapLayer:
-    new_layer: MegMapLayer = layer.copy()  # type: ignore
-    buffered_bbox = bbox.buffer(0.008)
-    new_layer = new_layer.loc[layer.intersects(buffered_bbox)]  # type: ignore
+    """Features of a layer intersecting the bbox with a margin, in layer
+    order. Only the candidates of the spatial index of the layer, built on
+    the first query and kept with the layer, are tested."""
+    buffered_bbox = bbox.buffer(LOCAL_LAYER_BUFFER)
+    idxs = layer.sindex.query(buffered_bbox, predicate="intersects")
     # new_layer["geometry"] = new_layer["geometry"].intersection(
     #     bbox
     # )
-    return new_layer
+    return layer.iloc[np.sort(idxs)]  # type: ignore
 
 
 def simplify_line(line_string: LineString) -> LineString:
-    lon, lat = t.cast(
-        t.Tuple[npt.NDArray[np.float64], npt.NDArray[np.float64]],
-        line_string.coords.xy,
-    )
-    x, y, zone_number, zone_letter = WGS84.to_utm(
-        np.asarray(lon), np.asarray(lat)
-    )
-    simplified: LineString = LineString(np.stack([x, y], axis=1)).simplify(0.5)
-    sx, sy = t.cast(
-        t.Tuple[npt.NDArray[np.float64], npt.NDArray[np.float64]],
-        simplified.coords.xy,
-    )
-    lon, lat = WGS84.from_utm(
-        np.asarray(sx), np.asarray(sy), zone_number, zone_letter
+    return simplify_lines([line_string])[0]
+
+
+def simplify_lines(
+    lines: t.Sequence[LineString], tolerance: float = 0.5
+) -> npt.NDArray[np.object_]:
+    """Simplify lines with a tolerance in meters.
+
+    Every line is simplified in the UTM zone of its first point, but the
+    projection and the (vectorized) simplification run once per zone over
+    the coordinates of all lines. Empty lines are returned as they are.
+    """
+    rv = np.empty(len(lines), dtype=object)
+    rv[:] = lines
+    coords, index = shapely.get_coordinates(rv, return_index=True)
+    counts = np.bincount(index, minlength=len(rv))
+    line_idxs = np.flatnonzero(counts)
+    if not len(line_idxs):
+        return rv
+
+    first_points = coords[np.cumsum(counts)[line_idxs] - counts[line_idxs]]
+    zones = np.array(
+        [WGS84.get_utm_zone(lon, lat) for lon, lat in first_points.tolist()],
+        dtype=np.int64,
+    ).reshape(-1, 2)
+    line_zones = np.full((len(rv), 2), -1, dtype=np.int64)
+    line_zones[line_idxs] = zones
+    point_zones = line_zones[index]
+
+    for zone_number, northern in np.unique(zones, axis=0).tolist():
+        zone_line_idxs = np.flatnonzero(
+            (line_zones[:, 0] == zone_number) & (line_zones[:, 1] == northern)
+        )
+        zone_coords = coords[
+            (point_zones[:, 0] == zone_number)
+            & (point_zones[:, 1] == northern)
+        ]
+        x, y, _, _ = WGS84.to_utm(
+            zone_coords[:, 0],
+            zone_coords[:, 1],
+            zone_number,
+            northern=bool(northern),
+        )
+        utm_lines = shapely.linestrings(
+            np.stack([x, y], axis=1),
+            indices=np.repeat(
+                np.arange(len(zone_line_idxs)), counts[zone_line_idxs]
+            ),
+        )
+        sim_coords, sim_index = shapely.get_coordinates(
+            shapely.simplify(utm_lines, tolerance), return_index=True
+        )
+        lon, lat = WGS84.from_utm(
+            sim_coords[:, 0],
+            sim_coords[:, 1],
+            zone_number,
+            northern=bool(northern),
+        )
+        rv[zone_line_idxs] = shapely.linestrings(
+            np.stack([lon, lat], axis=1), indices=sim_index
+        )
+    return rv
+
+
+def partition_by_cost(
+    costs: t.Sequence[float], chunk_num: int
+) -> t.List[t.Tuple[int, int]]:
+    """Split a sequence into at most ``chunk_num`` contiguous chunks whose
+    total costs are as even as possible.
+
+    An item whose cost is larger than the average chunk cost becomes a chunk
+    on its own, the items around it are still balanced.
+
+    Args:
+        costs (t.Sequence[float]): estimated cost of every item
+        chunk_num (int): the expected chunk number
+
+    Returns:
+        t.List[t.Tuple[int, int]]: ``[start, end)`` index ranges of chunks
+    """
+    if len(costs) == 0:
+        return []
+    chunk_num = max(1, min(chunk_num, len(costs)))
+
+    cum_costs = np.cumsum(np.asarray(costs, dtype=np.float64))
+    targets = cum_costs[-1] * np.arange(1, chunk_num) / chunk_num
+    # the item crossing a target goes to the side closer to the target
+    crossing = np.searchsorted(cum_costs, targets, side="left")
+    before = np.where(crossing > 0, cum_costs[crossing - 1], 0.0)
+    cuts = np.where(
+        cum_costs[crossing] - targets < targets - before,
+        crossing + 1,
+        crossing,
     )
-    return LineString(np.stack([lon, lat], axis=1))
+    bounds = np.unique(np.concatenate([[0], cuts, [len(costs)]]))
+    return [
+        (int(start), int(end))
+        for start, end in zip(bounds[:-1], bounds[1:])
+        if start < end
+    ]
+
+
+# imported by the forkserver once, the parser workers forked from it do not
+# have to import them again
+PARSER_MODULES = [
+    "megmap_viz.megmap_dataset.megmap_apollo.apollo_parser",
+    "megmap_viz.megmap_dataset.megmap_memo.memo_data_parser",
+]
+
+
+def get_pool_context() -> BaseContext:
+    """Multiprocessing context of the parser process pools.
+
+    The pools are started from build threads, and a fork while other
+    threads run can copy locks they hold into the workers. The workers are
+    forked from a single threaded forkserver instead.
+    """
+    ctx = multiprocessing.get_context("forkserver")
+    ctx.set_forkserver_preload(PARSER_MODULES)
+    return ctx
 
 
 def is_safe_string(s: str) -> bool:
@@ -114,12 +229,14 @@ def get_layer_type(layer_name: str) -> MegMapLayerType:
 
 def load_megmap_file(
     path: str, megmap_type: str
-) -> t.Union[t.Tuple[etree._Element, str], t.Tuple[MemoDataDict, str], None]:
+) -> t.Union[t.Tuple[str, str], t.Tuple[MemoDataDict, str], None]:
     try:
         if megmap_type == "apollo":
-            return load_xml(path)
+            # apollo xml is parsed from the path by the builder context
+            return load_xml_path(path)
         elif megmap_type == "memo":
-            return t.cast(t.Tuple["MemoDataDict", str], load_json(path))
+            # streamed, the nodes are decoded into columns
+            return load_memo_json(path)
         else:
             return None
     except Exception:
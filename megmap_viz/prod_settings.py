@@ -19,6 +19,11 @@ CACHE = {
     "cache_dir": cache_dir,
     "map_file_cache_dir": f"{cache_dir}/megmap_files",
     "map_layer_cache_dir": f"{cache_dir}/map_layer_datum",
+    # "gpkg" or "parquet", the format of the built maps
+    "map_layer_format": "gpkg",
+    # read the features of every query from the maps instead of keeping
+    # whole layers in memory
+    "map_layer_low_memory": False,
     "upload_file_cache_dir": f"{cache_dir}/upload_files",
     "mem_buffer_size": 10,
     "wanlixing_vis_data_cache_dir": f"{cache_dir}/wanlixing_vis_data",
@@ -27,6 +32,16 @@ CACHE = {
 
 LOCAL_MAP_NAME = "localmap4e1a43c90ee15a7aec66454e96b9e899_20240101_v99"
 
+# apollo parser config
+PARSER = {
+    "max_workers": 4,
+    "chunks_per_worker": 4,
+    "columnar": True,
+    "shared_memory": True,
+    # memo maps are parsed in a process pool of this size if more than 1
+    "memo_workers": 1,
+}
+
 # logging config
 LOGGING = {
     "level": "DEBUG",
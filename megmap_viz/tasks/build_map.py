@@ -16,17 +16,22 @@ from flask import current_app
 
 from megmap_viz.megmap_dataset.megmap_gpkg import (
     build_all_map_layer,
-    write_map_layer_to_gpkg,
     ApolloBuilderContext,
     MemoBuilderContext,
+    MegMapFileInfo,
     get_builder_context_cls,
+    get_layer_store_cls,
+    get_map_layer_writer,
 )
 from megmap_viz.utils.file_op import (
     download_from_oss,
     get_file_size,
 )
 from megmap_viz.megmap_dataset.utils import load_megmap_file
+from megmap_viz.megmap_dataset.datatypes import ParserConfig
+from megmap_viz.megmap_dataset.parse_cache import ParseCache
 from megmap_viz.utils.datetime_str import get_datetime_str
+from megmap_viz.utils.profiler import BuildProfiler, StageStat
 from megmap_viz.datatypes import LogType
 
 logger = get_task_logger(__name__)
@@ -40,15 +45,25 @@ class BuildMapTaskStateMeta(t.TypedDict):
     path: str
     status: BuildMapTaskStatusType
     messages: t.List[LogType]
+    stages: t.List[StageStat]
 
 
 @shared_task(bind=True, ignored_result=True)
-def build_map(self, megmap_path: str, remark: str, megmap_type: str) -> None:
+def build_map(
+    self,
+    megmap_path: str,
+    remark: str,
+    megmap_type: str,
+    polyline_step: t.Optional[float] = None,
+) -> None:
     map_cache_dir = Path(current_app.config["CACHE"]["map_layer_cache_dir"])
+    layer_format = current_app.config["CACHE"].get("map_layer_format", "gpkg")
+    layer_store = get_layer_store_cls(layer_format)(str(map_cache_dir))
     map_file_cache_dir = Path(
         current_app.config["CACHE"]["map_file_cache_dir"]
     )
     logs: t.List[LogType] = []
+    profiler = BuildProfiler()
 
     is_s3 = True
     if not megmap_path.startswith("s3://"):
@@ -76,6 +91,7 @@ def build_map(self, megmap_path: str, remark: str, megmap_type: str) -> None:
                 messages=logs,
                 path=megmap_path,
                 file_md5="",
+                stages=profiler.stages,
             ),
         )
 
@@ -108,15 +124,18 @@ def build_map(self, megmap_path: str, remark: str, megmap_type: str) -> None:
                     messages=logs,
                     file_md5="",
                     path=megmap_path,
+                    stages=profiler.stages,
                 ),
                 "RUNNING",
                 request=task_request,
             )
 
         try:
-            download_from_oss(
-                megmap_path, str(local_apollo_path), download_stat_callback
-            )
+            with profiler.stage("download") as counts:
+                download_from_oss(
+                    megmap_path, str(local_apollo_path), download_stat_callback
+                )
+                counts["bytes"] = os.path.getsize(local_apollo_path)
             logs.append(
                 (
                     get_datetime_str(),
@@ -135,6 +154,7 @@ def build_map(self, megmap_path: str, remark: str, megmap_type: str) -> None:
                     messages=logs,
                     path=megmap_path,
                     file_md5="",
+                    stages=profiler.stages,
                 ),
             )
         except Exception:
@@ -154,11 +174,15 @@ def build_map(self, megmap_path: str, remark: str, megmap_type: str) -> None:
                     messages=logs,
                     path=megmap_path,
                     file_md5="",
+                    stages=profiler.stages,
                 ),
             )
             raise Ignore()
 
-    rv = load_megmap_file(str(local_apollo_path), megmap_type)
+    with profiler.stage("load") as counts:
+        rv = load_megmap_file(str(local_apollo_path), megmap_type)
+        if local_apollo_path.is_file():
+            counts["bytes"] = local_apollo_path.stat().st_size
 
     if rv is None:
         logs.append((get_datetime_str(), "Failed to load map data", "error"))
@@ -170,6 +194,7 @@ def build_map(self, megmap_path: str, remark: str, megmap_type: str) -> None:
                 path=megmap_path,
                 file_md5="",
                 messages=logs,
+                stages=profiler.stages,
             ),
         )
         raise Ignore()
@@ -191,6 +216,7 @@ def build_map(self, megmap_path: str, remark: str, megmap_type: str) -> None:
             messages=logs,
             path=megmap_path,
             file_md5=file_md5,
+            stages=profiler.stages,
         ),
     )
 
@@ -208,9 +234,29 @@ def build_map(self, megmap_path: str, remark: str, megmap_type: str) -> None:
         metadata["layer_id_name_map"] = json.dumps(
             builder_ctx_cls.layer_id_name_map
         )
-        layer_datum, building_logs = build_all_map_layer(
-            megmap_data, builder_ctx_cls
-        )
+        parser_config: ParserConfig = {**current_app.config.get("PARSER", {})}
+        if polyline_step is not None:
+            parser_config["polyline_step"] = polyline_step
+        base_info = layer_store.get_previous_version(remark)
+        if base_info is not None:
+            logs.append(
+                (
+                    get_datetime_str(),
+                    f"Previous version of the map: {base_info.remark}",
+                    "info",
+                )
+            )
+            logger.info(logs[-1][1])
+        with profiler.activate():
+            layer_datum, building_logs = build_all_map_layer(
+                megmap_data,
+                builder_ctx_cls,
+                parser_config,
+                file_md5=file_md5,
+                parse_cache=ParseCache(map_file_cache_dir / "parsed"),
+                base_md5=base_info.md5 if base_info is not None else None,
+                source_path=str(local_apollo_path),
+            )
         logs.extend(building_logs)
         del megmap_data
         logs.append(
@@ -230,6 +276,7 @@ def build_map(self, megmap_path: str, remark: str, megmap_type: str) -> None:
                 messages=logs,
                 path=megmap_path,
                 file_md5=file_md5,
+                stages=profiler.stages,
             ),
         )
     except Exception:
@@ -249,6 +296,7 @@ def build_map(self, megmap_path: str, remark: str, megmap_type: str) -> None:
                 messages=logs,
                 path=megmap_path,
                 file_md5=file_md5,
+                stages=profiler.stages,
             ),
         )
         raise Ignore()
@@ -263,11 +311,12 @@ def build_map(self, megmap_path: str, remark: str, megmap_type: str) -> None:
             )
         )
         logger.info(logs[-1][1])
-        write_map_layer_to_gpkg(
-            layer_datum,
-            str(map_cache_dir / f"{remark}_{file_md5}.gpkg"),
-            matadata=metadata,
-        )
+        with profiler.activate():
+            get_map_layer_writer(layer_format)(
+                layer_datum,
+                str(layer_store.get_path(MegMapFileInfo(remark, file_md5))),
+                metadata,
+            )
         self.update_state(
             state="SUCCESS",
             meta=BuildMapTaskStateMeta(
@@ -275,6 +324,7 @@ def build_map(self, megmap_path: str, remark: str, megmap_type: str) -> None:
                 messages=logs,
                 path=megmap_path,
                 file_md5=file_md5,
+                stages=profiler.stages,
             ),
         )
     except Exception:
@@ -294,6 +344,7 @@ def build_map(self, megmap_path: str, remark: str, megmap_type: str) -> None:
                 messages=logs,
                 path=megmap_path,
                 file_md5=file_md5,
+                stages=profiler.stages,
             ),
         )
         raise Ignore()
@@ -1,6 +1,7 @@
 import datetime
 import typing as t
 from collections import defaultdict
+from pathlib import Path
 from queue import Queue
 import logging
 
@@ -9,22 +10,23 @@ from flask import current_app
 from celery import shared_task
 
 from megmap_viz.megmap_dataset.datatypes import RemarkInfo
+from megmap_viz.megmap_dataset.parse_cache import ParseCache
 from megmap_viz.megmap_dataset.utils import get_remark_info
 
 if t.TYPE_CHECKING:
-    from megmap_viz.megmap_dataset.megmap_gpkg.gpkg_db import GPKGDB
+    from megmap_viz.megmap_dataset.megmap_gpkg.layer_store import LayerStore
 
 
 logger = logging.getLogger(__name__)
 
 
 def get_map_remark_list() -> t.List[str]:
-    gpkg_db: GPKGDB = current_app.extensions["gpkg_db"]
+    gpkg_db: LayerStore = current_app.extensions["gpkg_db"]
     return [file_info.remark for file_info in gpkg_db.all_megmap_file_info]
 
 
 def del_map_data(remark: str) -> bool:
-    gpkg_db: GPKGDB = current_app.extensions["gpkg_db"]
+    gpkg_db: LayerStore = current_app.extensions["gpkg_db"]
 
     file_info_list = [
         file_info
@@ -32,8 +34,12 @@ def del_map_data(remark: str) -> bool:
         if file_info.remark == remark
     ]
 
+    parse_cache = ParseCache(
+        Path(current_app.config["CACHE"]["map_file_cache_dir"]) / "parsed"
+    )
     for file_info in file_info_list:
         gpkg_db.delete(file_info)
+        parse_cache.delete(file_info.md5)
         logger.debug(f"Remove map data: {remark}")
 
     return True
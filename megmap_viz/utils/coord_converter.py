@@ -218,9 +218,30 @@ class WGS84:
     ) -> t.Tuple[npt.NDArray[np.float64], npt.NDArray[np.float64], int, str]:
         ...
 
+    @t.overload
+    @staticmethod
+    def to_utm(
+        lon: npt.NDArray[np.float64],
+        lat: npt.NDArray[np.float64],
+        zone_number: int,
+        *,
+        northern: bool
+    ) -> t.Tuple[npt.NDArray[np.float64], npt.NDArray[np.float64], int, None]:
+        ...
+
+    @staticmethod
+    def to_utm(lon, lat, zone_number=None, *, northern=None):
+        return utm.from_latlon(
+            lat,
+            lon,
+            force_zone_number=zone_number,
+            force_northern=northern,
+        )
+
     @staticmethod
-    def to_utm(lon, lat):
-        return utm.from_latlon(lat, lon)
+    def get_utm_zone(lon: float, lat: float) -> t.Tuple[int, bool]:
+        """UTM zone number and hemisphere `to_utm` picks for a point."""
+        return utm.latlon_to_zone_number(lat, lon), lat >= 0
 
     @t.overload
     @staticmethod
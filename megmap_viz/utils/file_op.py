@@ -1,4 +1,5 @@
-from typing import IO, Dict, Union, Optional, Tuple, Callable
+from typing import IO, Dict, Union, Optional, Tuple, Callable, Iterator
+from contextlib import contextmanager
 import json
 
 from lxml import etree
@@ -6,7 +7,7 @@ import refile
 import megfile
 from megfile import SmartPath
 
-from .md5 import get_str_md5
+from .md5 import get_str_md5, get_stream_md5
 
 
 SourceType = Union[str, IO]
@@ -36,6 +37,27 @@ def smart_read(source: SourceType) -> Union[None, str, bytes, bytearray]:
     return str_data
 
 
+@contextmanager
+def smart_open_source(source: SourceType) -> Iterator[IO]:
+    """smartly open map file as a binary stream without reading it into
+    memory, support local file, s3 file, and file-like object
+
+    Args:
+        source (SourceType): map file path or file-like object
+
+    Yields:
+        IO: binary file-like object
+    """
+    if isinstance(source, str):
+        file = refile.smart_open(SmartPath(source), mode="rb")
+        try:
+            yield file
+        finally:
+            file.close()
+    else:
+        yield source
+
+
 def load_xml(xml_path: str) -> Optional[Tuple[etree._Element, str]]:
     xml_str = smart_read(xml_path)
 
@@ -45,6 +67,22 @@ def load_xml(xml_path: str) -> Optional[Tuple[etree._Element, str]]:
     return etree.fromstring(xml_str), get_str_md5(xml_str)
 
 
+def load_xml_path(xml_path: str) -> Optional[Tuple[str, str]]:
+    """check the xml file and compute its md5 without loading it into memory,
+    the xml is parsed later from the path
+    Args:
+        xml_path (str): local or s3 xml path
+
+    Returns:
+        Optional[Tuple[str, str]]: xml path and md5
+    """
+    if not refile.smart_exists(SmartPath(xml_path)):
+        return
+
+    with smart_open_source(xml_path) as file:
+        return xml_path, get_stream_md5(file)
+
+
 def load_json(json_path: str) -> Optional[Tuple[Dict, str]]:
     json_str = smart_read(json_path)
 
@@ -18,6 +18,23 @@ def get_file_md5(file_name):
     return m.hexdigest()  # 返回md5对象
 
 
+def get_stream_md5(fobj, chunk_size=1024 * 1024):
+    """
+    计算二进制流的md5, 不会将整个流读入内存
+    :param fobj:
+    :param chunk_size:
+    :return:
+    """
+    m = hashlib.md5()
+    while True:
+        data = fobj.read(chunk_size)
+        if not data:
+            break
+        m.update(data)
+
+    return m.hexdigest()
+
+
 def get_str_md5(content):
     """
     计算字符串md5
@@ -0,0 +1,147 @@
+"""Stage level instrumentation of the map build pipeline.
+
+A `BuildProfiler` records the wall time, cpu time, growth of the peak
+resident set size and some counters (features, bytes, ...) of named
+stages. The peak rss is the one of the whole process, so the growth is
+only reported (not None) for stages which no other build of the process
+overlapped. Stages are recorded into the profiler activated in the current
+context, so the deep call sites (layer builders, `build_gdf`, ...) do not
+need a reference to it, and nothing is recorded when no profiler is
+active. Nested stages are named by their path, e.g.
+``build/LANE/build_gdf``.
+"""
+from __future__ import annotations
+import time
+import resource
+import threading
+import typing as t
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+
+class StageStat(t.TypedDict):
+    name: str
+    wall_time: float
+    cpu_time: float
+    # growth of the peak rss of the process during the stage, MiB, None if
+    # another build ran in the process meanwhile
+    peak_rss_delta: t.Optional[float]
+    counts: t.Dict[str, int]
+
+
+_current_profiler: ContextVar[t.Optional[BuildProfiler]] = ContextVar(
+    "current_profiler", default=None
+)
+_stage_path: ContextVar[t.Tuple[str, ...]] = ContextVar(
+    "stage_path", default=()
+)
+
+_running_lock = threading.Lock()
+# ids of the profilers which are active or measuring a stage, with their
+# nesting depth, and the number of times one of them started running
+_running_profilers: t.Dict[int, int] = {}
+_run_num = 0
+
+
+def get_peak_rss() -> float:
+    """Peak resident set size of the current process in MiB."""
+    # ru_maxrss is in KiB on linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def get_current_profiler() -> t.Optional[BuildProfiler]:
+    return _current_profiler.get()
+
+
+class BuildProfiler:
+    def __init__(self) -> None:
+        self.stages: t.List[StageStat] = []
+
+    @contextmanager
+    def activate(self) -> t.Iterator[BuildProfiler]:
+        token = _current_profiler.set(self)
+        try:
+            with self._running():
+                yield self
+        finally:
+            _current_profiler.reset(token)
+
+    @contextmanager
+    def _running(self) -> t.Iterator[None]:
+        global _run_num
+        with _running_lock:
+            depth = _running_profilers.get(id(self), 0)
+            if not depth:
+                _run_num += 1
+            _running_profilers[id(self)] = depth + 1
+        try:
+            yield
+        finally:
+            with _running_lock:
+                depth = _running_profilers.pop(id(self)) - 1
+                if depth:
+                    _running_profilers[id(self)] = depth
+
+    def _get_others_running(self) -> t.Tuple[bool, int]:
+        """Whether another profiler runs, and the number of runs so far."""
+        with _running_lock:
+            others = len(_running_profilers) - (id(self) in _running_profilers)
+            return others > 0, _run_num
+
+    def add_stage(
+        self,
+        name: str,
+        wall_time: float,
+        cpu_time: float,
+        peak_rss_delta: float,
+        **counts: int,
+    ) -> StageStat:
+        """Record a stage measured elsewhere, e.g. in a worker process."""
+        stat = StageStat(
+            name="/".join((*_stage_path.get(), name)),
+            wall_time=round(wall_time, 4),
+            cpu_time=round(cpu_time, 4),
+            peak_rss_delta=round(peak_rss_delta, 2),
+            counts=dict(counts),
+        )
+        self.stages.append(stat)
+        return stat
+
+    @contextmanager
+    def stage(self, name: str, **counts: int) -> t.Iterator[t.Dict[str, int]]:
+        """Measure the enclosed block. The yielded dict takes the counters
+        which are only known at the end of the stage."""
+        # stages are kept in the order they start
+        stat = self.add_stage(name, 0.0, 0.0, 0.0, **counts)
+        token = _stage_path.set((*_stage_path.get(), name))
+        with self._running():
+            start_others, start_run_num = self._get_others_running()
+            start_time = time.perf_counter()
+            start_cpu_time = time.process_time()
+            start_peak_rss = get_peak_rss()
+            try:
+                yield stat["counts"]
+            finally:
+                _stage_path.reset(token)
+                stat["wall_time"] = round(time.perf_counter() - start_time, 4)
+                stat["cpu_time"] = round(
+                    time.process_time() - start_cpu_time, 4
+                )
+                end_others, end_run_num = self._get_others_running()
+                if start_others or end_others or end_run_num != start_run_num:
+                    stat["peak_rss_delta"] = None
+                else:
+                    stat["peak_rss_delta"] = round(
+                        get_peak_rss() - start_peak_rss, 2
+                    )
+
+
+@contextmanager
+def record_stage(name: str, **counts: int) -> t.Iterator[t.Dict[str, int]]:
+    """`BuildProfiler.stage` of the active profiler, if there is one."""
+    profiler = get_current_profiler()
+    if profiler is None:
+        yield dict(counts)
+        return
+    with profiler.stage(name, **counts) as rv:
+        yield rv
@@ -0,0 +1,93 @@
+import threading
+
+from megmap_viz.utils.profiler import (
+    BuildProfiler,
+    get_current_profiler,
+    record_stage,
+)
+
+
+def test_build_profiler() -> None:
+    profiler = BuildProfiler()
+    with profiler.stage("load", bytes=10):
+        pass
+
+    # nothing is recorded without an active profiler
+    with record_stage("parse") as counts:
+        counts["roads"] = 1
+    assert get_current_profiler() is None
+
+    with profiler.activate():
+        assert get_current_profiler() is profiler
+        with record_stage("parse") as counts:
+            counts["roads"] = 3
+            profiler.add_stage("worker_0", 1.0, 0.5, 2.0, elements=3)
+            with record_stage("build_gdf", features=2):
+                sum(range(10000))
+    assert get_current_profiler() is None
+
+    assert [stat["name"] for stat in profiler.stages] == [
+        "load",
+        "parse",
+        "parse/worker_0",
+        "parse/build_gdf",
+    ]
+    load, parse, worker, build_gdf = profiler.stages
+    assert load["counts"] == {"bytes": 10}
+    assert parse["counts"] == {"roads": 3}
+    assert worker == {
+        "name": "parse/worker_0",
+        "wall_time": 1.0,
+        "cpu_time": 0.5,
+        "peak_rss_delta": 2.0,
+        "counts": {"elements": 3},
+    }
+    assert build_gdf["counts"] == {"features": 2}
+    assert parse["wall_time"] >= build_gdf["wall_time"] > 0
+    assert parse["peak_rss_delta"] >= 0
+
+
+def test_build_profiler_stage_error() -> None:
+    profiler = BuildProfiler()
+    try:
+        with profiler.activate(), record_stage("parse"):
+            raise ValueError()
+    except ValueError:
+        pass
+
+    # the failed stage is kept and the path is restored
+    with profiler.activate(), record_stage("build"):
+        pass
+    assert [stat["name"] for stat in profiler.stages] == ["parse", "build"]
+
+
+def test_build_profiler_concurrent_builds() -> None:
+    profiler, other = BuildProfiler(), BuildProfiler()
+    with profiler.stage("alone"):
+        pass
+
+    def build() -> None:
+        with other.activate(), record_stage("build"):
+            pass
+
+    with profiler.stage("overlapped"):
+        # another build which starts and ends during the stage
+        thread = threading.Thread(target=build)
+        thread.start()
+        thread.join()
+    with other.activate():
+        with profiler.stage("concurrent"):
+            pass
+    with profiler.activate(), record_stage("alone_again"):
+        pass
+
+    peak_rss_deltas = {
+        stat["name"]: stat["peak_rss_delta"]
+        for stat in profiler.stages + other.stages
+    }
+    assert peak_rss_deltas["alone"] is not None
+    assert peak_rss_deltas["alone_again"] is not None
+    # the peak rss of the process can not be attributed to either build
+    assert peak_rss_deltas["overlapped"] is None
+    assert peak_rss_deltas["build"] is None
+    assert peak_rss_deltas["concurrent"] is None
@@ -38,6 +38,8 @@ def add_builder_task() -> Response:
     apollo_path = datum.get("map_path")
     remark = datum.get("remark")
     map_type = datum.get("map_type")
+    # sampling step of memo polylines, meters
+    polyline_step = datum.get("polyline_step")
 
     try:
         if remark is None:
@@ -57,6 +59,15 @@ def add_builder_task() -> Response:
             code=400, status="error", message="Invalid map_type"
         ).json
 
+    if polyline_step is not None and (
+        isinstance(polyline_step, bool)
+        or not isinstance(polyline_step, (int, float))
+        or polyline_step <= 0
+    ):
+        return ResponseData(
+            code=400, status="error", message="Invalid polyline_step"
+        ).json
+
     remark_info = get_remark_info(remark)
     if not remark_info.is_true:
         return ResponseData(
@@ -91,7 +102,9 @@ def add_builder_task() -> Response:
                 data={"task_id": ""},
             ).json
 
-    task: AsyncResult = build_map.delay(apollo_path, remark, map_type)  # type: ignore
+    task: AsyncResult = build_map.delay(  # type: ignore
+        apollo_path, remark, map_type, polyline_step
+    )
 
     return ResponseData(
         code=201,
@@ -14,12 +14,12 @@ from megmap_viz.megmap_dataset.utils import get_layer_type
 if t.TYPE_CHECKING:
     from flask import Response
     from megmap_viz.megmap_dataset.megmap_manager import MegMapManager
-    from megmap_viz.megmap_dataset.megmap_gpkg.gpkg_db import GPKGDB
+    from megmap_viz.megmap_dataset.megmap_gpkg.layer_store import LayerStore
     from megmap_viz.megmap_dataset.megmap import MegMap
 
 
 megmap_manager: MegMapManager = current_app.extensions["megmap_manager"]
-gpkg_db: GPKGDB = current_app.extensions["gpkg_db"]
+gpkg_db: LayerStore = current_app.extensions["gpkg_db"]
 
 bp = Blueprint("megmap_data_query", __name__, url_prefix="/megmap-dataset")
 
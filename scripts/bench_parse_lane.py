@@ -0,0 +1,50 @@
+"""Time `ApolloParser._parse_lane` over every lane of an apollo map.
+
+    python scripts/bench_parse_lane.py [xml_path] [--repeat N]
+
+Without a path, a synthetic map of the test fixtures is used.
+"""
+import argparse
+import time
+import typing as t
+
+from lxml import etree
+
+from megmap_viz.megmap_dataset.megmap_apollo.apollo_parser import ApolloParser
+from megmap_viz.megmap_dataset.megmap_apollo.tests.conftest import (
+    make_apollo_xml,
+)
+
+
+def bench_parse_lane(apollo_xml: etree._Element) -> t.Tuple[int, float]:
+    parser = ApolloParser()
+    lane_eles = list(apollo_xml.iter("lane"))
+    # build the lines up front so only the lane traversal is measured
+    parser._curr_lines = parser._build_lines(apollo_xml)
+    start = time.perf_counter()
+    for lane_ele in lane_eles:
+        parser._parse_lane(lane_ele)
+    return len(lane_eles), time.perf_counter() - start
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("xml_path", nargs="?")
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    args = arg_parser.parse_args()
+
+    if args.xml_path:
+        apollo_xml = etree.parse(
+            args.xml_path, etree.XMLParser(huge_tree=True)
+        ).getroot()
+    else:
+        apollo_xml = etree.fromstring(
+            make_apollo_xml(road_num=300, lane_num=4, point_num=50).encode()
+        )
+    for _ in range(args.repeat):
+        lane_num, elapsed = bench_parse_lane(apollo_xml)
+        print(f"parse {lane_num} lanes: {elapsed:.3f} s")
+
+
+if __name__ == "__main__":
+    main()